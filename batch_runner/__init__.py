@@ -0,0 +1,5 @@
+# Exposing
+
+
+from .manifest import load_matches
+from .runner import BatchRunner, run_match, is_completed
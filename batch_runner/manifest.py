@@ -0,0 +1,49 @@
+import glob
+import json
+import os
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+
+def _match(input_path, match_id=None):
+    return {"match_id": match_id or os.path.splitext(os.path.basename(input_path))[0], "input": input_path}
+
+def load_matches(source):
+    """
+    Matches to process, from a directory of videos or a manifest file.
+
+    A manifest is either a JSON list (paths or {"input": path, "match_id": id} objects) or a text
+    file with one video path per line (blank lines and # comments ignored). Relative paths are
+    relative to the manifest. Match IDs default to the video file name and are made unique.
+
+    Args:
+        source (str): Directory or manifest path.
+
+    Returns:
+        list: [{"match_id": str, "input": str}, ...] in the manifest (or file name) order.
+    """
+    if os.path.isdir(source):
+        paths = sorted(path for path in glob.glob(os.path.join(source, '*')) if path.lower().endswith(VIDEO_EXTENSIONS))
+        matches = [_match(path) for path in paths]
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            if source.endswith('.json'):
+                entries = json.load(f)
+            else:
+                entries = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+        matches = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {"input": entry}
+            input_path = entry["input"] if os.path.isabs(entry["input"]) else os.path.join(base_dir, entry["input"])
+            matches.append(_match(input_path, entry.get("match_id")))
+
+    # unique IDs : they name the output directories
+    seen = {}
+    for match in matches:
+        match_id = match["match_id"]
+        seen[match_id] = seen.get(match_id, 0) + 1
+        if seen[match_id] > 1:
+            match["match_id"] = f"{match_id}_{seen[match_id]}"
+    return matches
@@ -0,0 +1,52 @@
+# Batch processing of matches : python -m batch_runner.run_batch input_vids/ --workers 2 --max-memory-gb 12
+
+import argparse
+import os
+import sys
+sys.path.append('../')
+from batch_runner import load_matches, BatchRunner
+
+def main():
+    parser = argparse.ArgumentParser(description="Processes a directory (or manifest) of matches with a pool of workers.")
+    parser.add_argument('source', help="directory of videos, JSON manifest or text file with one video path per line")
+    parser.add_argument('--model', default='models/best.pt', help="detection model weights (.pt, .onnx or OpenVINO model, loaded once per worker)")
+    parser.add_argument('--output-dir', default='output_videos/batch', help="per match outputs & summary.json")
+    parser.add_argument('--workers', type=int, default=2, help="worker processes")
+    parser.add_argument('--max-memory-gb', type=float, help="memory budget of the matches running at once")
+    parser.add_argument('--model-memory-mb', type=float, default=600, help="memory of a loaded model, for the budget")
+    parser.add_argument('--threads', type=int, help="OpenCV / torch / ONNX Runtime threads per worker")
+    parser.add_argument('--window-size', type=int, default=120, help="frames per streaming window")
+    parser.add_argument('--cache-dir', default='cache', help="stage cache shared by the workers ('' disables it)")
+    parser.add_argument('--keyframe-interval', type=int, default=1, help="run the detector every N frames (1 = every frame)")
+    parser.add_argument('--inference-size', type=int, help="long side of the detector input (model default when not set)")
+    parser.add_argument('--resize-at-decode', action='store_true', help="resize the frames to the inference size once when decoded")
+    parser.add_argument('--timeseries', action='store_true', help="also write the match metrics as line protocol (timeseries.lp.gz)")
+    parser.add_argument('--no-resume', action='store_true', help="process again the matches already completed")
+    args = parser.parse_args()
+
+    matches = load_matches(args.source)
+    if not matches:
+        print(f"No match found in {args.source}")
+        sys.exit(1)
+    if not os.path.exists(args.model):
+        print(f"Model not found : {args.model}")
+        sys.exit(1)
+
+    runner = BatchRunner(args.model, args.output_dir, workers=args.workers,
+                         max_memory=int(args.max_memory_gb*1024**3) if args.max_memory_gb else None,
+                         window_size=args.window_size, cache_dir=args.cache_dir or None, timeseries=args.timeseries,
+                         threads=args.threads, model_bytes=int(args.model_memory_mb*1024**2),
+                         keyframe_interval=args.keyframe_interval, inference_size=args.inference_size,
+                         resize_at_decode=args.resize_at_decode)
+    print(f"{len(matches)} matches, {runner.workers} workers")
+    summary = runner.run(matches, resume=not args.no_resume)
+
+    print(f"{summary['completed']} completed, {summary['skipped']} skipped, {summary['failed']} failed "
+          f"in {summary['wall_seconds']:.1f}s")
+    if summary["frames_per_second"]:
+        print(f"Throughput : {summary['frames_per_second']:.1f} frames/s")
+    print(f"Summary saved to {os.path.join(args.output_dir, 'summary.json')}")
+    sys.exit(1 if summary["failed"] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import sys
+sys.path.append('../')
+from utils import get_video_properties
+from instrumentation import metrics
+from instrumentation.metrics import get_peak_rss
+
+RESULT_FILE = 'result.json'
+VIDEO_FILE = 'annotated.avi'
+
+# tracker of the worker process : the model is loaded once per worker and reused for every match it runs
+_worker_tracker = None
+
+def init_worker(model_path, threads=None, keyframe_interval=1, inference_size=None, resize_at_decode=False):
+    global _worker_tracker
+    if threads:
+        import cv2
+        cv2.setNumThreads(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    from tracking import Tracker
+    _worker_tracker = Tracker(model_path, intra_op_threads=threads) # threads of the ONNX Runtime / OpenVINO backends
+    _worker_tracker.set_inference_resolution(inference_size, resize_at_decode)
+    _worker_tracker.enable_keyframes(keyframe_interval)
+
+def write_json(path, data):
+    # atomic : a crash never leaves a half written result behind
+    tmp_path = path + f'.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+def input_signature(input_path):
+    stat = os.stat(input_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+def is_completed(match, output_dir):
+    """
+    True when the match was already processed successfully from the same input file (resume).
+    """
+    match_dir = os.path.join(output_dir, match["match_id"])
+    try:
+        with open(os.path.join(match_dir, RESULT_FILE)) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (result.get("status") == "ok" and os.path.exists(os.path.join(match_dir, VIDEO_FILE))
+            and os.path.exists(match["input"]) and result.get("input_signature") == input_signature(match["input"]))
+
+def estimate_match_memory(input_path, window_size=120, model_bytes=600*1024**2):
+    """
+    Rough peak memory of a streamed match : the decoded window, the frames queued for detection,
+    the render buffers and the encoder queue, plus the model of the worker.
+    """
+    properties = get_video_properties(input_path)
+    frame_bytes = max(1, properties["width"] * properties["height"] * 3)
+    return model_bytes + frame_bytes * (2*window_size + 64 + 20)
+
+def run_match(match, output_dir, window_size=120, cache_dir='cache', timeseries=False):
+    """
+    Processes one match in the worker (streaming pipeline with the worker's model) and writes its
+    outputs in output_dir/match_id : annotated.avi, run_report.json, timeseries.lp.gz (optional)
+    and result.json.
+
+    Returns:
+        dict: Result of the match (status "ok" or "failed").
+    """
+    from pipeline import StreamingPipeline
+    from stage_cache import StageCache
+    from timeseries_export import MatchMetricsExporter, LineProtocolFileSink
+
+    match_dir = os.path.join(output_dir, match["match_id"])
+    os.makedirs(match_dir, exist_ok=True)
+    result = {"match_id": match["match_id"], "input": match["input"], "worker": os.getpid(),
+              "started": time.strftime('%Y-%m-%dT%H:%M:%S')}
+    start = time.perf_counter()
+    exporter = None
+    partial_path = os.path.join(match_dir, 'annotated.partial.avi') # renamed once the match is complete
+    try:
+        result["input_signature"] = input_signature(match["input"])
+        _worker_tracker.reset()
+        metrics.reset() # per match run report
+
+        properties = get_video_properties(match["input"])
+        if timeseries:
+            exporter = MatchMetricsExporter([LineProtocolFileSink(os.path.join(match_dir, 'timeseries.lp.gz'))],
+                                            match_id=match["match_id"], fps=properties["fps"])
+        pipeline = StreamingPipeline(_worker_tracker.model_path, window_size=window_size, tracker=_worker_tracker,
+                                     cache=StageCache(cache_dir) if cache_dir else None, exporter=exporter)
+
+        # written under a temporary name : an interrupted match never looks complete
+        with metrics.stage("total", properties["frame_count"]):
+            frames = pipeline.run(match["input"], partial_path)
+        if exporter is not None:
+            exporter.close()
+            exporter = None
+        os.replace(partial_path, os.path.join(match_dir, VIDEO_FILE))
+        metrics.write_report(os.path.join(match_dir, 'run_report.json'))
+
+        seconds = time.perf_counter() - start
+        result.update({"status": "ok", "frames": frames, "seconds": seconds,
+                       "frames_per_second": frames / seconds if seconds > 0 else None})
+    except Exception as error:
+        if exporter is not None:
+            exporter.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        result.update({"status": "failed", "seconds": time.perf_counter() - start,
+                       "error": f"{type(error).__name__}: {error}", "traceback": traceback.format_exc()})
+
+    result["worker_peak_rss_bytes"] = get_peak_rss()
+    write_json(os.path.join(match_dir, RESULT_FILE), result)
+    return result
+
+class BatchRunner():
+    """
+    Processes a list of matches across a pool of worker processes. Each worker loads the model
+    once and reuses it for all its matches. Matches are only started while the estimated memory
+    of the running ones fits in max_memory, completed matches are skipped (resume), and a
+    summary report of the batch is written in output_dir/summary.json.
+
+    Attributes:
+        model_path (str): Detection model weights (.pt, .onnx or OpenVINO model).
+        output_dir (str): Root of the per match outputs.
+        workers (int): Worker processes.
+        max_memory (int): Memory budget (bytes) of the running matches, None for no limit.
+        window_size (int): Streaming window of the pipeline.
+        cache_dir (str): Stage cache shared by the workers (None disables it).
+        timeseries (bool): Also writes the match metrics as line protocol.
+        threads (int): OpenCV / torch / ONNX Runtime threads per worker (None keeps the defaults).
+        model_bytes (int): Memory of a loaded model, for the memory estimates.
+        keyframe_interval (int): Detector every N frames, boxes propagated in between (1 = every frame).
+        inference_size (int): Long side of the detector input (None : model default).
+        resize_at_decode (bool): Resizes the frames to the inference size as they're decoded.
+    """
+    def __init__(self, model_path, output_dir='output_videos/batch', workers=2, max_memory=None, window_size=120,
+                 cache_dir='cache', timeseries=False, threads=None, model_bytes=600*1024**2,
+                 keyframe_interval=1, inference_size=None, resize_at_decode=False):
+        self.model_path = model_path
+        self.output_dir = output_dir
+        self.workers = max(1, workers)
+        self.max_memory = max_memory
+        self.window_size = window_size
+        self.cache_dir = cache_dir
+        self.timeseries = timeseries
+        self.threads = threads
+        self.model_bytes = model_bytes
+        self.keyframe_interval = keyframe_interval
+        self.inference_size = inference_size
+        self.resize_at_decode = resize_at_decode
+
+    def make_pool(self):
+        # spawn : no inherited model / CUDA state, every worker loads its own model once
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_worker,
+                                   initargs=(self.model_path, self.threads, self.keyframe_interval, self.inference_size, self.resize_at_decode))
+
+    def run(self, matches, resume=True, log=print):
+        """
+        Processes the matches.
+
+        Args:
+            matches (list): load_matches output.
+            resume (bool): Skips the matches already completed in output_dir.
+
+        Returns:
+            dict: Summary of the batch (also written to output_dir/summary.json).
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        start = time.perf_counter()
+        results = {}
+
+        pending = []
+        for match in matches:
+            if resume and is_completed(match, self.output_dir):
+                results[match["match_id"]] = {"match_id": match["match_id"], "input": match["input"], "status": "skipped"}
+                log(f"{match['match_id']} : already completed, skipped")
+            elif not os.path.exists(match["input"]):
+                results[match["match_id"]] = {"match_id": match["match_id"], "input": match["input"], "status": "failed",
+                                              "error": "input not found"}
+                log(f"{match['match_id']} : input not found ({match['input']})")
+            else:
+                pending.append((match, estimate_match_memory(match["input"], self.window_size, self.model_bytes)))
+
+        pool = self.make_pool() if pending else None
+        running = {} # future : (match, memory estimate)
+        suspects = set() # matches running when a worker died : run again alone, to find the one that crashes
+        try:
+            while pending or running:
+                # start matches while they fit in the memory budget (at least one runs)
+                running_memory = sum(memory for _, memory in running.values())
+                while pending and len(running) < self.workers:
+                    match, memory = pending[0]
+                    if running and self.max_memory is not None and running_memory + memory > self.max_memory:
+                        break
+                    if running and (match["match_id"] in suspects or any(running_match["match_id"] in suspects for running_match, _ in running.values())):
+                        break
+                    pending.pop(0)
+                    future = pool.submit(run_match, match, self.output_dir, self.window_size, self.cache_dir, self.timeseries)
+                    running[future] = (match, memory)
+                    running_memory += memory
+                    log(f"{match['match_id']} : started")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                crashed = [] # (match, memory) whose future raised because the pool broke
+                for future in done:
+                    match, memory = running.pop(future)
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        crashed.append((match, memory))
+                        continue
+                    result = future.result()
+                    results[match["match_id"]] = result
+                    if result["status"] == "ok":
+                        log(f"{match['match_id']} : done, {result['frames']} frames in {result['seconds']:.1f}s")
+                    else:
+                        log(f"{match['match_id']} : failed ({result['error']})")
+
+                if crashed:
+                    # a worker died (e.g. killed out of memory) : the pool is unusable and every running match
+                    # raises, not only the one that crashed. A match that ran alone is the one, the others
+                    # are run again (alone) on a new pool
+                    crashed += list(running.values())
+                    for future in running:
+                        future.cancel()
+                    running = {}
+                    for match, memory in reversed(crashed):
+                        if len(crashed) == 1:
+                            results[match["match_id"]] = {"match_id": match["match_id"], "input": match["input"], "status": "failed",
+                                                          "error": "worker process died"}
+                            log(f"{match['match_id']} : failed (worker process died)")
+                        else:
+                            suspects.add(match["match_id"])
+                            pending.insert(0, (match, memory))
+                            log(f"{match['match_id']} : worker pool broke, run again")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.make_pool()
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        summary = self.make_summary(matches, results, time.perf_counter() - start)
+        write_json(os.path.join(self.output_dir, 'summary.json'), summary)
+        return summary
+
+    def make_summary(self, matches, results, wall_seconds):
+        ordered = [results[match["match_id"]] for match in matches if match["match_id"] in results]
+        processed = [result for result in ordered if result["status"] == "ok"]
+        frames = sum(result["frames"] for result in processed)
+        return {
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "model_path": self.model_path,
+            "workers": self.workers,
+            "max_memory_bytes": self.max_memory,
+            "wall_seconds": wall_seconds,
+            "matches": len(matches),
+            "completed": len(processed),
+            "skipped": sum(result["status"] == "skipped" for result in ordered),
+            "failed": sum(result["status"] == "failed" for result in ordered),
+            "frames": frames,
+            "frames_per_second": frames / wall_seconds if processed and wall_seconds > 0 else None,
+            "results": ordered
+        }
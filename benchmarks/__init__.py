@@ -0,0 +1,6 @@
+# Exposing
+
+
+from .synthetic import SyntheticMatch, make_synthetic_tracks, make_synthetic_frames, make_synthetic_camera_movement, write_synthetic_video
+from .stage_benchmarks import STAGES, run_benchmarks, compare_to_baseline
+from .parity import PARITY_CHECKS, run_parity_checks
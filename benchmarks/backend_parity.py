@@ -0,0 +1,123 @@
+# CPU detector backends vs the PyTorch model : python -m benchmarks.backend_parity --backends models/best.onnx models/best.int8.onnx [--openvino]
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video_range
+from tracking import Tracker, OnnxDetector
+from benchmarks.inference_sweep import box_iou, to_class_boxes, compare_detections
+
+def match_boxes(reference_boxes, boxes, iou_threshold=0.5):
+    # greedy one to one matching (like count_matches), (reference index, index) pairs
+    if len(reference_boxes) == 0 or len(boxes) == 0:
+        return []
+    iou = box_iou(reference_boxes, boxes)
+    pairs = []
+    while True:
+        index = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[index] < iou_threshold:
+            return pairs
+        pairs.append(index)
+        iou[index[0], :] = -1
+        iou[:, index[1]] = -1
+
+def max_box_error(reference, detections, iou_threshold=0.5):
+    # largest coordinate difference (px) between matched boxes of the same class
+    error = 0.0
+    for reference_frame, frame in zip(reference, detections):
+        for name in set(reference_frame) & set(frame):
+            reference_boxes, boxes = np.asarray(reference_frame[name]), np.asarray(frame[name])
+            for reference_index, index in match_boxes(reference_boxes, boxes, iou_threshold):
+                error = max(error, float(np.abs(reference_boxes[reference_index] - boxes[index]).max()))
+    return error
+
+def detect_backend(tracker, frames):
+    """
+    Detections of the frames through Tracker.predict (same conf, inference size & batches as the
+    pipeline), timed.
+
+    Returns:
+        tuple: ([{class name: boxes}] per frame, detector seconds)
+    """
+    tracker.predict(frames[:1]) # warm up
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), tracker.batch_size):
+        detections += tracker.predict(frames[i:i+tracker.batch_size])
+    seconds = time.perf_counter() - start
+    return [to_class_boxes(detection) for detection in detections], seconds
+
+def make_backend_tracker(model_path, backend, inference_size, intra_op_threads, inter_op_threads):
+    if backend == "openvino" and model_path.endswith('.onnx'): # OpenVINO reads the .onnx directly
+        tracker = Tracker(None)
+        tracker.model_path = model_path
+        tracker.model = OnnxDetector(model_path, "openvino", intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+    else:
+        tracker = Tracker(model_path, intra_op_threads, inter_op_threads)
+    tracker.set_inference_resolution(inference_size)
+    return tracker
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection parity & throughput of the CPU backends against the PyTorch model.")
+    parser.add_argument('--video', default='input_vids/08fd33_4.mp4', help="reference clip")
+    parser.add_argument('--weights', default='models/best.pt', help="PyTorch weights (reference)")
+    parser.add_argument('--backends', nargs='+', required=True, help="exported models (.onnx, OpenVINO .xml / directory)")
+    parser.add_argument('--openvino', action='store_true', help="also run the .onnx models on OpenVINO")
+    parser.add_argument('--start', type=int, default=0, help="first frame of the clip")
+    parser.add_argument('--frames', type=int, default=96, help="number of frames")
+    parser.add_argument('--inference-size', type=int, default=640, help="inference size of every backend")
+    parser.add_argument('--intra-op-threads', type=int, help="threads inside an operator (backend default when not set)")
+    parser.add_argument('--inter-op-threads', type=int, help="operators / inference streams in parallel")
+    parser.add_argument('--iou', type=float, default=0.5, help="IoU of a match")
+    parser.add_argument('--min-recall', type=float, default=0.95, help="recall & precision a backend needs to pass")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    frames = read_video_range(args.video, args.start, args.start + args.frames)
+    reference_tracker = Tracker(args.weights)
+    reference_tracker.set_inference_resolution(args.inference_size)
+    reference, reference_seconds = detect_backend(reference_tracker, frames)
+
+    settings = [(model_path, "onnxruntime" if model_path.endswith('.onnx') else "openvino") for model_path in args.backends]
+    if args.openvino:
+        settings += [(model_path, "openvino") for model_path in args.backends if model_path.endswith('.onnx')]
+
+    reference_backend = "pytorch" if args.weights.endswith('.pt') else "reference"
+    results = [{"model": args.weights, "backend": reference_backend, "frames_per_second": len(frames) / reference_seconds,
+                "speedup": 1.0, "passed": True}]
+    print(f"{'model':40s} {'backend':12s} {'frames/s':>9s} {'speedup':>8s} {'recall':>7s} {'precis.':>7s} {'box err':>8s}")
+    print(f"{args.weights:40s} {reference_backend:12s} {results[0]['frames_per_second']:9.2f} {1.0:8.2f}")
+    for model_path, backend in settings:
+        tracker = make_backend_tracker(model_path, backend, args.inference_size, args.intra_op_threads, args.inter_op_threads)
+        detections, seconds = detect_backend(tracker, frames)
+        comparison = compare_detections(reference, detections, args.iou)
+        detected = sum(total.get("detected", 0) for name, total in comparison.items() if name != "all")
+        precision = comparison["all"]["matched"] / detected if detected else None
+        recall = comparison["all"]["recall"]
+        result = {"model": model_path, "backend": backend, "frames_per_second": len(frames) / seconds,
+                  "speedup": reference_seconds / seconds, "recall": recall, "precision": precision,
+                  "max_box_error": max_box_error(reference, detections, args.iou), "comparison": comparison}
+        result["passed"] = recall is not None and precision is not None and min(recall, precision) >= args.min_recall
+        results.append(result)
+
+        format_ratio = lambda value: f"{value:7.3f}" if value is not None else f"{'-':>7s}"
+        print(f"{model_path:40s} {backend:12s} {result['frames_per_second']:9.2f} {result['speedup']:8.2f} "
+              f"{format_ratio(recall)} {format_ratio(precision)} {result['max_box_error']:8.2f} {'ok' if result['passed'] else 'FAILED'}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({"video": args.video, "frames": len(frames), "start": args.start, "inference_size": args.inference_size,
+                       "intra_op_threads": args.intra_op_threads, "inter_op_threads": args.inter_op_threads,
+                       "iou": args.iou, "results": results}, f, indent=1)
+        print(f"Results saved to {args.output}")
+
+    if not all(result["passed"] for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
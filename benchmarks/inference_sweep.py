@@ -0,0 +1,139 @@
+# Detector resolution sweep on a reference clip : python -m benchmarks.inference_sweep --video input_vids/08fd33_4.mp4
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import supervision as sv
+import sys
+sys.path.append('../')
+from utils import read_video_range
+from tracking import Tracker, FrameDetections
+
+def box_iou(boxes_a, boxes_b):
+    # IoU matrix of 2 sets of xyxy boxes
+    boxes_a, boxes_b = np.asarray(boxes_a, dtype=np.float64).reshape(-1,4), np.asarray(boxes_b, dtype=np.float64).reshape(-1,4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+def count_matches(reference_boxes, boxes, iou_threshold=0.5):
+    # greedy one to one matching, best IoU first
+    if len(reference_boxes) == 0 or len(boxes) == 0:
+        return 0
+    iou = box_iou(reference_boxes, boxes)
+    matches = 0
+    while True:
+        index = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[index] < iou_threshold:
+            return matches
+        matches += 1
+        iou[index[0], :] = -1
+        iou[:, index[1]] = -1
+
+def to_class_boxes(detection):
+    # {class name: xyxy boxes} of a frame, goalkeepers counted as players (like detections_to_tracks)
+    if not isinstance(detection, FrameDetections):
+        detection = FrameDetections(detection.names, sv.Detections.from_ultralytics(detection))
+    class_boxes = {}
+    for box, class_id in zip(detection.detections.xyxy, detection.detections.class_id):
+        name = detection.names[int(class_id)]
+        name = "player" if name == "goalkeeper" else name
+        class_boxes.setdefault(name, []).append(box)
+    return class_boxes
+
+def detect_setting(tracker, frames, inference_size, resize_at_decode):
+    """
+    Detections of the frames at one setting, timed.
+
+    Returns:
+        tuple: ([{class name: boxes}] per frame, detector seconds, resize seconds)
+    """
+    tracker.set_inference_resolution(inference_size, resize_at_decode)
+    resize_seconds = 0.0
+    resized_frames = None
+    if tracker.resizer is not None: # done on the decoder thread in the pipeline, timed apart
+        start = time.perf_counter()
+        resized_frames = [tracker.resizer.resize(frame) for frame in frames]
+        resize_seconds = time.perf_counter() - start
+
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), tracker.batch_size):
+        batch_resized = resized_frames[i:i+tracker.batch_size] if resized_frames is not None else None
+        detections += tracker.predict(frames[i:i+tracker.batch_size], batch_resized)
+    detector_seconds = time.perf_counter() - start
+    return [to_class_boxes(detection) for detection in detections], detector_seconds, resize_seconds
+
+def compare_detections(reference, detections, iou_threshold=0.5):
+    """
+    Recall (reference boxes found) and precision per class against the reference setting.
+
+    Returns:
+        dict: {class name: {"reference": n, "detected": n, "matched": n, "recall": r, "precision": p}}
+    """
+    totals = {}
+    for reference_frame, frame in zip(reference, detections):
+        for name in set(reference_frame) | set(frame):
+            total = totals.setdefault(name, {"reference": 0, "detected": 0, "matched": 0})
+            reference_boxes, boxes = reference_frame.get(name, []), frame.get(name, [])
+            total["reference"] += len(reference_boxes)
+            total["detected"] += len(boxes)
+            total["matched"] += count_matches(reference_boxes, boxes, iou_threshold)
+    for total in totals.values():
+        total["recall"] = total["matched"] / total["reference"] if total["reference"] else None
+        total["precision"] = total["matched"] / total["detected"] if total["detected"] else None
+    all_reference = sum(total["reference"] for total in totals.values())
+    totals["all"] = {"reference": all_reference, "matched": sum(total["matched"] for total in totals.values()),
+                     "recall": sum(total["matched"] for total in totals.values()) / all_reference if all_reference else None}
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector throughput vs recall over inference resolutions on a reference clip.")
+    parser.add_argument('--video', default='input_vids/08fd33_4.mp4', help="reference clip")
+    parser.add_argument('--model', default='models/best.pt', help="detection model weights")
+    parser.add_argument('--start', type=int, default=0, help="first frame of the clip")
+    parser.add_argument('--frames', type=int, default=96, help="number of frames")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1280, 960, 640, 480, 320], help="inference sizes (long side)")
+    parser.add_argument('--reference-size', type=int, default=1280, help="setting the recall is measured against")
+    parser.add_argument('--resize-at-decode', choices=['no', 'yes', 'both'], default='both', help="resize the frames before the detector")
+    parser.add_argument('--iou', type=float, default=0.5, help="IoU of a match")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    frames = read_video_range(args.video, args.start, args.start + args.frames)
+    tracker = Tracker(args.model)
+    tracker.predict(frames[:1]) # warm up
+
+    reference, _, _ = detect_setting(tracker, frames, args.reference_size, False)
+    modes = {'no': [False], 'yes': [True], 'both': [False, True]}[args.resize_at_decode]
+
+    results = []
+    print(f"{'size':>5s} {'resize':>6s} {'frames/s':>9s} {'ms/frame':>9s} {'resize ms':>9s} {'recall':>7s} {'player':>7s} {'referee':>7s} {'ball':>7s}")
+    for inference_size in args.sizes:
+        for resize_at_decode in modes:
+            detections, detector_seconds, resize_seconds = detect_setting(tracker, frames, inference_size, resize_at_decode)
+            comparison = compare_detections(reference, detections, args.iou)
+            result = {"inference_size": inference_size, "resize_at_decode": resize_at_decode,
+                      "frames_per_second": len(frames) / detector_seconds, "ms_per_frame": 1000 * detector_seconds / len(frames),
+                      "resize_ms_per_frame": 1000 * resize_seconds / len(frames), "comparison": comparison}
+            results.append(result)
+
+            recall = lambda name: f"{comparison[name]['recall']:7.3f}" if comparison.get(name, {}).get("recall") is not None else f"{'-':>7s}"
+            print(f"{inference_size:5d} {'yes' if resize_at_decode else 'no':>6s} {result['frames_per_second']:9.2f} "
+                  f"{result['ms_per_frame']:9.2f} {result['resize_ms_per_frame']:9.2f} {recall('all')} {recall('player')} "
+                  f"{recall('referee')} {recall('ball')}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({"video": args.video, "model": args.model, "frames": len(frames), "start": args.start,
+                       "reference_size": args.reference_size, "iou": args.iou, "results": results}, f, indent=1)
+        print(f"Results saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
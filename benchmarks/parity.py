@@ -0,0 +1,202 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from tracking import Tracker, BallInterpolator
+from team_assigner import TeamAssigner
+from player_ball_assignment import PlayerBallAssigner, PossessionEngine
+from camera_estimator import CameraMovementEstimator
+from perspective_view_transformer import ViewTransformer
+from speed_distance_estimator import SpeedAndDistanceEstimator
+from frame_compositor import FrameCompositor
+from track_store import TrackStore
+from utils import get_center_of_bbox, measure_distance
+
+def max_difference(reference, candidate):
+    # largest absolute difference between 2 arrays (NaN == NaN), inf when the shapes/NaN masks differ
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    if reference.shape != candidate.shape or (np.isnan(reference) != np.isnan(candidate)).any():
+        return float('inf')
+    difference = np.abs(np.nan_to_num(reference) - np.nan_to_num(candidate))
+    return float(difference.max()) if difference.size else 0.0
+
+def column_of(tracks, object, key, width=2):
+    # values of a key for every detection (frame by frame, by track ID), NaN rows where it's missing
+    rows = []
+    for track in tracks[object]:
+        for track_id in sorted(track):
+            value = track[track_id].get(key)
+            rows.append([np.nan]*width if value is None else np.ravel(value).tolist())
+    return np.array(rows, dtype=np.float64)
+
+def check_ball_interpolation(match):
+    # streaming BallInterpolator vs the whole-match interpolation
+    reference = Tracker(None).interpolate_ball_positions(match.tracks_after(None)["ball"])
+    interpolator = BallInterpolator(max_gap=match.num_frames)
+    candidate = [None]*match.num_frames
+    for frame_num, ball_track in enumerate(match.tracks["ball"]):
+        for ready_frame, bbox in interpolator.push(frame_num, ball_track.get(1, {}).get("bbox")):
+            candidate[ready_frame] = bbox
+    for ready_frame, bbox in interpolator.flush():
+        candidate[ready_frame] = bbox
+    reference = [ball_track[1]["bbox"] if 1 in ball_track else [np.nan]*4 for ball_track in reference]
+    candidate = [bbox if bbox is not None else [np.nan]*4 for bbox in candidate]
+    return max_difference(reference, candidate), 1e-6
+
+def check_track_store_positions(match):
+    # vectorized TrackStore stages vs the dictionary stages (position -> adjusted -> transformed)
+    reference = match.tracks_after("view_transform")
+    store = TrackStore.from_tracks(match.tracks_after(None))
+    Tracker(None).add_position_to_store(store)
+    CameraMovementEstimator(match.blank_frame()).add_adjust_positions_to_store(store, match.camera_movement)
+    ViewTransformer().add_transformed_position_to_store(store)
+    candidate = store.to_tracks()
+    return max(max_difference(column_of(reference, object, key), column_of(candidate, object, key))
+               for object in reference for key in ("position", "position_adjusted", "position_transformed")), 1e-3
+
+def check_view_transform(match):
+    # batched transform_points vs transform_point on every position
+    view_transformer = ViewTransformer()
+    positions = column_of(match.tracks_after("camera_adjust"), "players", "position_adjusted")
+    reference = []
+    for position in positions:
+        transformed = view_transformer.transform_point(np.array(position))
+        reference.append([np.nan]*2 if transformed is None else np.ravel(transformed).tolist())
+    candidate, _ = view_transformer.transform_points(positions)
+    return max_difference(reference, candidate), 1e-3
+
+def check_speed_and_distance(match):
+    # TrackStore, online (frame by frame) & windowed variants vs add_speed_and_distance_to_tracks
+    reference = match.tracks_after("speed_distance")
+    estimator = SpeedAndDistanceEstimator()
+
+    store = TrackStore.from_tracks(match.tracks_after("ball_interpolation"))
+    estimator.add_speed_and_distance_to_store(store)
+    store_tracks = store.to_tracks()
+
+    online_tracks = match.tracks_after("ball_interpolation")
+    estimator.start_stream()
+    for frame_num in range(match.num_frames):
+        estimator.update_speed_and_distance(frame_num, online_tracks["players"][frame_num])
+    estimator.finish_stream()
+
+    windowed_tracks = match.tracks_after("ball_interpolation")
+    add_speed_windows(estimator, windowed_tracks, (7, 12, 1, 30)) # window sizes not multiple of frame_window
+
+    return max(max_difference(column_of(reference, "players", key, 1), column_of(candidate, "players", key, 1))
+               for candidate in (store_tracks, online_tracks, windowed_tracks) for key in ("speed", "distance")), 1e-3
+
+def add_speed_windows(estimator, tracks, window_sizes):
+    # add_speed_and_distance_to_window on consecutive windows of the tracks (sizes cycled)
+    estimator.start_windows()
+    start_frame, number_of_frames = 0, len(tracks["players"])
+    for window_num in range(number_of_frames):
+        end_frame = min(start_frame + window_sizes[window_num % len(window_sizes)], number_of_frames)
+        window = {object: object_tracks[start_frame:end_frame] for object, object_tracks in tracks.items()}
+        estimator.add_speed_and_distance_to_window(window, final=end_frame == number_of_frames)
+        start_frame = end_frame
+        if start_frame == number_of_frames:
+            break
+
+def scan_ball_possessor(players, ball_bbox, max_player_ball_distance=70):
+    # original PlayerBallAssigner linear scan over the players of the frame
+    ball_position = get_center_of_bbox(ball_bbox)
+    minimum_distance = 99999
+    assigned_player = -1
+    for player_id, player in players.items():
+        player_bbox = player['bbox']
+        distance_left = measure_distance((player_bbox[0],player_bbox[-1]),ball_position)
+        distance_right = measure_distance((player_bbox[2],player_bbox[-1]),ball_position)
+        distance = min(distance_left, distance_right)
+        if distance < max_player_ball_distance and distance < minimum_distance:
+            minimum_distance = distance
+            assigned_player = player_id
+    return assigned_player
+
+def check_possession(match):
+    # PossessionEngine & PlayerBallAssigner (spatial index queries) vs the linear scan frame by frame
+    tracks = match.tracks_after("teams")
+    assigner = PlayerBallAssigner()
+    reference, assigned = [], []
+    for player_track, ball_track in zip(tracks["players"], tracks["ball"]):
+        reference.append(scan_ball_possessor(player_track, ball_track[1]["bbox"]) if 1 in ball_track else -1)
+        assigned.append(assigner.assign_ball_to_player(player_track, ball_track[1]["bbox"]) if 1 in ball_track else -1)
+    candidate = PossessionEngine().assign_tracks(tracks)["player"]
+    return max(max_difference(reference, candidate), max_difference(reference, assigned)), 0.0
+
+def isolated_bboxes(bboxes):
+    # bboxes that don't overlap any other one (a crop with another player in it is ambiguous)
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1,4)
+    overlap_x = np.minimum(bboxes[:,None,2], bboxes[None,:,2]) > np.maximum(bboxes[:,None,0], bboxes[None,:,0])
+    overlap_y = np.minimum(bboxes[:,None,3], bboxes[None,:,3]) > np.maximum(bboxes[:,None,1], bboxes[None,:,1])
+    overlap = overlap_x & overlap_y
+    np.fill_diagonal(overlap, False)
+    return bboxes[~overlap.any(axis=1)].tolist()
+
+def check_player_colors(match, frames_checked=3):
+    # batched 2-means kit colors vs a sklearn KMeans per player, on the players not overlapping
+    # another one : share of the crops where they disagree
+    team_assigner = TeamAssigner()
+    disagreements, crops = 0, 0
+    for frame, player_track in list(zip(match.frames, match.tracks["players"]))[:frames_checked]:
+        bboxes = isolated_bboxes([player["bbox"] for player in player_track.values()])
+        if not bboxes:
+            continue
+        reference = np.array([team_assigner.get_player_color(frame, bbox) for bbox in bboxes])
+        candidate = team_assigner.get_player_colors(frame, bboxes)
+        disagreements += int((np.abs(reference - candidate).max(axis=1) > 1).sum()) # color units
+        crops += len(bboxes)
+    return disagreements / max(crops, 1), 0.0
+
+def check_camera_movement(match):
+    # strip-only (fast) optical flow vs the full frame one
+    frames = match.frames
+    reference = CameraMovementEstimator(frames[0]).get_camera_movement(frames)
+    candidate = CameraMovementEstimator(frames[0], fast=True).get_camera_movement(frames)
+    _, error = CameraMovementEstimator.compare_camera_movement(reference, candidate)
+    return error, 0.1 # pixels
+
+def check_frame_compositor(match):
+    # single pass FrameCompositor vs draw_annotations + draw_camera_movement + draw_speed_and_distance
+    tracker = Tracker(None)
+    frames = match.frames
+    tracks = match.tracks_after("possession")
+    possession = PossessionEngine().assign_tracks(match.tracks_after("teams"))
+    team_ball_control = possession["team"][possession["player"] != -1]
+
+    reference = tracker.draw_annotations(frames, tracks, team_ball_control)
+    reference = CameraMovementEstimator(frames[0]).draw_camera_movement(reference, match.camera_movement)
+    reference = SpeedAndDistanceEstimator().draw_speed_and_distance(reference, tracks)
+
+    compositor = FrameCompositor(tracker)
+    error = 0.0
+    for reference_frame, frame in zip(reference, compositor.render_video(frames, tracks, possession, match.camera_movement)):
+        error = max(error, float(np.abs(reference_frame.astype(np.int16) - frame).max()))
+    return error, 0.0
+
+PARITY_CHECKS = {
+    "ball_interpolation": (False, check_ball_interpolation),
+    "track_store_positions": (False, check_track_store_positions),
+    "view_transform": (False, check_view_transform),
+    "speed_and_distance": (False, check_speed_and_distance),
+    "possession": (False, check_possession),
+    "player_colors": (True, check_player_colors),
+    "camera_movement": (True, check_camera_movement),
+    "frame_compositor": (True, check_frame_compositor),
+}
+
+def run_parity_checks(match, with_frames=True, log=print):
+    """
+    Runs every fast path against its reference implementation on a synthetic match.
+
+    Returns:
+        dict: {check: {"max_error": float, "tolerance": float, "passed": bool}}
+    """
+    results = {}
+    for name, (needs_frames, check) in PARITY_CHECKS.items():
+        if needs_frames and not with_frames:
+            continue
+        max_error, tolerance = check(match)
+        results[name] = {"max_error": max_error, "tolerance": tolerance, "passed": max_error <= tolerance}
+        log(f"{name:36s} max error {max_error:.3g} (tolerance {tolerance:g}) {'ok' if max_error <= tolerance else 'FAILED'}")
+    return results
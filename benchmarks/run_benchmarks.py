@@ -0,0 +1,85 @@
+# Stage benchmarks on synthetic matches : python -m benchmarks.run_benchmarks [--save-baseline]
+
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.append('../')
+from benchmarks import SyntheticMatch, STAGES, run_benchmarks, compare_to_baseline, run_parity_checks
+from benchmarks.stage_benchmarks import get_environment
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'baseline.json')
+
+def parse_resolution(resolution):
+    width, height = resolution.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Times & memory-profiles each stage of main.py on synthetic matches.")
+    parser.add_argument('--lengths', type=int, nargs='+', default=[750, 1500, 3000, 6000],
+                        help="match lengths (frames) for the stages working on tracks only")
+    parser.add_argument('--frame-lengths', type=int, nargs='+', default=[24, 48, 96],
+                        help="match lengths (frames) for the stages working on frames")
+    parser.add_argument('--players', type=int, default=22, help="number of players")
+    parser.add_argument('--resolution', type=parse_resolution, default=(1920,1080), help="WIDTHxHEIGHT")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help="stages to run (all by default)")
+    parser.add_argument('--repeats', type=int, default=5, help="timed runs per stage & length, the best is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help="allowed relative slow down")
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help="allowed relative peak memory increase")
+    parser.add_argument('--skip-parity', action='store_true', help="don't check the fast paths against the references")
+    args = parser.parse_args()
+
+    width, height = args.resolution
+    match_factory = lambda num_frames: SyntheticMatch(num_frames, args.players, width, height, args.seed)
+
+    # 1- fast paths vs reference implementations
+    parity = {}
+    if not args.skip_parity:
+        print("Parity checks :")
+        parity = run_parity_checks(match_factory(min(args.frame_lengths)))
+
+    # 2- stage timings & peak memory over the match lengths
+    print("Stage benchmarks :")
+    results = run_benchmarks(match_factory, args.lengths, args.frame_lengths, args.stages, args.repeats)
+    for stage, stage_results in results.items():
+        if stage_results["scaling_exponent"] is not None:
+            print(f"{stage:36s} scaling exponent {stage_results['scaling_exponent']:.2f}")
+
+    report = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "environment": get_environment(),
+        "parameters": {"players": args.players, "resolution": [width, height], "seed": args.seed,
+                       "lengths": args.lengths, "frame_lengths": args.frame_lengths, "repeats": args.repeats},
+        "stages": results,
+        "parity": parity
+    }
+
+    # 3- regressions against the baseline
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters", {}).get("resolution") != [width, height] or baseline.get("parameters", {}).get("players") != args.players:
+            print("Warning : the baseline was recorded with other match parameters")
+        regressions = compare_to_baseline(results, baseline["stages"], args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        report["regressions"] = regressions
+
+    for path in ([args.baseline] if args.save_baseline else []) + ([args.output] if args.output else []):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Results saved to {path}")
+
+    parity_failures = [name for name, check in parity.items() if not check["passed"]]
+    if regressions or parity_failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
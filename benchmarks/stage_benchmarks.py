@@ -0,0 +1,195 @@
+import gc
+import platform
+import time
+import tracemalloc
+import numpy as np
+import sys
+sys.path.append('../')
+from tracking import Tracker
+from team_assigner import TeamAssigner
+from player_ball_assignment import PossessionEngine
+from camera_estimator import CameraMovementEstimator
+from perspective_view_transformer import ViewTransformer
+from speed_distance_estimator import SpeedAndDistanceEstimator
+from frame_compositor import FrameCompositor
+
+# setup(match) of each stage prepares a fresh input (tracks as main.py has them before the stage)
+# and returns the function to time
+def _interpolate_ball(match):
+    tracker, ball = Tracker(None), match.tracks_after(None)["ball"]
+    return lambda: tracker.interpolate_ball_positions(ball)
+
+def _add_position(match):
+    tracker, tracks = Tracker(None), match.tracks_after(None)
+    return lambda: tracker.add_position_to_tracks(tracks)
+
+def _adjust_positions(match):
+    estimator, tracks = CameraMovementEstimator(match.blank_frame()), match.tracks_after("position")
+    return lambda: estimator.add_adjust_positions_to_tracks(tracks, match.camera_movement)
+
+def _transform_positions(match):
+    view_transformer, tracks = ViewTransformer(), match.tracks_after("camera_adjust")
+    return lambda: view_transformer.add_transformed_position_to_tracks(tracks)
+
+def _speed_and_distance(match):
+    estimator, tracks = SpeedAndDistanceEstimator(), match.tracks_after("ball_interpolation")
+    return lambda: estimator.add_speed_and_distance_to_tracks(tracks)
+
+def _team_assignment(match):
+    frames, tracks = match.frames, match.tracks_after(None)
+    def run():
+        team_assigner = TeamAssigner()
+        team_assigner.assign_team_color(frames[0], tracks["players"][0])
+        for frame_num, player_track in enumerate(tracks["players"]):
+            team_assigner.get_player_teams(frames[frame_num], player_track)
+    return run
+
+def _possession(match):
+    engine, tracks = PossessionEngine(), match.tracks_after("teams")
+    return lambda: engine.assign_tracks(tracks)
+
+def _camera_movement(match, fast):
+    frames = match.frames
+    def run():
+        estimator = CameraMovementEstimator(frames[0], fast=fast)
+        estimator.get_camera_movement(frames)
+    return run
+
+def _draw_annotations(match):
+    tracker, frames, tracks = Tracker(None), match.frames, match.tracks_after("possession")
+    team_ball_control = np.array([1 + frame_num % 2 for frame_num in range(match.num_frames)])
+    return lambda: tracker.draw_annotations(frames, tracks, team_ball_control)
+
+def _draw_camera_movement(match):
+    estimator, frames = CameraMovementEstimator(match.blank_frame()), match.frames
+    return lambda: estimator.draw_camera_movement(frames, match.camera_movement)
+
+def _draw_speed_and_distance(match):
+    estimator, frames, tracks = SpeedAndDistanceEstimator(), [frame.copy() for frame in match.frames], match.tracks_after("possession")
+    return lambda: estimator.draw_speed_and_distance(frames, tracks)
+
+def _frame_compositor(match):
+    frames, tracks = match.frames, match.tracks_after("possession")
+    possession = PossessionEngine().assign_tracks(match.tracks_after("teams"))
+    compositor = FrameCompositor(Tracker(None))
+    def run():
+        for _ in compositor.render_video(frames, tracks, possession, match.camera_movement):
+            pass
+    return run
+
+# stage name : (needs the decoded frames, setup)
+STAGES = {
+    "interpolate_ball_positions": (False, _interpolate_ball),
+    "add_position_to_tracks": (False, _add_position),
+    "add_adjust_positions_to_tracks": (False, _adjust_positions),
+    "add_transformed_position_to_tracks": (False, _transform_positions),
+    "add_speed_and_distance_to_tracks": (False, _speed_and_distance),
+    "possession": (False, _possession),
+    "team_assignment": (True, _team_assignment),
+    "camera_movement": (True, lambda match: _camera_movement(match, fast=False)),
+    "camera_movement_fast": (True, lambda match: _camera_movement(match, fast=True)),
+    "draw_annotations": (True, _draw_annotations),
+    "draw_camera_movement": (True, _draw_camera_movement),
+    "draw_speed_and_distance": (True, _draw_speed_and_distance),
+    "frame_compositor": (True, _frame_compositor),
+}
+
+def measure_stage(setup, match, repeats=3):
+    """
+    Times a stage (best of repeats, fresh input each time) and measures its peak traced memory
+    on one more run.
+
+    Returns:
+        dict: {"time": seconds, "time_per_frame": seconds, "peak_bytes": bytes}
+    """
+    times = []
+    for _ in range(repeats):
+        run = setup(match)
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    run = setup(match)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time": min(times), "time_per_frame": min(times) / match.num_frames, "peak_bytes": peak_bytes}
+
+def scaling_exponent(lengths, times):
+    # slope of log(time) vs log(length) : ~1 for a linear stage, ~2 for a quadratic one
+    lengths, times = np.asarray(lengths, dtype=np.float64), np.asarray(times, dtype=np.float64)
+    valid = times > 0
+    if valid.sum() < 2:
+        return None
+    return float(np.polyfit(np.log(lengths[valid]), np.log(times[valid]), 1)[0])
+
+def run_benchmarks(match_factory, lengths, frame_lengths, stages=None, repeats=3, log=print):
+    """
+    Benchmarks every stage over several match lengths.
+
+    Args:
+        match_factory (callable): num_frames -> SyntheticMatch.
+        lengths (list): Match lengths for the stages working on tracks only.
+        frame_lengths (list): Match lengths for the stages working on frames (decoded frames are
+                              held in memory, keep them short).
+        stages (list, optional): Names of the stages to run, all of STAGES if None.
+        repeats (int): Timed runs per stage & length (the best is kept).
+
+    Returns:
+        dict: {stage: {"results": {length: measure}, "scaling_exponent": float}}
+    """
+    stages = stages or list(STAGES)
+    results = {stage: {"results": {}} for stage in stages}
+
+    for length in sorted(set(lengths) | set(frame_lengths)):
+        match = match_factory(length)
+        for stage in stages:
+            needs_frames, setup = STAGES[stage]
+            if length not in (frame_lengths if needs_frames else lengths):
+                continue
+            measure = measure_stage(setup, match, repeats)
+            results[stage]["results"][str(length)] = measure
+            log(f"{stage:36s} {length:6d} frames {measure['time']*1000:10.2f} ms {measure['peak_bytes']/1024**2:9.2f} MiB")
+        del match
+
+    for stage in stages:
+        stage_results = results[stage]["results"]
+        results[stage]["scaling_exponent"] = scaling_exponent([int(length) for length in stage_results],
+                                                              [measure["time"] for measure in stage_results.values()])
+    return results
+
+def get_environment():
+    import cv2
+    return {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__,
+            "machine": platform.machine(), "processor": platform.processor(), "system": platform.system()}
+
+def compare_to_baseline(results, baseline, time_tolerance=0.25, memory_tolerance=0.25, min_time=1e-3):
+    """
+    Flags the stages slower (or using more memory) than the baseline by more than the tolerances.
+
+    Args:
+        results (dict): run_benchmarks output.
+        baseline (dict): run_benchmarks output of a previous run (the "stages" of a baseline file).
+        time_tolerance (float): Allowed relative slow down (0.25 = 25%).
+        memory_tolerance (float): Allowed relative peak memory increase.
+        min_time (float): Time differences under this (seconds) are ignored as noise.
+
+    Returns:
+        list: Regression messages (empty when there's none).
+    """
+    regressions = []
+    for stage, stage_results in results.items():
+        baseline_results = baseline.get(stage, {}).get("results", {})
+        for length, measure in stage_results["results"].items():
+            if length not in baseline_results:
+                continue
+            reference = baseline_results[length]
+            if measure["time"] > reference["time"] * (1 + time_tolerance) and measure["time"] - reference["time"] > min_time:
+                regressions.append(f"{stage} ({length} frames) : {reference['time']*1000:.2f} ms -> {measure['time']*1000:.2f} ms")
+            if measure["peak_bytes"] > reference["peak_bytes"] * (1 + memory_tolerance) and measure["peak_bytes"] - reference["peak_bytes"] > 1024**2:
+                regressions.append(f"{stage} ({length} frames) : peak {reference['peak_bytes']/1024**2:.2f} MiB -> {measure['peak_bytes']/1024**2:.2f} MiB")
+    return regressions
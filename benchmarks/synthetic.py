@@ -0,0 +1,231 @@
+import copy
+import cv2
+import numpy as np
+
+TEAM_SHIRT_COLORS = {1: (40, 40, 220), 2: (230, 230, 230)} # BGR : red & white kits
+REFEREE_SHIRT_COLOR = (20, 200, 230) # yellow
+
+def make_synthetic_tracks(num_frames, num_players=22, num_referees=3, width=1920, height=1080,
+                          ball_visibility=0.8, id_churn=0.002, seed=0):
+    """
+    Builds a tracks dictionary like Tracker.get_object_tracks returns, with players, referees and
+    a ball moving smoothly over the frame.
+
+    Args:
+        num_frames (int): Length of the match in frames.
+        num_players (int): Number of players on the pitch at any time.
+        num_referees (int): Number of referees.
+        width, height (int): Resolution of the (synthetic) video.
+        ball_visibility (float): Probability the ball is detected on a frame.
+        id_churn (float): Probability per frame & player that ByteTrack gives the player a new ID.
+        seed (int): Random seed, the same arguments always give the same tracks.
+
+    Returns:
+        dict: {"players": [...], "referees": [...], "ball": [...]} with one {track_id: {"bbox": [...]}}
+              dict per frame.
+    """
+    rng = np.random.default_rng(seed)
+    scale = height / 1080
+    player_size = np.array([40, 80]) * scale # width, height of a player bbox
+    ball_size = 14 * scale
+
+    def random_walk(number_of_objects):
+        # smooth trajectories : velocities are a slowly changing random walk, positions bounce on the borders
+        lower = np.array([player_size[0], player_size[1]])
+        upper = np.array([width - player_size[0], height - 2])
+        positions = np.empty((num_frames, number_of_objects, 2))
+        position = rng.uniform(lower, upper, size=(number_of_objects, 2))
+        velocity = rng.normal(0, 2*scale, size=(number_of_objects, 2))
+        for frame_num in range(num_frames):
+            velocity = np.clip(velocity + rng.normal(0, 0.5*scale, size=velocity.shape), -8*scale, 8*scale)
+            position = position + velocity
+            outside = (position < lower) | (position > upper)
+            velocity[outside] *= -1
+            position = np.clip(position, lower, upper)
+            positions[frame_num] = position
+        return positions # foot positions
+
+    def foot_to_bbox(foot):
+        x, y = foot
+        return [float(x - player_size[0]/2), float(y - player_size[1]), float(x + player_size[0]/2), float(y)]
+
+    player_feet = random_walk(num_players)
+    referee_feet = random_walk(num_referees)
+
+    tracks = {"players": [], "referees": [], "ball": []}
+    player_ids = np.arange(1, num_players+1)
+    next_id = num_players + num_referees + 1
+    holder = 0
+    for frame_num in range(num_frames):
+        churned = rng.random(num_players) < id_churn # lost & re-acquired by the tracker under a new ID
+        for index in np.flatnonzero(churned):
+            player_ids[index] = next_id
+            next_id += 1
+        tracks["players"].append({int(player_id): {"bbox": foot_to_bbox(foot)} for player_id, foot in zip(player_ids, player_feet[frame_num])})
+        tracks["referees"].append({num_players+1+i: {"bbox": foot_to_bbox(foot)} for i, foot in enumerate(referee_feet[frame_num])})
+
+        # the ball stays at the feet of a player and is passed from time to time
+        if rng.random() < 0.02:
+            holder = int(rng.integers(num_players))
+        if rng.random() < ball_visibility:
+            x, y = player_feet[frame_num, holder] + np.array([player_size[0]/2 + ball_size, -ball_size/2])
+            tracks["ball"].append({1: {"bbox": [float(x - ball_size/2), float(y - ball_size/2), float(x + ball_size/2), float(y + ball_size/2)]}})
+        else:
+            tracks["ball"].append({})
+
+    return tracks
+
+def make_synthetic_camera_movement(num_frames, pan_speed=(3.0, 1.0), seed=0):
+    # per frame camera movement of a slowly panning camera
+    rng = np.random.default_rng(seed)
+    movement = np.asarray(pan_speed) + rng.normal(0, 0.3, size=(num_frames, 2))
+    movement[0] = 0
+    return movement.tolist()
+
+def make_synthetic_frames(tracks, width=1920, height=1080, camera_movement=None, seed=0):
+    """
+    Renders frames for synthetic tracks : a textured pitch panned by the camera movement (so the
+    optical flow has corners to track) with players drawn as two-tone rectangles (shirt & shorts),
+    referees in yellow and a white ball.
+
+    Returns:
+        list: BGR frames (uint8).
+    """
+    rng = np.random.default_rng(seed)
+    num_frames = len(tracks["players"])
+    if camera_movement is None:
+        camera_movement = make_synthetic_camera_movement(num_frames, seed=seed)
+    camera_position = np.cumsum(np.asarray(camera_movement), axis=0)
+    margin = (np.abs(camera_position).max(axis=0) + 2).astype(int) if num_frames else np.array([2, 2])
+
+    # pitch : grass stripes + noise blobs & white marks giving good features to track
+    pitch = np.zeros((height + 2*margin[1], width + 2*margin[0], 3), dtype=np.uint8)
+    pitch[:] = (40, 130, 40)
+    stripe = max(8, width // 16)
+    for x in range(0, pitch.shape[1], 2*stripe):
+        pitch[:, x:x+stripe] = (50, 150, 50)
+    noise = rng.integers(-25, 25, size=(pitch.shape[0]//4+1, pitch.shape[1]//4+1, 1))
+    noise = np.repeat(np.repeat(noise, 4, axis=0), 4, axis=1)[:pitch.shape[0], :pitch.shape[1]]
+    pitch = np.clip(pitch.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    for x, y in rng.uniform((0, 0), (pitch.shape[1], pitch.shape[0]), size=(max(50, width*height//20000), 2)).astype(int):
+        cv2.circle(pitch, (int(x), int(y)), 3, (235, 235, 235), -1)
+
+    frames = []
+    for frame_num in range(num_frames):
+        x, y = (margin - camera_position[frame_num]).round().astype(int)
+        frame = pitch[y:y+height, x:x+width].copy()
+
+        for object, shirt_color in (("players", None), ("referees", REFEREE_SHIRT_COLOR)):
+            for track_id, track in tracks[object][frame_num].items():
+                x1, y1, x2, y2 = (int(v) for v in track["bbox"])
+                color = shirt_color if shirt_color is not None else TEAM_SHIRT_COLORS[1 + track_id % 2]
+                middle = (y1 + y2) // 2
+                cv2.rectangle(frame, (x1 + 4, y1), (x2 - 4, middle), color, -1)
+                cv2.rectangle(frame, (x1 + 6, middle), (x2 - 6, y2), (20, 20, 20), -1) # shorts & socks
+
+        for _, ball in tracks["ball"][frame_num].items():
+            x1, y1, x2, y2 = ball["bbox"]
+            cv2.circle(frame, (int((x1+x2)/2), int((y1+y2)/2)), max(2, int((x2-x1)/2)), (255, 255, 255), -1)
+
+        frames.append(frame)
+
+    return frames
+
+def write_synthetic_video(video_path, num_frames, num_players=22, width=1920, height=1080, fps=24, seed=0):
+    # synthetic match written to a video file (e.g. to run main / the streaming pipeline on it)
+    tracks = make_synthetic_tracks(num_frames, num_players, width=width, height=height, seed=seed)
+    frames = make_synthetic_frames(tracks, width, height, seed=seed)
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return tracks
+
+class SyntheticMatch():
+    """
+    Synthetic tracks (and lazily rendered frames) of one match length, with the tracks as they are
+    after each stage of main.py so every stage can be benchmarked on its real input.
+
+    Attributes:
+        num_frames (int): Length of the match in frames.
+        num_players (int): Number of players.
+        width, height (int): Resolution.
+        seed (int): Random seed.
+    """
+    def __init__(self, num_frames, num_players=22, width=1920, height=1080, seed=0):
+        self.num_frames = num_frames
+        self.num_players = num_players
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.tracks = make_synthetic_tracks(num_frames, num_players, width=width, height=height, seed=seed)
+        self.camera_movement = make_synthetic_camera_movement(num_frames, seed=seed)
+        self._frames = None
+        self._stage_tracks = {}
+
+    @property
+    def frames(self):
+        if self._frames is None:
+            self._frames = make_synthetic_frames(self.tracks, self.width, self.height, self.camera_movement, self.seed)
+        return self._frames
+
+    def blank_frame(self):
+        # first frame for the estimators that only need the resolution
+        return np.zeros((self.height, self.width, 3), dtype=np.uint8)
+
+    def tracks_after(self, stage):
+        """
+        Deep copy of the tracks after running main.py's stages up to stage (included), computed once
+        with the current implementations.
+
+        Args:
+            stage (str): One of None, "position", "camera_adjust", "view_transform", "ball_interpolation",
+                         "speed_distance", "teams", "possession".
+        """
+        if stage not in self._stage_tracks:
+            self._stage_tracks[stage] = self._run_stages(stage)
+        return copy.deepcopy(self._stage_tracks[stage])
+
+    def _run_stages(self, last_stage):
+        # imported here so the generators above don't need the whole pipeline
+        from tracking import Tracker
+        from camera_estimator import CameraMovementEstimator
+        from perspective_view_transformer import ViewTransformer
+        from speed_distance_estimator import SpeedAndDistanceEstimator
+        from player_ball_assignment import PossessionEngine
+
+        tracks = copy.deepcopy(self.tracks)
+
+        def interpolate_ball():
+            # interpolated balls only have a bbox : their positions are added again, like main.py does
+            ball_tracks = {"ball": Tracker(None).interpolate_ball_positions(tracks["ball"])}
+            Tracker(None).add_position_to_tracks(ball_tracks)
+            CameraMovementEstimator(self.blank_frame()).add_adjust_positions_to_tracks(ball_tracks, self.camera_movement)
+            ViewTransformer().add_transformed_position_to_tracks(ball_tracks)
+            tracks.update(ball_tracks)
+
+        stages = [
+            ("position", lambda: Tracker(None).add_position_to_tracks(tracks)),
+            ("camera_adjust", lambda: CameraMovementEstimator(self.blank_frame()).add_adjust_positions_to_tracks(tracks, self.camera_movement)),
+            ("view_transform", lambda: ViewTransformer().add_transformed_position_to_tracks(tracks)),
+            ("ball_interpolation", interpolate_ball),
+            ("speed_distance", lambda: SpeedAndDistanceEstimator().add_speed_and_distance_to_tracks(tracks)),
+            ("teams", lambda: self._assign_synthetic_teams(tracks)),
+            ("possession", lambda: PossessionEngine().assign_tracks(tracks)),
+        ]
+        if last_stage is None:
+            return tracks
+        for stage, run in stages:
+            run()
+            if stage == last_stage:
+                return tracks
+        raise ValueError(f"Unknown stage {last_stage}")
+
+    @staticmethod
+    def _assign_synthetic_teams(tracks):
+        # known teams of the synthetic kits (TeamAssigner is benchmarked on its own)
+        for player_track in tracks["players"]:
+            for player_id, player in player_track.items():
+                team = 1 + player_id % 2
+                player["team"] = team
+                player["team_color"] = np.array(TEAM_SHIRT_COLORS[team], dtype=np.float64)
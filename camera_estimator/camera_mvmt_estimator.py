@@ -2,12 +2,46 @@ import pickle
 import cv2
 import numpy as np
 import os 
+import time
 import sys 
 sys.path.append('../')
-from utils import measure_distance, measure_xy_distance
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from utils import read_video_range, get_video_properties, get_resolution_scale, scale_length, scale_points
+from instrumentation import metrics
+
+def _estimate_chunk_movement(estimator, start_frame, end_frame, video_path=None, frames=None):
+    """
+    Camera movement of frames [start_frame, end_frame), run in a worker process.
+
+    Speculative : the features are seeded on frame start_frame-1 (given as the first frame), as if
+    the camera had moved there. The stitching checks that against the previous chunk and repairs
+    the beginning of the chunk when it's wrong.
+    """
+    seed_frame = max(0, start_frame-1)
+    if frames is None:
+        frames = read_video_range(video_path, seed_frame, end_frame)
+
+    estimator.reset_stream()
+    camera_movement = estimator.get_camera_movement_window(frames)
+    return camera_movement[start_frame-seed_frame:]
+
+def _is_reseed(camera_movement):
+    # the features are re-seeded on every frame with a movement (over minimum_distance)
+    return camera_movement[0] != 0 or camera_movement[1] != 0
 
 class CameraMovementEstimator():
-    def __init__(self, frame):
+    """
+    Estimates the camera movement between consecutive frames with Lucas-Kanade optical flow on
+    corner features taken from the border strips of the frame (mask_columns).
+
+    Attributes:
+        fast (bool): Only converts & tracks the masked column strips (plus a margin for the LK
+                     window) instead of the whole frame.
+        downscale (float): Fast mode only, scale factor applied to the strips before optical flow,
+                           movements are rescaled back to full resolution pixels.
+    """
+    def __init__(self, frame, fast=False, downscale=1.0):
         # minimum distance threshold to consider a movement
         self.minimum_distance = 5
 
@@ -18,10 +52,27 @@ class CameraMovementEstimator():
             criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT,10,0.03) # termination criteria
         )
 
+        self.fast = fast
+        self.downscale = downscale if fast else 1.0
+        self.mask_columns = [(0,20), # first 20 columns of pixels -LEFT-
+                             (900,1050)] # 150 columns of pixels -MIDDLE-
+
+        # the strips & threshold were set on 1920x1080 frames
+        frame_size = (frame.shape[1], frame.shape[0])
+        scale_x, _ = get_resolution_scale(frame_size)
+        if scale_x != 1.0:
+            self.mask_columns = [(int(round(start*scale_x)), max(int(round(end*scale_x)), int(round(start*scale_x))+1))
+                                 for start, end in self.mask_columns]
+            self.minimum_distance = scale_length(self.minimum_distance, frame_size)
+
+        self.frame_height = frame.shape[0]
         first_frame_grayscale = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         mask_features = np.zeros_like(first_frame_grayscale)
-        mask_features[:,0:20] = 1 # first 20 rows of pixels -TOP-
-        mask_features[:,900:1050] = 1 # last 150 rows of pixels -BOTTOM-
+        for start, end in self.mask_columns:
+            mask_features[:,start:end] = 1
+
+        if self.fast:
+            mask_features = self.get_roi_mask(frame.shape[1])
 
         self.features = dict(
             maxCorners = 100,
@@ -31,6 +82,81 @@ class CameraMovementEstimator():
             mask = mask_features
         )
 
+        self.reset_stream()
+
+    def get_roi_columns(self, frame_width):
+        # column ranges actually converted in fast mode : each strip padded by the reach of the LK window
+        # on the coarsest pyramid level, overlapping ranges merged
+        margin = self.lk_params['winSize'][0] * 2**self.lk_params['maxLevel']
+        roi_columns = []
+        for start, end in sorted(self.mask_columns):
+            start, end = max(0, start-margin), min(frame_width, end+margin)
+            if roi_columns and start <= roi_columns[-1][1]:
+                roi_columns[-1] = (roi_columns[-1][0], max(end, roi_columns[-1][1]))
+            else:
+                roi_columns.append((start, end))
+        return roi_columns
+
+    def get_roi_mask(self, frame_width):
+        # features mask in the coordinates of the (downscaled) strips image built by get_grayscale
+        roi_masks = []
+        for start, end in self.get_roi_columns(frame_width):
+            roi_mask = np.zeros(end-start, dtype=np.uint8)
+            for mask_start, mask_end in self.mask_columns:
+                roi_mask[max(mask_start,start)-start:max(min(mask_end,end)-start,0)] = 1
+            roi_masks.append(roi_mask)
+        roi_mask = np.concatenate(roi_masks)
+        roi_width = int(round(len(roi_mask)*self.downscale))
+        roi_mask = cv2.resize(roi_mask[None,:], (roi_width,1), interpolation=cv2.INTER_NEAREST)[0] if self.downscale != 1.0 else roi_mask
+        return np.ascontiguousarray(np.broadcast_to(roi_mask, (self._roi_height(), len(roi_mask))))
+
+    def _roi_height(self):
+        return self.frame_height if self.downscale == 1.0 else int(round(self.frame_height*self.downscale))
+
+    def get_grayscale(self, frame):
+        """
+        Grayscale image the optical flow runs on : the whole frame, or in fast mode only the padded
+        mask strips side by side, optionally downscaled.
+        """
+        if not self.fast:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        strips = [cv2.cvtColor(frame[:,start:end], cv2.COLOR_BGR2GRAY) for start, end in self.get_roi_columns(frame.shape[1])]
+        frame_gray = np.hstack(strips)
+        if self.downscale != 1.0:
+            frame_gray = cv2.resize(frame_gray, (self.features['mask'].shape[1], self.features['mask'].shape[0]), interpolation=cv2.INTER_AREA)
+        return frame_gray
+
+    def get_max_movement(self, old_features, new_features):
+        """
+        Finds the feature that moved the most between two frames with a NumPy argmax over the
+        displacement norms.
+
+        Returns:
+            tuple: (max_distance, camera_movement_x, camera_movement_y) in full resolution pixels.
+        """
+        displacement = (old_features - new_features).reshape(-1,2) / self.downscale # old - new, like measure_xy_distance
+        if len(displacement) == 0:
+            return 0, 0, 0
+
+        distances = np.hypot(displacement[:,0], displacement[:,1])
+        max_index = np.argmax(distances)
+        camera_movement_x, camera_movement_y = displacement[max_index]
+        return distances[max_index], camera_movement_x, camera_movement_y
+
+    @staticmethod
+    def compare_camera_movement(reference, candidate, tolerance=1.0):
+        """
+        Checks that two camera movement lists (e.g. fast mode vs. the full resolution implementation)
+        match within tolerance pixels on every frame.
+
+        Returns:
+            tuple: (is_matching, max_error)
+        """
+        error = np.abs(np.asarray(reference, dtype=np.float64) - np.asarray(candidate, dtype=np.float64))
+        max_error = float(error.max()) if error.size else 0.0
+        return max_error <= tolerance, max_error
+
     def add_adjust_positions_to_tracks(self,tracks, camera_movement_per_frame):
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
@@ -40,56 +166,191 @@ class CameraMovementEstimator():
                     position_adjusted = (position[0]-camera_movement[0],position[1]-camera_movement[1])
                     tracks[object][frame_num][track_id]['position_adjusted'] = position_adjusted
 
-    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None):
-        # read the stub file if it exists (for existing tracks)
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path,'rb') as f:
-                return pickle.load(f)
-            
-        camera_movement = [[0,0]] *len(frames) # init
+    def add_adjust_positions_to_store(self, store, camera_movement_per_frame):
+        # vectorized add_adjust_positions_to_tracks for a TrackStore : one subtraction per object class
+        camera_movement_per_frame = np.asarray(camera_movement_per_frame, dtype=np.float32).reshape(-1,2)
+        for object_tracks in store.values():
+            position = object_tracks.columns["position"].astype(np.float32)
+            object_tracks.set_column("position_adjusted", position - camera_movement_per_frame[object_tracks.frame])
 
-        # grayscale conversion for feature extraction
-        old_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray, **self.features) # extracts corner features
+    def reset_stream(self):
+        # forget the frame/features carried between windows
+        self.previous_gray = None
+        self.previous_features = None
 
-        for frame_num in range(1,len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num],cv2.COLOR_BGR2GRAY)
-            new_features, _,_ = cv2.calcOpticalFlowPyrLK(old_gray,frame_gray,old_features,None,**self.lk_params)
+    def get_camera_movement_window(self, frames):
+        """
+        Estimates the camera movement for the next window of a video stream.
+
+        The last grayscale frame and its tracked features are kept between calls, so feeding
+        consecutive windows gives the same result as running on the whole video at once.
+
+        Args:
+            frames (list): Consecutive frames following the previous window.
+
+        Returns:
+            list: [x, y] camera movement for each frame of the window.
+        """
+        camera_movement = [[0,0]] *len(frames) # init
+        start_frame = 0
+
+        if self.previous_gray is None: # first window : the first frame has no movement
+            # grayscale conversion for feature extraction
+            self.previous_gray = self.get_grayscale(frames[0])
+            self.previous_features = cv2.goodFeaturesToTrack(self.previous_gray, **self.features) # extracts corner features
+            start_frame = 1
 
-            max_distance = 0
-            camera_movement_x, camera_movement_y = 0,0 
+        old_gray = self.previous_gray
+        old_features = self.previous_features
 
-            for i, (new,old) in enumerate(zip(new_features,old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
+        for frame_num in range(start_frame,len(frames)):
+            frame_start = time.perf_counter()
+            frame_gray = self.get_grayscale(frames[frame_num])
+            new_features, _,_ = cv2.calcOpticalFlowPyrLK(old_gray,frame_gray,old_features,None,**self.lk_params)
 
-                distance = measure_distance(new_features_point,old_features_point)
-                if distance>max_distance:
-                    max_distance = distance
-                    camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
+            max_distance, camera_movement_x, camera_movement_y = self.get_max_movement(old_features, new_features)
             
             if max_distance > self.minimum_distance:
                 camera_movement[frame_num] = [camera_movement_x,camera_movement_y]
                 old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
 
             old_gray = frame_gray.copy()
-        
+            metrics.observe("optical_flow_frame_seconds", time.perf_counter() - frame_start)
+
+        self.previous_gray = old_gray
+        self.previous_features = old_features
+
+        return camera_movement
+
+    def get_cache_params(self):
+        # parameters the camera movement depends on (StageCache key)
+        features = {k: v for k, v in self.features.items() if k != 'mask'}
+        return {"minimum_distance": self.minimum_distance, "lk_params": self.lk_params, "features": features,
+                "mask_columns": self.mask_columns, "fast": self.fast, "downscale": self.downscale}
+
+    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None, cache=None, video_path=None, num_workers=1):
+        # read the stub file if it exists (for existing tracks)
+        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
+            with open(stub_path,'rb') as f:
+                return pickle.load(f)
+
+        # or the result of the same video & parameters from the stage cache
+        if cache is not None and video_path is not None:
+            key = cache.make_key("camera_movement", video_path, params=self.get_cache_params())
+            arrays = cache.get(key, (0, len(frames)))
+            if arrays is not None:
+                return arrays["camera_movement"].tolist()
+            
+        if num_workers is None or num_workers > 1: # same result, chunks estimated on several cores
+            camera_movement = self.get_camera_movement_parallel(frames, num_workers=num_workers)
+        else:
+            self.reset_stream()
+            camera_movement = self.get_camera_movement_window(frames)
+
         if stub_path is not None:
             with open(stub_path,'wb') as f:
                 pickle.dump(camera_movement,f)
 
+        if cache is not None and video_path is not None:
+            cache.put(key, {"camera_movement": np.array(camera_movement, dtype=np.float32).reshape(-1,2)},
+                      (0, len(frames)), stage="camera_movement")
+
         return camera_movement
     
+    def get_camera_movement_parallel(self, frames=None, video_path=None, num_workers=None, chunk_size=240, max_in_flight=None):
+        """
+        Estimates the camera movement on several CPU cores, with the same result as the sequential
+        get_camera_movement_window. The video is split into chunks of chunk_size frames estimated
+        in worker processes, each seeded on the frame before it as if the camera had moved there.
+
+        The sequential state at a chunk start is the last frame the features were re-seeded on (the
+        last frame with a movement), known once the previous chunk is stitched. When it isn't the
+        frame before the chunk, the chunk is re-run here from that state until both runs re-seed
+        on the same frame (from there on they're identical), usually a few frames.
+
+        Args:
+            frames (list, optional): Frames already in memory (sent to the workers chunk by chunk).
+            video_path (str, optional): Video to read, each worker then decodes only its own chunk.
+            num_workers (int, optional): Number of processes, defaults to the number of CPUs.
+            chunk_size (int): Frames per chunk.
+            max_in_flight (int, optional): Chunks submitted and not stitched yet (2 per worker by
+                                           default), bounds the frames copied to the workers.
+
+        Returns:
+            list: [x, y] camera movement for each frame.
+        """
+        if frames is None and video_path is None:
+            raise ValueError("Either frames or video_path is required.")
+
+        number_of_frames = len(frames) if frames is not None else get_video_properties(video_path)["frame_count"]
+        num_workers = num_workers or os.cpu_count() or 1
+        max_in_flight = max_in_flight or 2*num_workers
+        chunk_starts = list(range(0, number_of_frames, chunk_size))
+
+        camera_movement = []
+        last_reseed = 0 # frame the features of the sequential run come from
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            in_flight = deque()
+            next_chunk = 0
+            while next_chunk < len(chunk_starts) or in_flight:
+                while next_chunk < len(chunk_starts) and len(in_flight) < max_in_flight:
+                    start_frame = chunk_starts[next_chunk]
+                    end_frame = min(start_frame+chunk_size, number_of_frames)
+                    chunk_frames = frames[max(0,start_frame-1):end_frame] if frames is not None else None
+                    in_flight.append((start_frame, end_frame, executor.submit(_estimate_chunk_movement, self, start_frame,
+                                                                              end_frame, video_path, chunk_frames)))
+                    next_chunk += 1
+
+                start_frame, end_frame, future = in_flight.popleft() # stitched in frame order
+                chunk_movement = future.result()
+                if start_frame > 0 and last_reseed != start_frame-1:
+                    chunk_movement = self.repair_chunk(chunk_movement, start_frame, end_frame, last_reseed, frames, video_path)
+                camera_movement += chunk_movement
+                for frame_num in range(end_frame-1, start_frame-1, -1):
+                    if _is_reseed(camera_movement[frame_num]):
+                        last_reseed = frame_num
+                        break
+
+        return camera_movement
+
+    def repair_chunk(self, chunk_movement, start_frame, end_frame, last_reseed, frames=None, video_path=None):
+        """
+        Re-runs the beginning of a chunk from the sequential state (features seeded on last_reseed)
+        until it re-seeds on a frame the speculative run also re-seeded on.
+
+        Returns:
+            list: Exact camera movement of the chunk.
+        """
+        get_frames = (lambda first, last: frames[first:last]) if frames is not None else \
+                     (lambda first, last: read_video_range(video_path, first, last))
+        self.reset_stream()
+        self.previous_gray = self.get_grayscale(get_frames(start_frame-1, start_frame)[0])
+        self.previous_features = cv2.goodFeaturesToTrack(self.get_grayscale(get_frames(last_reseed, last_reseed+1)[0]), **self.features)
+
+        chunk_movement = list(chunk_movement)
+        for offset, frame in enumerate(get_frames(start_frame, end_frame)):
+            speculative = chunk_movement[offset]
+            chunk_movement[offset] = self.get_camera_movement_window([frame])[0]
+            if _is_reseed(chunk_movement[offset]) and _is_reseed(speculative):
+                break # same features from here on
+        self.reset_stream()
+        return chunk_movement
+
     def draw_camera_movement(self,frames, camera_movement_per_frame):
         output_frames=[]
 
         for frame_num, frame in enumerate(frames):
             frame= frame.copy()
 
+            frame_size = (frame.shape[1], frame.shape[0])
+            top_left, bottom_right, x_origin, y_origin = ((int(x), int(y)) for x, y in scale_points(
+                [(0,0), (500,100), (10,30), (10,60)], frame_size).round()) # set on 1920x1080
+            font_scale = get_resolution_scale(frame_size)[1]
+
             overlay = frame.copy()
             cv2.rectangle(overlay,
-                          (0,0),
-                          (500,100),
+                          top_left,
+                          bottom_right,
                           (255,255,255), # white
                           -1) # filled
             alpha =0.6 # transparency
@@ -101,8 +362,8 @@ class CameraMovementEstimator():
                             frame)
 
             x_movement, y_movement = camera_movement_per_frame[frame_num]
-            frame = cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
-            frame = cv2.putText(frame,f"Camera Movement Y: {y_movement:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+            frame = cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",x_origin, cv2.FONT_HERSHEY_SIMPLEX,font_scale,(0,0,0),max(1, round(3*font_scale)))
+            frame = cv2.putText(frame,f"Camera Movement Y: {y_movement:.2f}",y_origin, cv2.FONT_HERSHEY_SIMPLEX,font_scale,(0,0,0),max(1, round(3*font_scale)))
 
             output_frames.append(frame) 
 
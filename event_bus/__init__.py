@@ -0,0 +1,6 @@
+# Exposing
+
+
+from .messages import build_frame_message, decode_batch
+from .sinks import FileEventSink, SocketEventSink, KafkaEventSink, read_socket_batches
+from .publisher import FramePublisher
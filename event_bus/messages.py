@@ -0,0 +1,70 @@
+import gzip
+import json
+import math
+
+# compact per-frame message (JSON, short keys) :
+# {"m": match id, "f": frame, "t": match time (s), "o": possessor id (-1 = nobody), "ot": possessor team (0 = nobody),
+#  "p": [[player id, team, x, y, speed], ...], "b": [x, y] or null}
+# x & y are pitch coordinates (m) when the view transform gave some, speed is in km/h
+
+def _round(value, digits=2):
+    if value is None:
+        return None
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
+
+def _position(track):
+    position = track.get("position_transformed")
+    if position is None:
+        return None, None
+    return _round(position[0]), _round(position[1])
+
+def build_frame_message(match_id, frame_num, timestamp, player_track, ball_track, possessor, possessor_team):
+    """
+    Compact message of a frame (plain python types, ready for json.dumps).
+
+    Args:
+        match_id (str): Match of the frame.
+        frame_num (int): Index of the frame in the match.
+        timestamp (float): Match time of the frame (s).
+        player_track (dict): {player_id: track} of the frame.
+        ball_track (dict): {1: track} of the frame (empty when the ball isn't seen).
+        possessor (int): Player with the ball (-1 = nobody).
+        possessor_team (int): Team with the ball (0 = nobody).
+
+    Returns:
+        dict: The message.
+    """
+    players = []
+    for player_id, player in player_track.items():
+        x, y = _position(player)
+        team = player.get("team")
+        players.append([int(player_id), int(team) if team is not None else None, x, y, _round(player.get("speed"), 1)])
+
+    ball = None
+    for _, ball_data in ball_track.items():
+        x, y = _position(ball_data)
+        if x is not None:
+            ball = [x, y]
+
+    return {"m": match_id, "f": int(frame_num), "t": round(timestamp, 3), "o": int(possessor), "ot": int(possessor_team),
+            "p": players, "b": ball}
+
+def encode_message(message):
+    return json.dumps(message, separators=(',', ':')).encode('utf-8')
+
+def encode_batch(encoded_messages, compress=True):
+    # newline delimited messages, gzipped
+    payload = b"\n".join(encoded_messages) + b"\n"
+    return gzip.compress(payload, compresslevel=5) if compress else payload
+
+def decode_batch(payload, compressed=True):
+    """
+    Messages of a batch sent by SocketEventSink (for the consumers).
+
+    Returns:
+        list: The messages (dicts).
+    """
+    if compressed:
+        payload = gzip.decompress(payload)
+    return [json.loads(line) for line in payload.splitlines() if line]
@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+import sys
+sys.path.append('../')
+from instrumentation import metrics
+from .messages import build_frame_message, encode_message
+
+class FramePublisher():
+    """
+    Publishes the tracking output frame by frame (see messages.build_frame_message) to an event sink
+    (FileEventSink, SocketEventSink, KafkaEventSink) from a background thread.
+
+    publish_frame() only builds the compact message and queues it : encoding, batching and sending
+    happen on the publisher thread (batches of batch_size messages, or whatever came within linger
+    seconds). The queue is bounded : when a slow consumer lets it fill up, the oldest messages are
+    dropped (and counted) so detection never waits on the consumer. With drop_when_full=False
+    publish_frame() blocks instead, for offline runs where every frame must be delivered.
+
+    Attributes:
+        sink: Event sink (send(messages) & close()).
+        match_id (str): Match of the messages.
+        fps (float): Frame rate of the video (match time of the frames).
+        batch_size (int): Maximum messages per batch.
+        linger (float): Maximum time (s) a message waits for its batch to fill.
+        max_queue (int): Maximum messages waiting to be sent.
+        drop_when_full (bool): Drops the oldest messages instead of blocking when the queue is full.
+    """
+    def __init__(self, sink, match_id='match', fps=24, batch_size=50, linger=0.1, max_queue=2000, drop_when_full=True):
+        self.sink = sink
+        self.match_id = match_id
+        self.fps = fps
+        self.batch_size = batch_size
+        self.linger = linger
+        self.drop_when_full = drop_when_full
+        self.messages = queue.Queue(maxsize=max_queue)
+
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.last_error = None
+
+        self.closed = False
+        self.thread = threading.Thread(target=self.publish_loop, daemon=True)
+        self.thread.start()
+
+    def put(self, message):
+        if not self.drop_when_full:
+            self.messages.put(message)
+            return
+        while True:
+            try:
+                self.messages.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.messages.get_nowait() # oldest message
+                    self.messages.task_done()
+                    self.messages_dropped += 1
+                    metrics.inc("event_bus_dropped_messages_total", 1, reason="queue_full")
+                except queue.Empty:
+                    pass
+
+    def publish_frame(self, frame_num, player_track, ball_track, possessor=-1, possessor_team=0):
+        """
+        Queues the message of a frame (never blocks unless drop_when_full is False).
+
+        Args:
+            frame_num (int): Index of the frame in the match.
+            player_track (dict): {player_id: track} of the frame.
+            ball_track (dict): {1: track} of the frame.
+            possessor (int): Player with the ball (-1 = nobody).
+            possessor_team (int): Team with the ball (0 = nobody).
+        """
+        if self.closed:
+            raise ValueError("publish_frame() on a closed FramePublisher")
+        self.put(build_frame_message(self.match_id, frame_num, frame_num / self.fps, player_track, ball_track,
+                                     possessor, possessor_team))
+        metrics.set("queue_depth", self.messages.qsize(), queue="event_bus")
+
+    def publish_window(self, tracks, possession, start_frame=0):
+        """
+        Queues the messages of consecutive frames (tracks & PossessionEngine result of a window or a match).
+        """
+        for frame_num, player_track in enumerate(tracks["players"]):
+            self.publish_frame(start_frame + frame_num, player_track, tracks["ball"][frame_num],
+                               possession["player"][frame_num], possession["team"][frame_num])
+
+    def next_batch(self):
+        # waits for a first message, then gathers more until the batch is full or linger ran out
+        message = self.messages.get()
+        if message is None:
+            return None
+        batch = [message]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                message = self.messages.get(timeout=remaining) if remaining > 0 else self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message is None: # close marker : sends what was gathered first
+                self.messages.task_done()
+                self.messages.put(None)
+                break
+            batch.append(message)
+        return batch
+
+    def publish_loop(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                self.messages.task_done()
+                break
+            try:
+                with metrics.timer("event_bus_send_seconds"):
+                    self.sink.send([encode_message(message) for message in batch])
+                self.messages_sent += len(batch)
+                metrics.inc("event_bus_messages_total", len(batch))
+            except Exception as error: # a failing consumer never stops the pipeline
+                self.last_error = error
+                self.messages_dropped += len(batch)
+                metrics.inc("event_bus_dropped_messages_total", len(batch), reason="send_error")
+            finally:
+                for _ in batch:
+                    self.messages.task_done()
+
+    def flush(self):
+        # blocks until every queued message has been sent (or dropped)
+        self.messages.join()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.messages.put(None) # stops the publisher thread once the queue is drained
+        self.thread.join()
+        self.sink.close()
@@ -0,0 +1,130 @@
+import gzip
+import socket
+import struct
+from .messages import encode_batch, decode_batch
+
+try:
+    from kafka import KafkaProducer
+except ImportError: # only needed by KafkaEventSink
+    KafkaProducer = None
+
+# every sink takes batches of encoded messages (list of bytes) with send(messages) and is closed with close()
+
+class FileEventSink():
+    """
+    Appends the messages to a newline delimited JSON file (gzip compressed when the path ends with .gz),
+    flushed after each batch so a `tail -f` consumer sees the frames as they come.
+
+    Attributes:
+        path (str): Output file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'ab') if path.endswith('.gz') else open(path, 'ab')
+
+    def send(self, messages):
+        self.file.write(b"\n".join(messages) + b"\n")
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+class SocketEventSink():
+    """
+    Sends the batches to a TCP consumer, each batch as a 4 bytes (big endian) length followed by the
+    newline delimited messages, gzip compressed (see read_socket_batches for the consumer side).
+    A lost connection is reopened on the next batch, the batch that failed is dropped (raised to the
+    publisher, which counts it).
+
+    Attributes:
+        host (str): Consumer host.
+        port (int): Consumer port.
+        compress (bool): Gzip the batches.
+        timeout (float): Connection & send timeout (s).
+    """
+    def __init__(self, host='127.0.0.1', port=9200, compress=True, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.compress = compress
+        self.timeout = timeout
+        self.connection = None
+
+    def connect(self):
+        self.connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, messages):
+        payload = encode_batch(messages, self.compress)
+        if self.connection is None:
+            self.connect()
+        try:
+            self.connection.sendall(struct.pack('>I', len(payload)) + payload)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+def _recv_exactly(connection, size):
+    data = b""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def read_socket_batches(connection, compressed=True):
+    """
+    Consumer side of SocketEventSink : yields the messages of each batch received on a connection
+    until it's closed.
+
+    Yields:
+        list: Messages (dicts) of a batch.
+    """
+    while True:
+        header = _recv_exactly(connection, 4)
+        if header is None:
+            return
+        payload = _recv_exactly(connection, struct.unpack('>I', header)[0])
+        if payload is None:
+            return
+        yield decode_batch(payload, compressed)
+
+class KafkaEventSink():
+    """
+    Publishes every message as a record of a Kafka topic (kafka-python), keyed by the match so the
+    frames of a match stay ordered in one partition. Batching and compression are done by the
+    producer (linger_ms, batch_bytes, compression).
+
+    Attributes:
+        bootstrap_servers (str): Kafka brokers (host:port[,host:port]).
+        topic (str): Topic of the messages.
+        key (str): Record key (the match id).
+        compression (str): Producer compression ('gzip', 'lz4', 'snappy', 'zstd' or None).
+        linger_ms (int): Time the producer waits to fill a batch.
+        batch_bytes (int): Producer batch size per partition.
+        max_block_ms (int): Time send() may block when the producer buffer is full.
+    """
+    def __init__(self, bootstrap_servers, topic='futbol-frames', key='match', compression='gzip',
+                 linger_ms=50, batch_bytes=256*1024, max_block_ms=1000):
+        if KafkaProducer is None:
+            raise ImportError("KafkaEventSink needs kafka-python (pip install kafka-python)")
+        self.topic = topic
+        self.key = key.encode('utf-8')
+        self.producer = KafkaProducer(bootstrap_servers=bootstrap_servers.split(','), compression_type=compression,
+                                      linger_ms=linger_ms, batch_size=batch_bytes, max_block_ms=max_block_ms, acks=1)
+
+    def send(self, messages):
+        for message in messages:
+            self.producer.send(self.topic, value=message, key=self.key)
+
+    def close(self):
+        self.producer.flush()
+        self.producer.close()
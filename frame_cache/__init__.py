@@ -0,0 +1,4 @@
+# Exposing
+
+
+from .frame_cache import FrameCache, CachedVideo
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import get_video_properties
+from instrumentation import metrics
+
+META_FILE = 'meta.json'
+RAW_FILE = 'frames.raw'
+
+class CachedVideo():
+    """
+    Decoded frames of a video served from a FrameCache entry : the raw file is memory-mapped and
+    every frame is a read-only view on it (no copy, no decoding), loaded by the OS on access.
+
+    Behaves like the list of frames read_video returns (len, indexing, slicing, iteration), so it
+    can be passed to every stage in place of it.
+
+    Attributes:
+        video_path (str): Source video.
+        fps (float): Frame rate of the source video.
+        frame_size (tuple): (width, height) of the frames.
+    """
+    def __init__(self, entry_dir, meta):
+        self.video_path = meta["video"]
+        self.fps = meta["fps"]
+        self.frame_size = (meta["width"], meta["height"])
+        shape = (meta["frame_count"], meta["height"], meta["width"], 3)
+        self.frames = np.memmap(os.path.join(entry_dir, RAW_FILE), dtype=np.uint8, mode='r', shape=shape).view(np.ndarray)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        # a frame (view) for an index, a list of frames for a slice (like the list of read_video)
+        if isinstance(index, slice):
+            return list(self.frames[index])
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def read_windows(self, window_size, start_frame=0):
+        # same windows as read_video_windows, without decoding
+        for window_start in range(start_frame, len(self.frames), window_size):
+            yield window_start, self[window_start:window_start+window_size]
+
+class FrameCache():
+    """
+    Decoded frame cache : a video is decoded once into a raw file (frames stored back to back, so
+    frame i is at offset i * frame bytes, the entry's meta.json holding the shape, fps & source)
+    and every later run memory-maps it instead of running the decoder.
+
+    Entries are keyed by the absolute path, size and modification time of the video. An entry is
+    recorded while its frames are first decoded (in a temporary directory renamed when the video
+    is complete, so a crash or a concurrent run never leaves a partial entry) and the least
+    recently used entries are evicted to keep the cache under max_bytes. The last access of an
+    entry is the modification time of its raw file : a hit never rewrites any index.
+
+    Attributes:
+        cache_dir (str): Directory of the cache.
+        max_bytes (int): Size limit of the cache, a video bigger than that is decoded without caching.
+    """
+    def __init__(self, cache_dir='cache/frames', max_bytes=64*1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, video_path):
+        stat = os.stat(video_path)
+        video_id = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha256(video_id.encode()).hexdigest()[:32]
+
+    def open(self, video_path):
+        """
+        Cached frames of video_path.
+
+        Returns:
+            CachedVideo or None: None when the video isn't cached (or changed since).
+        """
+        entry_dir = os.path.join(self.cache_dir, self.get_key(video_path))
+        try:
+            with open(os.path.join(entry_dir, META_FILE)) as f:
+                meta = json.load(f)
+            video = CachedVideo(entry_dir, meta)
+            os.utime(os.path.join(entry_dir, RAW_FILE)) # last access, for the LRU eviction
+        except (OSError, ValueError): # not cached, or evicted by another process
+            return None
+        return video
+
+    def get_video_bytes(self, video_path):
+        # size of the decoded video, with its properties
+        properties = get_video_properties(video_path)
+        return properties["frame_count"] * properties["width"] * properties["height"] * 3, properties
+
+    def iter_frames(self, video_path):
+        """
+        Every frame of video_path : from the cache when it's there, otherwise decoded and recorded
+        into the cache on the way (when it fits), so the next run skips the decoder.
+
+        Yields:
+            np.ndarray: Frames in order.
+        """
+        video = self.open(video_path)
+        metrics.inc("frame_cache_requests_total", result="hit" if video is not None else "miss")
+        if video is not None:
+            yield from video
+            return
+
+        video_bytes, properties = self.get_video_bytes(video_path)
+        if video_bytes > self.max_bytes:
+            print(f"{video_path} ({video_bytes/1024**3:.1f} GB decoded) is over the frame cache limit, not cached")
+            yield from self.decode(video_path)
+        else:
+            yield from self.record(video_path, properties, video_bytes)
+
+    def read_video(self, video_path):
+        """
+        Drop-in for read_video : the CachedVideo of video_path. On a miss the video is decoded
+        straight into the cache first (frames aren't kept in memory). A video over the size limit
+        is returned as a list of decoded frames.
+        """
+        video = self.open(video_path)
+        metrics.inc("frame_cache_requests_total", result="hit" if video is not None else "miss")
+        if video is not None:
+            return video
+
+        video_bytes, properties = self.get_video_bytes(video_path)
+        if video_bytes <= self.max_bytes:
+            for _ in self.record(video_path, properties, video_bytes):
+                pass
+            video = self.open(video_path)
+        return video if video is not None else list(self.decode(video_path))
+
+    def read_windows(self, video_path, window_size):
+        # drop-in for read_video_windows, recording the video on a miss
+        start_frame, frames = 0, []
+        for frame in self.iter_frames(video_path):
+            frames.append(frame)
+            if len(frames) == window_size:
+                yield start_frame, frames
+                start_frame, frames = start_frame + len(frames), []
+        if frames: # last (shorter) window
+            yield start_frame, frames
+
+    @staticmethod
+    def decode(video_path):
+        cap = cv2.VideoCapture(video_path)
+        try:
+            while True:
+                ret , frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            cap.release()
+
+    def record(self, video_path, properties, expected_bytes):
+        # decodes the video, writing every frame to the raw file of a new entry (published when complete)
+        key = self.get_key(video_path)
+        self.evict(incoming_bytes=expected_bytes)
+        tmp_dir = os.path.join(self.cache_dir, f"{key}.{os.getpid()}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        complete = False
+        try:
+            frame_count, frame_shape = 0, None
+            with open(os.path.join(tmp_dir, RAW_FILE), 'wb') as raw_file:
+                for frame in self.decode(video_path):
+                    frame_shape = frame_shape or frame.shape
+                    raw_file.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+                    frame_count += 1
+                    yield frame
+
+            meta = {"video": os.path.abspath(video_path), "fps": properties["fps"], "frame_count": frame_count,
+                    "height": frame_shape[0] if frame_shape else properties["height"],
+                    "width": frame_shape[1] if frame_shape else properties["width"], "created": time.time()}
+            with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=1)
+            try:
+                os.rename(tmp_dir, os.path.join(self.cache_dir, key)) # atomic publish
+                complete = True
+            except OSError: # recorded by another process in the meantime
+                pass
+        finally:
+            if not complete: # stopped early, failed or lost the race
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict(keep=key)
+
+    def get_entries(self):
+        """
+        Complete entries of the cache.
+
+        Returns:
+            list: (key, bytes, last access time) of each entry, least recently used first.
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            if key.endswith('.tmp') or not os.path.exists(os.path.join(self.cache_dir, key, META_FILE)):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, key, RAW_FILE))
+            except OSError:
+                continue
+            entries.append((key, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None, incoming_bytes=0):
+        # least recently used entries removed until the cache (plus the entry being recorded) fits in max_bytes
+        entries = self.get_entries()
+        total_bytes = sum(number_of_bytes for _, number_of_bytes, _ in entries) + incoming_bytes
+        for key, number_of_bytes, _ in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # renamed first : readers of the evicted entry keep their memory map, new ones see a miss
+            trash_dir = os.path.join(self.cache_dir, f"{key}.{os.getpid()}.evicted.tmp")
+            try:
+                os.rename(os.path.join(self.cache_dir, key), trash_dir)
+            except OSError: # evicted by another process
+                continue
+            shutil.rmtree(trash_dir, ignore_errors=True)
+            total_bytes -= number_of_bytes
+        metrics.set("frame_cache_bytes", total_bytes - incoming_bytes)
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import get_foot_position, get_resolution_scale, scale_length
+from player_ball_assignment import PossessionStats
+from instrumentation import metrics
+import time
+
+class FrameCompositor():
+    """
+    Renders every overlay of a frame in a single pass : player/referee ellipses and ID tags, ball &
+    possession triangles, the team possession panel, the camera movement panel and the speed/distance
+    labels (same look as Tracker.draw_annotations + CameraMovementEstimator.draw_camera_movement +
+    SpeedAndDistanceEstimator.draw_speed_and_distance).
+
+    The frame is copied once into a reused output buffer, and the semi-transparent panels are blended
+    on their ROI only instead of copying the full frame for each of them.
+
+    Attributes:
+        tracker (Tracker): Provides the ellipse / triangle drawing primitives.
+        num_buffers (int): Number of output buffers used in turn. A returned frame stays valid until
+                           num_buffers more frames have been rendered.
+    """
+    def __init__(self, tracker, num_buffers=1):
+        self.tracker = tracker
+        self.num_buffers = num_buffers
+        self.buffers = []
+        self.next_buffer = 0
+        self.white_panels = {} # white ROI per panel shape, reused for blending
+        self.set_frame_size(None)
+
+    def set_frame_size(self, frame_size):
+        # panel & text coordinates (set on 1920x1080 frames) for the resolution of the video
+        scale_x, scale_y = get_resolution_scale(frame_size)
+        point = lambda x, y: (int(round(x*scale_x)), int(round(y*scale_y)))
+
+        # panels : top-left, bottom-right (inclusive, like cv2.rectangle) & transparency
+        self.team_ball_control_panel = (point(1350,850), point(1900,970), 0.4)
+        self.camera_movement_panel = (point(0,0), point(500,100), 0.6)
+        self.text_origins = {"team_1": point(1400,900), "team_2": point(1400,950),
+                             "camera_x": point(10,30), "camera_y": point(10,60)}
+        self.font_scale = scale_y
+        self.text_thickness = max(1, int(round(3*scale_y)))
+
+        # speed & distance labels : offset under the foot, line height, font scale & thickness
+        scale = scale_length(1.0, frame_size)
+        self.label_style = (int(round(40*scale)), int(round(20*scale)), 0.5*scale, max(1, int(round(2*scale))))
+
+    def get_buffer(self, frame):
+        if not self.buffers or self.buffers[0].shape != frame.shape:
+            self.set_frame_size((frame.shape[1], frame.shape[0]))
+            self.buffers = [np.empty_like(frame) for _ in range(self.num_buffers)]
+            self.next_buffer = 0
+        buffer = self.buffers[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % self.num_buffers
+        np.copyto(buffer, frame) # to not scratch & pollute on frames that are being fed
+        return buffer
+
+    def blend_panel(self, frame, panel):
+        # white semi-transparent rectangle, only the ROI is blended
+        (x1, y1), (x2, y2), alpha = panel
+        roi = frame[max(y1,0):y2+1, max(x1,0):x2+1]
+        if roi.size == 0:
+            return
+        white = self.white_panels.get(roi.shape)
+        if white is None:
+            white = np.full(roi.shape, 255, dtype=frame.dtype)
+            self.white_panels[roi.shape] = white
+        cv2.addWeighted(white, alpha, roi, 1-alpha, 0, roi)
+
+    def render_frame(self, frame, player_dict, referee_dict, ball_dict, camera_movement, possession_stats):
+        """
+        Draws all the overlays of one frame.
+
+        Args:
+            frame (np.ndarray): Source frame (not modified).
+            player_dict, referee_dict, ball_dict (dict): {track_id: track_info} of the frame.
+            camera_movement (list): [x, y] camera movement of the frame.
+            possession_stats (PossessionStats): Possession statistics up to this frame.
+
+        Returns:
+            np.ndarray: The annotated frame (an output buffer, see num_buffers).
+        """
+        frame = self.get_buffer(frame)
+
+        # draw players
+        for track_id , player in player_dict.items():
+            color = player.get("team_color",(0,0,255)) # get team color , if not take red
+            self.tracker.draw_ellipse(frame,player["bbox"], color, track_id)
+
+            if player.get("has_ball", False):
+                self.tracker.draw_triangle(frame, player["bbox"], (0,0,255)) # red
+
+        # draw referees
+        for _ , referee in referee_dict.items():
+            self.tracker.draw_ellipse(frame,referee["bbox"], (0,255,255)) # yellow
+
+        # draw ball
+        for _ , ball in ball_dict.items():
+            self.tracker.draw_triangle(frame,ball["bbox"], (0,255,0)) # green
+
+        # team possession panel
+        self.blend_panel(frame, self.team_ball_control_panel)
+        team_1, team_2 = possession_stats.get_team_share(1), possession_stats.get_team_share(2)
+        cv2.putText(frame, f"Team 1 Possession :{team_1*100:.2f}%", self.text_origins["team_1"], cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (0,0,0), self.text_thickness)
+        cv2.putText(frame, f"Team 2 Possession :{team_2*100:.2f}%", self.text_origins["team_2"], cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (0,0,0), self.text_thickness)
+
+        # camera movement panel
+        self.blend_panel(frame, self.camera_movement_panel)
+        x_movement, y_movement = camera_movement
+        cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",self.text_origins["camera_x"], cv2.FONT_HERSHEY_SIMPLEX,self.font_scale,(0,0,0),self.text_thickness)
+        cv2.putText(frame,f"Camera Movement Y: {y_movement:.2f}",self.text_origins["camera_y"], cv2.FONT_HERSHEY_SIMPLEX,self.font_scale,(0,0,0),self.text_thickness)
+
+        # speed & distance labels under the players
+        offset, line_height, font_scale, thickness = self.label_style
+        for _ , player in player_dict.items():
+            speed = player.get('speed',None)
+            distance = player.get('distance',None)
+            if speed is None or distance is None:
+                continue
+            x, y = get_foot_position(player['bbox'])
+            y += offset
+            cv2.putText(frame, f"{speed:.2f} km/h",(x,y),cv2.FONT_HERSHEY_SIMPLEX,font_scale,(0,0,0),thickness)
+            cv2.putText(frame, f"{distance:.2f} m",(x,y+line_height),cv2.FONT_HERSHEY_SIMPLEX,font_scale,(0,0,0),thickness)
+
+        return frame
+
+    def render_video(self, frames, tracks, possession, camera_movement_per_frame, possession_stats=None):
+        """
+        Renders consecutive frames one by one (generator), updating the possession statistics as
+        each frame's possessor is known.
+
+        Args:
+            frames (list): Frames to annotate.
+            tracks (dict): Tracks of these frames.
+            possession (dict): PossessionEngine result for these frames ("player" & "team" per frame).
+            camera_movement_per_frame (list): Camera movement of these frames.
+            possession_stats (PossessionStats, optional): Statistics of the previous frames (streamed
+                                                          windows), updated in place.
+
+        Yields:
+            np.ndarray: Annotated frames.
+        """
+        if possession_stats is None:
+            possession_stats = PossessionStats()
+
+        for frame_num, frame in enumerate(frames):
+            render_start = time.perf_counter()
+            possession_stats.update(int(possession["player"][frame_num]), int(possession["team"][frame_num]))
+            output_frame = self.render_frame(frame,
+                                             tracks["players"][frame_num],
+                                             tracks["referees"][frame_num],
+                                             tracks["ball"][frame_num],
+                                             camera_movement_per_frame[frame_num],
+                                             possession_stats)
+            metrics.observe("render_frame_seconds", time.perf_counter() - render_start)
+            yield output_frame
@@ -0,0 +1,5 @@
+# Exposing
+
+
+from .metrics import MetricsRegistry, metrics, get_peak_rss, get_rss
+from .metrics_server import MetricsServer
@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+# latency buckets (seconds) of the histograms, from a fast numpy pass to a slow inference batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "stage_seconds_total": "Wall time spent in each pipeline stage.",
+    "stage_frames_total": "Frames processed by each pipeline stage.",
+    "stage_runs_total": "Number of times each pipeline stage ran.",
+    "stage_last_seconds": "Wall time of the last run of each pipeline stage.",
+    "stage_peak_rss_bytes": "Peak resident memory of the process at the end of each pipeline stage.",
+    "stage_frames_per_second": "Frames per second sustained by each pipeline stage over its last run.",
+    "detect_batch_seconds": "Inference time of a detection batch.",
+    "detected_frames_total": "Frames run through the detection model.",
+    "detect_batch_size": "Frames in the last detection batch (adaptive batches can be smaller).",
+    "keyframe_detections_total": "Frames run through the detector in keyframe mode, by reason (interval, motion, lost).",
+    "propagated_frames_total": "Frames whose boxes were propagated with optical flow instead of detected.",
+    "keyframe_propagation_seconds": "Keyframe mode time per frame (grayscale + box propagation).",
+    "optical_flow_frame_seconds": "Camera movement (optical flow) time per frame.",
+    "player_color_seconds": "Kit color clustering time per call.",
+    "player_color_crops_total": "Player crops clustered for their kit color.",
+    "render_frame_seconds": "Annotation rendering time per frame.",
+    "encode_frame_seconds": "Video encoding time per frame.",
+    "queue_depth": "Items waiting in a producer/consumer queue.",
+    "frames_processed_total": "Frames written by the pipeline.",
+    "frame_cache_requests_total": "Videos read through the decoded frame cache, by result (hit, miss).",
+    "frame_cache_bytes": "Size of the decoded frame cache.",
+    "export_points_total": "Time series points written by each export sink.",
+    "export_dropped_points_total": "Time series points dropped after the retries of a failed request.",
+    "event_bus_messages_total": "Per frame messages delivered to the event sink.",
+    "event_bus_dropped_messages_total": "Per frame messages dropped (queue full or failed send).",
+    "event_bus_send_seconds": "Time to encode and send a batch of per frame messages.",
+    "process_rss_bytes": "Resident memory of the process.",
+    "process_peak_rss_bytes": "Peak resident memory of the process.",
+    "uptime_seconds": "Time since the metrics registry was created.",
+}
+
+def get_peak_rss():
+    # peak resident set size of the process in bytes (None when unknown)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak*1024 # kilobytes on Linux
+
+def get_rss():
+    # current resident set size in bytes (Linux /proc, None elsewhere)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class MetricsRegistry():
+    """
+    Counters, gauges and histograms of a run, thread safe, exposed in the Prometheus text format
+    (see MetricsServer) and as a JSON run report.
+
+    Stages are timed with the stage() context manager, hot loops observe their durations in
+    histograms with timer() / observe(). When disabled every call returns right away.
+
+    Attributes:
+        prefix (str): Prefix of the metric names.
+        enabled (bool): Records metrics when True.
+        buckets (tuple): Upper bounds (seconds) of the histogram buckets.
+    """
+    def __init__(self, prefix='futbol', enabled=True, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.start_time = time.time()
+            self.counters = {} # {name: {labels: value}}
+            self.gauges = {}
+            self.histograms = {} # {name: {labels: [bucket counts, sum, count]}}
+
+    @staticmethod
+    def label_key(labels):
+        return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self.label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled or value is None:
+            return
+        key = self.label_key(labels)
+        with self.lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = self.label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = [[0]*len(self.buckets), 0.0, 0]
+            histogram = series[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break # cumulated when exported
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        # observes the duration of the block in the histogram name
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def stage(self, name, frames=0):
+        """
+        Times a pipeline stage : wall time, frames processed, frames/sec and peak RSS at its end.
+
+        Args:
+            name (str): Name of the stage.
+            frames (int): Number of frames the stage processes.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.inc("stage_seconds_total", elapsed, stage=name)
+            self.inc("stage_frames_total", frames, stage=name)
+            self.inc("stage_runs_total", 1, stage=name)
+            self.set("stage_last_seconds", elapsed, stage=name)
+            if frames and elapsed > 0:
+                self.set("stage_frames_per_second", frames / elapsed, stage=name)
+            self.set("stage_peak_rss_bytes", get_peak_rss(), stage=name)
+
+    def update_process_metrics(self):
+        self.set("process_rss_bytes", get_rss())
+        self.set("process_peak_rss_bytes", get_peak_rss())
+        self.set("uptime_seconds", time.time() - self.start_time)
+
+    @staticmethod
+    def format_labels(key, extra=()):
+        labels = list(key) + list(extra)
+        if not labels:
+            return ""
+        escaped = (f'{k}="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for k, v in labels)
+        return "{" + ",".join(escaped) + "}"
+
+    def to_prometheus(self):
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        self.update_process_metrics()
+        lines = []
+        with self.lock:
+            for kind, metric_series in (("counter", self.counters), ("gauge", self.gauges)):
+                for name, series in sorted(metric_series.items()):
+                    full_name = f"{self.prefix}_{name}"
+                    lines.append(f"# HELP {full_name} {HELP.get(name, name)}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{full_name}{self.format_labels(key)} {float(value)!r}")
+
+            for name, series in sorted(self.histograms.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, (bucket_counts, total, count) in sorted(series.items()):
+                    cumulated = 0
+                    for bound, bucket_count in zip(self.buckets, bucket_counts):
+                        cumulated += bucket_count
+                        lines.append(f"{full_name}_bucket{self.format_labels(key, [('le', repr(float(bound)))])} {cumulated}")
+                    lines.append(f"{full_name}_bucket{self.format_labels(key, [('le', '+Inf')])} {count}")
+                    lines.append(f"{full_name}_sum{self.format_labels(key)} {float(total)!r}")
+                    lines.append(f"{full_name}_count{self.format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def get_report(self):
+        """
+        Returns:
+            dict: Run report : per stage totals (seconds, frames, runs, frames/sec, peak RSS), hot
+                  loop histograms (count, total, mean), gauges, counters and process memory.
+        """
+        self.update_process_metrics()
+        with self.lock:
+            stages = {}
+            for key, seconds in self.counters.get("stage_seconds_total", {}).items():
+                stage = dict(key)["stage"]
+                frames = self.counters.get("stage_frames_total", {}).get(key, 0)
+                stages[stage] = {
+                    "seconds": seconds,
+                    "frames": frames,
+                    "runs": self.counters.get("stage_runs_total", {}).get(key, 0),
+                    "frames_per_second": frames / seconds if frames and seconds > 0 else None,
+                    "peak_rss_bytes": self.gauges.get("stage_peak_rss_bytes", {}).get(key)
+                }
+
+            def series_report(series, value):
+                return {",".join(f"{k}={v}" for k, v in key) or "all": value(item) for key, item in series.items()}
+
+            histograms = {name: series_report(series, lambda h: {"count": h[2], "seconds": h[1], "mean": h[1]/h[2] if h[2] else None})
+                          for name, series in self.histograms.items()}
+            counters = {name: series_report(series, lambda v: v) for name, series in self.counters.items() if not name.startswith("stage_")}
+            gauges = {name: series_report(series, lambda v: v) for name, series in self.gauges.items() if not name.startswith("stage_")}
+
+        return {
+            "started": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start_time)),
+            "wall_seconds": time.time() - self.start_time,
+            "stages": stages,
+            "histograms": histograms,
+            "counters": counters,
+            "gauges": gauges
+        }
+
+    def write_report(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.get_report(), f, indent=1)
+
+# registry shared by every stage of the process
+metrics = MetricsRegistry()
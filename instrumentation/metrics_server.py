@@ -0,0 +1,62 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .metrics import metrics as default_registry
+
+class MetricsServer():
+    """
+    Local HTTP endpoint for a Prometheus scraper : /metrics serves the registry in the text
+    exposition format and /report the JSON run report. Runs on a daemon thread.
+
+    Attributes:
+        registry (MetricsRegistry): Metrics exposed.
+        host (str): Interface to listen on (local only by default).
+        port (int): Port to listen on (0 picks a free one, see the port attribute once started).
+    """
+    def __init__(self, registry=None, host='127.0.0.1', port=9108):
+        self.registry = registry if registry is not None else default_registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] == '/metrics':
+                    body = registry.to_prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path.split('?')[0] == '/report':
+                    body = json.dumps(registry.get_report(), indent=1).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # no access log on the pipeline output
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
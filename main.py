@@ -1,99 +1,230 @@
-from utils import read_video, save_video
+from utils import read_video, get_video_properties, AsyncVideoWriter
 from tracking import Tracker
 import cv2 
 from team_assigner import TeamAssigner
-from player_ball_assignment import PlayerBallAssigner
+from player_ball_assignment import PossessionEngine, PossessionStats
 import numpy as np
 from camera_estimator import CameraMovementEstimator
 from perspective_view_transformer import ViewTransformer
 from speed_distance_estimator import SpeedAndDistanceEstimator
+from pipeline import StreamingPipeline
+from stage_cache import StageCache
+from frame_compositor import FrameCompositor
+from instrumentation import metrics, MetricsServer
+from timeseries_export import MatchMetricsExporter, LineProtocolFileSink, HttpLineProtocolSink
+from event_bus import FramePublisher, FileEventSink, SocketEventSink, KafkaEventSink
+from pitch_occupancy import OccupancyEngine
+from frame_cache import FrameCache
+import argparse
+import os
 
-def main():
-    # 1- read the input video
-    input_path = 'input_vids/08fd33_4.mp4'
-    video_frames = read_video(input_path)
+INPUT_PATH = 'input_vids/08fd33_4.mp4'
+
+def main(exporter=None, publisher=None, tracker=None, occupancy=None, frame_cache=None, camera_workers=1):
+    # 1- read the input video (memory-mapped from the frame cache when it was decoded by a previous run)
+    input_path = INPUT_PATH
+    with metrics.stage("read_video"):
+        video_frames = frame_cache.read_video(input_path) if frame_cache is not None else read_video(input_path)
+    number_of_frames = len(video_frames)
     print(f"Loaded {len(video_frames)} frames from {input_path}")
 
     # 2- initialize Tracker class
-    tracker = Tracker('models/best.pt')
+    if tracker is None: # default detection settings (full frames, every frame detected)
+        tracker = Tracker('models/best.pt')
     print("Tracker initialized with YOLO model.")
 
-    # 3- generate or load object tracks
-    stub_path = 'stubs/track_stubs.pkl'
-    tracks = tracker.get_object_tracks(video_frames,
-                                       read_from_stub=True, 
-                                       stub_path=stub_path)
+    # 3- generate or load object tracks (reused from the stage cache for the same video, weights & parameters)
+    stage_cache = StageCache('cache')
+    with metrics.stage("tracking", number_of_frames):
+        track_store = tracker.get_object_track_store(video_frames,
+                                                     cache=stage_cache,
+                                                     video_path=input_path)
     print("Object tracking completed.")
+    print_keyframe_report(tracker)
+
+    # columnar track store : stages write whole columns, tracks keeps the tracks[object][frame][track_id] interface
+    tracks = track_store.view()
+    frame_size = (video_frames[0].shape[1], video_frames[0].shape[0]) # pixel constants are set on 1920x1080
 
     # 4- camera movement estimator
 
-    tracker.add_position_to_tracks(tracks) # get object positions 
-    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
-    camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
-                                                                                read_from_stub=True,
-                                                                                stub_path='stubs/camera_movement_stub.pkl')
-    camera_movement_estimator.add_adjust_positions_to_tracks(tracks,camera_movement_per_frame)
+    with metrics.stage("positions", number_of_frames):
+        tracker.add_position_to_store(track_store) # get object positions 
+    with metrics.stage("camera_movement", number_of_frames):
+        camera_movement_estimator = CameraMovementEstimator(video_frames[0], fast=True) # only the masked strips are converted & tracked
+        camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
+                                                                                    cache=stage_cache,
+                                                                                    video_path=input_path,
+                                                                                    num_workers=camera_workers)
+        camera_movement_estimator.add_adjust_positions_to_store(track_store,camera_movement_per_frame)
     print("Adjusted Camera positions successfully! ")
 
     # 5- Perspective View transformer 
-    view_transformer = ViewTransformer()
-    view_transformer.add_transformed_position_to_tracks(tracks)
+    with metrics.stage("view_transform", number_of_frames):
+        view_transformer = ViewTransformer(frame_size)
+        view_transformer.add_transformed_position_to_store(track_store)
     print("Perspective view transformer successfully added! ")
 
     # 6- interpolating missing ball tracks
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+    with metrics.stage("ball_interpolation", number_of_frames):
+        # interpolated balls only have a bbox : their positions go through stages 4 & 5 again
+        ball_tracks = {"ball": tracker.interpolate_ball_positions(tracks["ball"])}
+        tracker.add_position_to_tracks(ball_tracks)
+        camera_movement_estimator.add_adjust_positions_to_tracks(ball_tracks, camera_movement_per_frame)
+        view_transformer.add_transformed_position_to_tracks(ball_tracks)
+        tracks["ball"] = ball_tracks["ball"]
     print("Missing ball tracks interpolated successfully !")
 
     # 7- speed & distance estimator
-    speed_and_distance_estimator = SpeedAndDistanceEstimator()
-    speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+    with metrics.stage("speed_distance", number_of_frames):
+        speed_and_distance_estimator = SpeedAndDistanceEstimator()
+        speed_and_distance_estimator.add_speed_and_distance_to_store(track_store)
     print("Adding Speed & Distance of players on track info successfully !")
 
     # 8- assign player teams
-    team_assigner = TeamAssigner()
-    team_assigner.assign_team_color(video_frames[0],
-                                    tracks['players'][0])
-    
-    for frame_num , player_track in enumerate(tracks['players']):
-        for player_id , track in player_track.items():
-            team = team_assigner.get_player_team(video_frames[frame_num],
-                                                 track["bbox"],
-                                                 player_id)
-            tracks['players'][frame_num][player_id]['team'] = team
-            tracks['players'][frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
+    with metrics.stage("team_assignment", number_of_frames):
+        team_assigner = TeamAssigner()
+        team_assigner.assign_team_color(video_frames[0],
+                                        tracks['players'][0])
+        
+        for frame_num , player_track in enumerate(tracks['players']):
+            teams = team_assigner.get_player_teams(video_frames[frame_num], player_track) # new player IDs classified in one batch
+            for player_id , team in teams.items():
+                tracks['players'][frame_num][player_id]['team'] = team
+                tracks['players'][frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
     print("Teams assigned successfully!")
     
-    # 9- assign ball acquisition
-    player_assigner = PlayerBallAssigner()
-    team_ball_control = []
-    for frame_num, player_track in enumerate(tracks['players']):
-        ball_bbox = tracks['ball'][frame_num][1]['bbox']
-        assigned_player = player_assigner.assign_ball_to_player(player_track, ball_bbox)
-
-        if assigned_player != -1:
-            tracks['players'][frame_num][assigned_player]['has_ball'] = True # new parameter
-            team_ball_control.append(tracks['players'][frame_num][assigned_player]['team']) # getting the team of who's player has the ball
-        #else:
-            #team_ball_control.append(team_ball_control[-1])  # Retain last possession
-    team_ball_control = np.array(team_ball_control) # conversion to np array
+    # 9- assign ball acquisition (whole match in one vectorized pass)
+    with metrics.stage("possession", number_of_frames):
+        possession_engine = PossessionEngine(frame_size)
+        possession = possession_engine.assign_store(track_store) # also sets 'has_ball' on the possessor
     print("Ball in possession assigned succesfully!")
 
-    # 10- draw annotations on video frames
-    output_video_frames = tracker.draw_annotations(video_frames, tracks, team_ball_control)
-    print("Annotations drawn on video frames.")
+    # pitch occupancy grids (heatmaps per player, team & phase) straight from the store columns
+    if occupancy is not None:
+        with metrics.stage("occupancy", number_of_frames):
+            occupancy.update_store(track_store, possession)
 
-    # 11- drawing camera movement estimation
-    output_video_frames = camera_movement_estimator.draw_camera_movement(output_video_frames, camera_movement_per_frame)
-    print("Camera movement annotations drawn successfully !")
+    # time series of the match metrics (players, ball, teams, camera) for Grafana
+    if exporter is not None:
+        with metrics.stage("timeseries_export", number_of_frames):
+            exporter.export_window(tracks, possession, camera_movement_per_frame)
+        print(f"{exporter.points_exported} time series points exported")
 
-    # 12- drawing speed & distance
-    speed_and_distance_estimator.draw_speed_and_distance(output_video_frames,tracks)
-    print("Speed & Distance annotations drawn successfully!")
+    # per frame messages (players, ball, possessor) for the live consumers
+    if publisher is not None:
+        with metrics.stage("publish", number_of_frames):
+            publisher.publish_window(tracks, possession)
 
-    # 12- save the annotated video
+    # 10- draw all annotations (tracks, possession, camera movement, speed & distance) in one pass per frame
+    # and encode each frame on a background thread as soon as it's rendered (source fps & resolution)
+    properties = get_video_properties(input_path)
+    writer_queue_size = 8
+    frame_compositor = FrameCompositor(tracker, num_buffers=writer_queue_size+2) # a rendered frame stays valid until it's encoded
     output_path = 'output_videos/annoTracks_withColor&BallInterpo&plyrAcquiAssign&Poss&CameraMvmt&ViewTransformer&SpeedDistance.avi'
-    save_video(output_video_frames, output_path)
+    possession_stats = PossessionStats() # running possession counts, updated frame by frame while rendering
+    with metrics.stage("render_encode", number_of_frames), \
+         AsyncVideoWriter(output_path, (video_frames[0].shape[1], video_frames[0].shape[0]), properties["fps"],
+                          queue_size=writer_queue_size, copy_frames=False) as writer: # width x height
+        for output_frame in frame_compositor.render_video(video_frames, tracks, possession, camera_movement_per_frame, possession_stats):
+            writer.write(output_frame)
+            metrics.inc("frames_processed_total")
+    print(f"Team 1 Possession : {possession_stats.get_team_share(1)*100:.2f}% , Team 2 Possession : {possession_stats.get_team_share(2)*100:.2f}%")
     print(f"Annotated video saved to {output_path}")
 
+def print_keyframe_report(tracker):
+    if tracker.keyframe_detector is not None and tracker.keyframe_detector.stats["frames"]:
+        report = tracker.keyframe_detector.get_report()
+        print(f"Keyframes : detector ran on {report['detector_frames']}/{report['frames']} frames "
+              f"({report['motion']} for motion, {report['lost']} for lost tracks), "
+              f"{report['saved_calls']} detector calls saved ({report['saved_fraction']*100:.1f}%)")
+
+def main_streaming(window_size=120, exporter=None, publisher=None, tracker=None, occupancy=None, frame_cache=None):
+    # same analysis as main() but processed window by window : memory stays constant with the match length
+    input_path = INPUT_PATH
+    output_path = 'output_videos/annoTracks_streaming.avi'
+
+    if tracker is None:
+        tracker = Tracker('models/best.pt')
+    pipeline = StreamingPipeline(tracker.model_path, window_size=window_size, tracker=tracker, cache=StageCache('cache'),
+                                 exporter=exporter, publisher=publisher, occupancy=occupancy, frame_cache=frame_cache)
+    frames_written = pipeline.run(input_path, output_path)
+    print(f"Annotated video ({frames_written} frames) saved to {output_path}")
+    print_keyframe_report(tracker)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stream', action='store_true', help='process the video in bounded windows instead of loading it whole')
+    parser.add_argument('--window-size', type=int, default=120, help='frames per window in streaming mode')
+    parser.add_argument('--model', default='models/best.pt', help='detector : .pt (PyTorch), .onnx (ONNX Runtime) or OpenVINO model (python -m tracking.model_export)')
+    parser.add_argument('--intra-op-threads', type=int, help='ONNX Runtime / OpenVINO threads inside an operator (backend default when not set)')
+    parser.add_argument('--inter-op-threads', type=int, help='ONNX Runtime operators / OpenVINO inference streams run in parallel')
+    parser.add_argument('--keyframe-interval', type=int, default=1, help='run the detector every N frames and propagate the boxes in between with optical flow (1 = every frame)')
+    parser.add_argument('--inference-size', type=int, help='long side of the detector input (model default when not set), lower is faster')
+    parser.add_argument('--resize-at-decode', action='store_true', help='resize the frames to the inference size once when decoded (no letterbox), boxes are rescaled to the source frames')
+    parser.add_argument('--camera-workers', type=int, default=1, help='processes estimating the camera movement in chunks (whole video mode, same result), 1 = sequential')
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on http://127.0.0.1:PORT/metrics during the run')
+    parser.add_argument('--report', default='output_videos/run_report.json', help='JSON run report with the per stage timings')
+    parser.add_argument('--influx-file', help='write the match metrics as InfluxDB line protocol to this file (.gz to compress)')
+    parser.add_argument('--influx-url', help='send the match metrics to this line protocol write endpoint (e.g. http://localhost:8086/api/v2/write?org=ORG&bucket=BUCKET)')
+    parser.add_argument('--influx-token', default=os.environ.get('INFLUX_TOKEN'), help='API token of the write endpoint (default : $INFLUX_TOKEN)')
+    parser.add_argument('--influx-flush-interval', type=float, default=1.0, help='maximum seconds a point waits before being sent')
+    parser.add_argument('--match-id', default='08fd33_4', help='match tag of the exported time series and published messages')
+    parser.add_argument('--heatmaps', help='write the pitch occupancy grids (per player, team & phase) to this JSON file (.gz to compress)')
+    parser.add_argument('--heatmap-cell-size', type=float, default=1.0, help='side of a pitch occupancy cell in meters')
+    parser.add_argument('--frame-cache', help='decoded frame cache directory (e.g. cache/frames) : the video is decoded once, later runs memory-map the frames')
+    parser.add_argument('--frame-cache-gb', type=float, default=64, help='size limit of the frame cache, least recently used videos are evicted')
+    parser.add_argument('--publish-file', help='publish the per frame messages to this JSON lines file (.gz to compress)')
+    parser.add_argument('--publish-socket', help='publish the per frame messages to a TCP consumer (host:port)')
+    parser.add_argument('--publish-kafka', help='publish the per frame messages to these Kafka brokers (host:port[,host:port])')
+    parser.add_argument('--kafka-topic', default='futbol-frames', help='Kafka topic of the per frame messages')
+    args = parser.parse_args()
+
+    fps = get_video_properties(INPUT_PATH)["fps"] # match time of the exported points & published messages
+
+    sinks = []
+    if args.influx_file:
+        sinks.append(LineProtocolFileSink(args.influx_file))
+    if args.influx_url:
+        sinks.append(HttpLineProtocolSink(args.influx_url, args.influx_token, flush_interval=args.influx_flush_interval))
+    exporter = MatchMetricsExporter(sinks, match_id=args.match_id, fps=fps) if sinks else None
+
+    event_sink = None
+    if args.publish_file:
+        event_sink = FileEventSink(args.publish_file)
+    elif args.publish_socket:
+        host, port = args.publish_socket.rsplit(':', 1)
+        event_sink = SocketEventSink(host, int(port))
+    elif args.publish_kafka:
+        event_sink = KafkaEventSink(args.publish_kafka, args.kafka_topic, key=args.match_id)
+    # streaming : a slow consumer loses its oldest messages instead of stalling detection,
+    # whole video : every frame is delivered
+    publisher = FramePublisher(event_sink, match_id=args.match_id, fps=fps, drop_when_full=args.stream) if event_sink is not None else None
+
+    occupancy = OccupancyEngine(cell_size=args.heatmap_cell_size, fps=fps) if args.heatmaps else None
+
+    frame_cache = FrameCache(args.frame_cache, int(args.frame_cache_gb*1024**3)) if args.frame_cache else None
+
+    tracker = Tracker(args.model, args.intra_op_threads, args.inter_op_threads)
+    tracker.set_inference_resolution(args.inference_size, args.resize_at_decode)
+    tracker.enable_keyframes(args.keyframe_interval) # detector on keyframes only, boxes propagated in between (1 = every frame)
+
+    metrics_server = MetricsServer(port=args.metrics_port).start() if args.metrics_port is not None else None
+    try:
+        with metrics.stage("total"):
+            if args.stream:
+                main_streaming(args.window_size, exporter, publisher, tracker, occupancy, frame_cache)
+            else:
+                main(exporter, publisher, tracker, occupancy, frame_cache, args.camera_workers)
+        if occupancy is not None:
+            occupancy.save(args.heatmaps)
+            print(f"Pitch occupancy grids saved to {args.heatmaps}")
+    finally:
+        if exporter is not None:
+            exporter.close()
+        if publisher is not None:
+            publisher.close()
+        metrics.write_report(args.report)
+        print(f"Run report saved to {args.report}")
+        if metrics_server is not None:
+            metrics_server.stop()
@@ -1,5 +1,8 @@
 import numpy as np 
 import cv2
+import sys
+sys.path.append('../')
+from utils import scale_points
 
 class ViewTransformer():
     """
@@ -15,9 +18,10 @@ class ViewTransformer():
         pixel_vertices (np.ndarray): The pixel coordinates of the four corners of the court in the image.
         target_vertices (np.ndarray): The real-world coordinates corresponding to the four corners of the court.
         perspective_transformer (np.ndarray): The matrix used for perspective transformation.
+        frame_size (tuple): (width, height) of the video, the court corners were set on 1920x1080.
     """
 
-    def __init__(self):
+    def __init__(self, frame_size=None):
         # dimensions of the court in real-world units (meters) - FIFA reg- 
         court_width = 68 # 68 meters
         court_length = 23.32 # 105/2 = 52.5 :: 9 rectangles each half court :: each rectangle 5.83 meter long :: scourt separated into 3 ( it's 105 meters all long )
@@ -28,6 +32,7 @@ class ViewTransformer():
                                [265, 275], # top left
                                [910, 260], # top right
                                [1640, 915]]) # bottom right
+        self.pixel_vertices = scale_points(self.pixel_vertices, frame_size) # same view at another resolution
         
         # real-world coordinates of the court corners in a top-down, rectangular view.
         # these define the real-world rectangle corresponding to the trapezoid.
@@ -74,6 +79,37 @@ class ViewTransformer():
         # reshaped to 2D point
         return tranform_point.reshape(-1,2)
 
+    def transform_points(self, points):
+        """
+        Batched version of transform_point : transforms N points at once.
+
+        The inside-the-trapezoid test is done with cross products against the 4 edges and the
+        homography is applied with a single matrix multiply, instead of one pointPolygonTest and
+        one perspectiveTransform call per point.
+
+        Args:
+            points (np.ndarray): N x 2 pixel coordinates in the camera view.
+
+        Returns:
+            tuple: (transformed, is_inside) where transformed is an N x 2 float32 array of real-world
+                   coordinates (NaN for points outside the court) and is_inside the N boolean mask.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1,2)
+
+        # inside test on integer coordinates, like transform_point (points on the border count as inside)
+        p = np.trunc(points)
+        vertices = self.pixel_vertices.astype(np.float64)
+        edges = np.roll(vertices, -1, axis=0) - vertices # edge i goes from vertex i to vertex i+1
+        cross = edges[:,0] * (p[:,None,1] - vertices[:,1]) - edges[:,1] * (p[:,None,0] - vertices[:,0]) # N x 4
+        is_inside = (cross >= 0).all(axis=1) | (cross <= 0).all(axis=1) # convex polygon : same side of every edge
+
+        # homography in homogeneous coordinates
+        points_h = np.hstack([points, np.ones((len(points),1))]) @ self.persepctive_trasnformer.T
+        transformed = (points_h[:,:2] / points_h[:,2:]).astype(np.float32)
+        transformed[~is_inside] = np.nan
+
+        return transformed, is_inside
+
     def add_transformed_position_to_tracks(self,tracks):
         """
         Adds the transformed (real-world) position to each tracked object in the tracks.
@@ -93,10 +129,21 @@ class ViewTransformer():
         """
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    position = track_info['position_adjusted']
-                    position = np.array(position)
-                    position_transformed = self.transform_point(position)
-                    if position_transformed is not None:
-                        position_transformed = position_transformed.squeeze().tolist()
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_transformed
\ No newline at end of file
+                if not track:
+                    continue
+                # all the positions of the frame transformed in one batch
+                track_ids = list(track.keys())
+                positions = np.array([track[track_id]['position_adjusted'] for track_id in track_ids])
+                positions_transformed, is_inside = self.transform_points(positions)
+
+                for track_id, position_transformed, inside in zip(track_ids, positions_transformed, is_inside):
+                    tracks[object][frame_num][track_id]['position_transformed'] = position_transformed.tolist() if inside else None
+
+    def add_transformed_position_to_store(self, store):
+        """
+        Adds the transformed (real-world) position of every detection of a TrackStore, one
+        transform_points call per object class for the whole match.
+        """
+        for object_tracks in store.values():
+            positions_transformed, _ = self.transform_points(object_tracks.columns["position_adjusted"])
+            object_tracks.set_column("position_transformed", positions_transformed)
@@ -0,0 +1 @@
+from .streaming_pipeline import StreamingPipeline
@@ -0,0 +1,325 @@
+import sys
+sys.path.append('../')
+from utils import read_video_windows, get_video_properties, AsyncVideoWriter
+from tracking import Tracker, BallInterpolator
+from team_assigner import TeamAssigner
+from player_ball_assignment import PossessionEngine, PossessionStats
+from camera_estimator import CameraMovementEstimator
+from perspective_view_transformer import ViewTransformer
+from speed_distance_estimator import SpeedAndDistanceEstimator
+from frame_compositor import FrameCompositor
+from track_store import TrackStore
+from instrumentation import metrics
+import numpy as np
+
+class StreamingPipeline():
+    """
+    Runs the whole analysis (detect/track -> camera movement -> view transform -> team/possession
+    -> render -> encode) over bounded windows of frames instead of the whole match at once.
+
+    Only one window of frames (plus its annotated copies) is alive at any time, so peak memory
+    doesn't grow with the match length and the output video is written as the input is read.
+    The state that has to survive between windows (ByteTrack, last camera frame, cumulative
+    distances, team colors, possession statistics) lives on the stage objects.
+
+    The stages that look ahead (ball interpolation waits for the next detection, a speed batch
+    for its end frame) hold the last frames of a window back : they're finished and rendered with
+    a later window, so the results don't depend on where the windows are cut.
+
+    Attributes:
+        window_size (int): Number of frames read and tracked together.
+        cache (StageCache): Optional cache of the detections & camera movement of each window.
+        exporter (MatchMetricsExporter): Optional time series exporter fed with each window.
+        publisher (FramePublisher): Optional per frame message publisher fed with each window.
+        occupancy (OccupancyEngine): Optional pitch occupancy grids updated with each window.
+        frame_cache (FrameCache): Optional decoded frame cache : windows read from it instead of the decoder.
+    """
+    def __init__(self, model_path, window_size=120, tracker=None, cache=None, exporter=None, publisher=None, occupancy=None,
+                 frame_cache=None):
+        self.cache = cache # optional StageCache : detections & camera movement reused window by window
+        self.exporter = exporter # optional MatchMetricsExporter : time series written window by window
+        self.publisher = publisher # optional FramePublisher : per frame messages for the live consumers
+        self.occupancy = occupancy # optional OccupancyEngine : heatmaps accumulated window by window
+        self.frame_cache = frame_cache # optional FrameCache : the video is decoded once, later runs map the frames
+        self.tracker = tracker if tracker is not None else Tracker(model_path)
+        self.speed_and_distance_estimator = SpeedAndDistanceEstimator()
+        self.speed_and_distance_estimator.start_windows() # open speed batches carried across windows
+        self.window_size = window_size
+
+        self.view_transformer = ViewTransformer()
+        self.team_assigner = TeamAssigner()
+        self.possession_engine = PossessionEngine()
+        self.camera_movement_estimator = None # created from the first frame of the video
+        self.writer_queue_size = 8 # frames waiting to be encoded by the background writer
+        self.frame_compositor = FrameCompositor(self.tracker, num_buffers=self.writer_queue_size+2) # a rendered frame stays valid until it's encoded
+
+        self.possession_stats = PossessionStats() # running possession counts across windows
+        self.ball_interpolator = BallInterpolator() # holds the frames without ball until the next detection
+
+        # frames waiting for their ball (interpolation) or their speed (open batch), from pending_start
+        self.pending_start = 0
+        self.pending_frames = []
+        self.pending_tracks = {"players": [], "referees": [], "ball": []}
+        self.pending_camera_movement = []
+        self.speed_ready_until = 0 # frames before it have their final speed & distance
+        self.ball_ready_until = 0 # frames before it have their interpolated ball
+
+    def add_ball_positions(self, ball_tracks, camera_movement_per_frame):
+        # position -> adjusted -> transformed position of interpolated balls (stages 1 to 3 for the ball only)
+        tracks = {"ball": ball_tracks}
+        self.tracker.add_position_to_tracks(tracks)
+        self.camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+        self.view_transformer.add_transformed_position_to_tracks(tracks)
+
+    def add_ball_window(self, start_frame, ball_tracks):
+        """
+        Pushes the ball of each frame of a window into the BallInterpolator and fills the pending
+        frames it emits (interpolated bbox and positions).
+        """
+        ready = []
+        for frame_num, ball_track in enumerate(ball_tracks, start_frame):
+            ready += self.ball_interpolator.push(frame_num, ball_track[1]["bbox"] if 1 in ball_track else None)
+        self.set_pending_balls(ready)
+
+    def set_pending_balls(self, ready):
+        # (frame_num, bbox) pairs emitted by the interpolator -> ball tracks of the pending frames
+        if not ready:
+            return
+        first = ready[0][0] - self.pending_start
+        ball_tracks = [{1: {"bbox": bbox}} if bbox is not None else {} for _, bbox in ready]
+        self.add_ball_positions(ball_tracks, self.pending_camera_movement[first:first+len(ball_tracks)])
+        self.pending_tracks["ball"][first:first+len(ball_tracks)] = ball_tracks
+        self.ball_ready_until = ready[-1][0] + 1
+
+    def add_window(self, start_frame, frames, tracks, camera_movement_per_frame):
+        """
+        Appends a tracked window (positions, camera movement & view transform done) to the pending
+        frames and runs the look-ahead stages on it : ball interpolation and speed & distance.
+
+        Args:
+            start_frame (int): Index of frames[0] in the whole video.
+            frames (list): Frames of the window.
+            tracks (dict): Tracks of the window.
+            camera_movement_per_frame (list): Camera movement of the window.
+        """
+        number_of_frames = len(frames)
+        self.pending_frames += list(frames)
+        self.pending_camera_movement += list(camera_movement_per_frame)
+        self.pending_tracks["players"] += tracks["players"]
+        self.pending_tracks["referees"] += tracks["referees"]
+        self.pending_tracks["ball"] += [{} for _ in range(number_of_frames)] # filled by the interpolator
+
+        # 4- ball interpolation (frames wait for the next detection, up to max_gap frames)
+        with metrics.stage("ball_interpolation", number_of_frames):
+            self.add_ball_window(start_frame, tracks["ball"])
+
+        # 5- speed & distance (the batch still open at the end of the window is finished with the next one)
+        with metrics.stage("speed_distance", number_of_frames):
+            self.speed_ready_until = self.speed_and_distance_estimator.add_speed_and_distance_to_window(tracks)
+
+    def flush_windows(self):
+        # end of the video : the open speed batch ends on the last frame, held balls get the last known bbox
+        self.speed_ready_until = self.speed_and_distance_estimator.add_speed_and_distance_to_window(
+            {"players": [], "referees": [], "ball": []}, final=True)
+        self.set_pending_balls(self.ball_interpolator.flush())
+        self.ball_ready_until = self.pending_start + len(self.pending_frames)
+
+    def pop_ready(self):
+        """
+        Removes the pending frames whose ball and speed are final.
+
+        Returns:
+            tuple: (start_frame, frames, tracks, camera_movement_per_frame) of the ready frames.
+        """
+        number_of_frames = max(0, min(self.speed_ready_until, self.ball_ready_until) - self.pending_start)
+        start_frame = self.pending_start
+        frames = self.pending_frames[:number_of_frames]
+        tracks = {object: object_tracks[:number_of_frames] for object, object_tracks in self.pending_tracks.items()}
+        camera_movement_per_frame = self.pending_camera_movement[:number_of_frames]
+
+        self.pending_start += number_of_frames
+        del self.pending_frames[:number_of_frames]
+        for object_tracks in self.pending_tracks.values():
+            del object_tracks[:number_of_frames]
+        del self.pending_camera_movement[:number_of_frames]
+        return start_frame, frames, tracks, camera_movement_per_frame
+
+    def get_window_tracks(self, start_frame, frames, detections=None):
+        """
+        Tracks of the window. The detections come from the stage cache when this range of the video
+        was already detected, and are always run through ByteTrack : track IDs continue across
+        cached and detected windows.
+        """
+        end_frame = start_frame+len(frames)
+        cached = False
+        if detections is None and self.cache is not None:
+            arrays = self.cache.get(self.detections_key, (start_frame, end_frame))
+            if arrays is not None:
+                detections, cached = self.tracker.arrays_to_detections(arrays, len(frames), start_frame), True
+                if self.tracker.keyframe_detector is not None:
+                    self.tracker.keyframe_detector.skip_frames(len(frames))
+
+        if detections is None:
+            detections = self.tracker.detect_frames(frames)
+        if self.cache is not None and not cached:
+            self.cache.put(self.detections_key, self.tracker.detections_to_arrays(detections, start_frame),
+                           (start_frame, end_frame), stage="detections")
+        return self.tracker.detections_to_tracks(detections)
+
+    def get_window_camera_movement(self, start_frame, frames):
+        if self.camera_movement_estimator is None:
+            self.camera_movement_estimator = CameraMovementEstimator(frames[0], fast=True)
+
+        end_frame = start_frame+len(frames)
+        if self.cache is not None:
+            if self.camera_movement_key is None:
+                self.camera_movement_key = self.cache.make_key("camera_movement", self.video_path,
+                                                               params=self.camera_movement_estimator.get_cache_params())
+            arrays = self.cache.get(self.camera_movement_key, (start_frame, end_frame))
+            if arrays is not None:
+                self.camera_movement_estimator.reset_stream() # a later uncached window re-seeds its features
+                return arrays["camera_movement"].tolist()
+
+        camera_movement_per_frame = self.camera_movement_estimator.get_camera_movement_window(frames)
+        if self.cache is not None:
+            self.cache.put(self.camera_movement_key,
+                           {"camera_movement": np.array(camera_movement_per_frame, dtype=np.float32).reshape(-1,2)},
+                           (start_frame, end_frame), stage="camera_movement")
+        return camera_movement_per_frame
+
+    def process_window(self, start_frame, frames, detections=None):
+        """
+        Runs every stage on one window of frames.
+
+        Args:
+            start_frame (int): Index of frames[0] in the whole video.
+            frames (list): Consecutive frames of the window.
+            detections (list, optional): YOLO detections of the frames, detected here if None.
+
+        Returns:
+            tuple: (number of frames, generator of their annotated frames) : the frames that are
+                   ready, held back frames of the previous windows first (see pop_ready).
+        """
+        number_of_frames = len(frames)
+
+        # 1- detection & tracking (ByteTrack keeps its state between windows)
+        with metrics.stage("tracking", number_of_frames):
+            tracks = self.get_window_tracks(start_frame, frames, detections)
+        with metrics.stage("positions", number_of_frames):
+            self.tracker.add_position_to_tracks(tracks)
+
+        # 2- camera movement
+        with metrics.stage("camera_movement", number_of_frames):
+            camera_movement_per_frame = self.get_window_camera_movement(start_frame, frames)
+            self.camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+
+        # 3- view transformer
+        with metrics.stage("view_transform", number_of_frames):
+            self.view_transformer.add_transformed_position_to_tracks(tracks)
+
+        # 4 & 5- ball interpolation, speed & distance
+        self.add_window(start_frame, frames, tracks, camera_movement_per_frame)
+        return self.finish_frames(*self.pop_ready())
+
+    def finish_frames(self, start_frame, frames, tracks, camera_movement_per_frame):
+        """
+        Runs the remaining stages (teams, possession, outputs, rendering) on ready frames.
+
+        Returns:
+            tuple: (number of frames, generator of their annotated frames)
+        """
+        number_of_frames = len(frames)
+        if number_of_frames == 0:
+            return 0, iter(())
+
+        # 6- teams (team colors taken from the first frame with players)
+        with metrics.stage("team_assignment", number_of_frames):
+            for frame_num, player_track in enumerate(tracks['players']):
+                if not player_track:
+                    continue
+                if not self.team_assigner.team_colors:
+                    self.team_assigner.assign_team_color(frames[frame_num], player_track)
+                teams = self.team_assigner.get_player_teams(frames[frame_num], player_track)
+                for player_id, team in teams.items():
+                    player_track[player_id]['team'] = team
+                    player_track[player_id]['team_color'] = self.team_assigner.team_colors[team]
+
+        # 7- ball acquisition
+        with metrics.stage("possession", number_of_frames):
+            possession = self.possession_engine.assign_tracks(tracks)
+
+        # pitch occupancy of the window (per player, team & phase)
+        if self.occupancy is not None:
+            with metrics.stage("occupancy", number_of_frames):
+                self.occupancy.update_window(tracks, possession)
+
+        # time series of the window (players, ball, teams, camera)
+        if self.exporter is not None:
+            with metrics.stage("timeseries_export", number_of_frames):
+                self.exporter.export_window(tracks, possession, camera_movement_per_frame, start_frame)
+
+        # per frame messages, queued without waiting on the consumers
+        if self.publisher is not None:
+            with metrics.stage("publish", number_of_frames):
+                self.publisher.publish_window(tracks, possession, start_frame)
+
+        # 8- rendering, one pass per frame
+        return number_of_frames, self.frame_compositor.render_video(frames, tracks, possession, camera_movement_per_frame,
+                                                                    self.possession_stats)
+
+    def read_windows(self, input_path, frame_count):
+        """
+        Windows of the video with their detections : decoding overlaps the inference (detection
+        scheduler) when no window is in the stage cache. Otherwise the frames are read alone and
+        get_window_tracks detects only the windows the cache doesn't cover. With a frame cache the
+        frames come from (or are recorded into) it.
+
+        Yields:
+            tuple: (start_frame, frames, detections), detections is None when they're not detected yet.
+        """
+        window_ranges = [(start, min(start+self.window_size, frame_count)) for start in range(0, frame_count, self.window_size)]
+        if self.cache is not None and any(self.cache.covers(self.detections_key, window_range) for window_range in window_ranges):
+            if self.frame_cache is not None:
+                windows = self.frame_cache.read_windows(input_path, self.window_size)
+            else:
+                windows = read_video_windows(input_path, self.window_size)
+            for start_frame, frames in windows:
+                yield start_frame, frames, None
+        else:
+            yield from self.tracker.detect_video_windows(input_path, self.window_size, frame_cache=self.frame_cache)
+
+    def run(self, input_path, output_path):
+        """
+        Streams input_path through the pipeline and writes the annotated video to output_path.
+
+        Returns:
+            int: Number of frames written.
+        """
+        self.video_path = input_path
+        if self.cache is not None:
+            self.detections_key = self.cache.make_key("detections", input_path, self.tracker.model_path, self.tracker.get_cache_params())
+            self.camera_movement_key = None # needs the estimator, created on the first window
+
+        properties = get_video_properties(input_path)
+        frames_written = 0
+
+        # pixel constants (court corners, possession distance) for the resolution of the video
+        frame_size = (properties["width"], properties["height"])
+        self.view_transformer = ViewTransformer(frame_size)
+        self.possession_engine = PossessionEngine(frame_size)
+        with AsyncVideoWriter(output_path, (properties["width"], properties["height"]), properties["fps"],
+                              queue_size=self.writer_queue_size, copy_frames=False) as writer:
+            for start_frame, frames, detections in self.read_windows(input_path, properties["frame_count"]):
+                frames_written += self.write_frames(writer, *self.process_window(start_frame, frames, detections))
+                print(f"Processed frames {start_frame} - {start_frame+len(frames)-1}")
+            self.flush_windows()
+            frames_written += self.write_frames(writer, *self.finish_frames(*self.pop_ready()))
+
+        return frames_written
+
+    def write_frames(self, writer, number_of_frames, rendered_frames):
+        with metrics.stage("render_encode", number_of_frames):
+            for frame in rendered_frames:
+                writer.write(frame)
+        metrics.inc("frames_processed_total", number_of_frames)
+        return number_of_frames
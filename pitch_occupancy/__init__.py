@@ -0,0 +1,4 @@
+# Exposing
+
+
+from .occupancy_engine import OccupancyEngine, encode_grid, decode_grid, PHASES
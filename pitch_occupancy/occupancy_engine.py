@@ -0,0 +1,223 @@
+import base64
+import gzip
+import json
+import os
+import zlib
+import numpy as np
+import sys
+sys.path.append('../')
+from perspective_view_transformer import ViewTransformer
+
+PHASES = ("in_possession", "out_of_possession")
+
+def encode_grid(grid):
+    """
+    Compact form of a count grid for the dashboard : smallest unsigned dtype holding its counts,
+    zlib compressed (mostly empty cells compress well) and base64 encoded.
+
+    Returns:
+        dict: {"shape": [rows, columns], "dtype": str, "data": str}
+    """
+    grid = np.asarray(grid)
+    dtype = np.uint8 if grid.max(initial=0) < 2**8 else np.uint16 if grid.max(initial=0) < 2**16 else np.uint32
+    data = zlib.compress(np.ascontiguousarray(grid, dtype=np.dtype(dtype).newbyteorder('<')).tobytes(), 6)
+    return {"shape": list(grid.shape), "dtype": np.dtype(dtype).name, "data": base64.b64encode(data).decode('ascii')}
+
+def decode_grid(encoded):
+    # encode_grid output back to an array
+    data = zlib.decompress(base64.b64decode(encoded["data"]))
+    return np.frombuffer(data, dtype=np.dtype(encoded["dtype"]).newbyteorder('<')).reshape(encoded["shape"]).astype(np.int64)
+
+class OccupancyEngine():
+    """
+    Pitch occupancy (heatmap) grids of the players : the transformed pitch positions are binned
+    into cells of cell_size meters and counted per player, per team and per team & phase (team in
+    or out of possession of the ball).
+
+    Counts are frames, accumulated by counting the distinct (key, cell) pairs of all the detections
+    given at once (a frame, a streamed window or the whole match) with np.unique, so no Python loop
+    runs over the points. Track IDs get a dense index the first time they're
+    seen, so the per player grids are one (players x cells) array.
+
+    Attributes:
+        pitch_size (tuple): (length, width) in meters of the transformed area (ViewTransformer target).
+        cell_size (float): Side of a cell in meters.
+        fps (float): Frame rate, to express the grids in seconds.
+    """
+    def __init__(self, pitch_size=None, cell_size=1.0, fps=24):
+        if pitch_size is None: # the court rectangle positions are transformed to
+            pitch_size = tuple(float(size) for size in ViewTransformer().target_vertices.max(axis=0))
+        self.pitch_size = pitch_size
+        self.cell_size = cell_size
+        self.fps = fps
+        self.grid_shape = (int(np.ceil(pitch_size[1] / cell_size)), int(np.ceil(pitch_size[0] / cell_size))) # rows (width), columns (length)
+        self.reset()
+
+    def reset(self):
+        number_of_cells = self.grid_shape[0] * self.grid_shape[1]
+        self.frames = 0
+        self.player_index = {} # track ID -> row of player_grids
+        self.player_ids = np.zeros(0, dtype=np.int64) # track ID of each row
+        self.player_teams = np.zeros(0, dtype=np.int64) # last known team of each row
+        self.player_grids = np.zeros((0, number_of_cells), dtype=np.int64)
+        self.team_grids = {} # team -> grid
+        self.phase_grids = {} # team * len(PHASES) + phase index -> grid
+
+    def get_cells(self, positions):
+        """
+        Flat cell index of each position, -1 for missing positions (NaN : outside the court).
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1,2)
+        valid = ~np.isnan(positions).any(axis=1)
+        columns = np.clip(np.floor(positions[:,0] / self.cell_size), 0, self.grid_shape[1]-1)
+        rows = np.clip(np.floor(positions[:,1] / self.cell_size), 0, self.grid_shape[0]-1)
+        cells = np.where(valid, rows * self.grid_shape[1] + columns, -1)
+        return np.nan_to_num(cells, nan=-1).astype(np.int64)
+
+    def get_player_rows(self, track_ids):
+        # dense row of each track ID, new IDs appended to the player grids
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        unique_ids, inverse = np.unique(track_ids, return_inverse=True)
+        new_ids = [int(track_id) for track_id in unique_ids if int(track_id) not in self.player_index]
+        if new_ids:
+            for track_id in new_ids:
+                self.player_index[track_id] = len(self.player_index)
+            self.player_ids = np.concatenate([self.player_ids, new_ids])
+            self.player_teams = np.concatenate([self.player_teams, np.zeros(len(new_ids), dtype=np.int64)])
+            self.player_grids = np.concatenate([self.player_grids, np.zeros((len(new_ids), self.player_grids.shape[1]), dtype=np.int64)])
+        unique_rows = np.array([self.player_index[int(track_id)] for track_id in unique_ids], dtype=np.int64)
+        return unique_rows[inverse]
+
+    def count_pairs(self, keys, cells):
+        # (key, cell) pairs of the detections counted at once : key, cell & count of each distinct pair
+        number_of_cells = self.player_grids.shape[1]
+        pairs, counts = np.unique(np.asarray(keys, dtype=np.int64) * number_of_cells + cells, return_counts=True)
+        return pairs // number_of_cells, pairs % number_of_cells, counts
+
+    def add_to_grids(self, grids, keys, cells):
+        # grids[key] += cell counts of the detections of each key (a few keys : teams, team phases)
+        keys, cells, counts = self.count_pairs(keys, cells)
+        for key in np.unique(keys).tolist():
+            grid = grids.setdefault(key, np.zeros(self.player_grids.shape[1], dtype=np.int64))
+            of_key = keys == key
+            grid[cells[of_key]] += counts[of_key] # distinct cells : no repeated index
+
+    def update_arrays(self, frames, track_ids, positions, teams=None, possession_teams=None, number_of_frames=None):
+        """
+        Adds detections to the grids.
+
+        Args:
+            frames (np.ndarray): Frame index of each detection (N), relative to possession_teams.
+            track_ids (np.ndarray): Track ID of each detection (N).
+            positions (np.ndarray): N x 2 pitch positions in meters (NaN outside the court).
+            teams (np.ndarray, optional): Team of each detection (0 : unknown).
+            possession_teams (np.ndarray, optional): Team in possession of each frame (0 : nobody).
+            number_of_frames (int, optional): Frames covered by the detections.
+        """
+        frames = np.asarray(frames, dtype=np.int64)
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        teams = np.zeros(len(frames), dtype=np.int64) if teams is None else np.asarray(teams, dtype=np.int64)
+        if number_of_frames is None:
+            number_of_frames = int(frames.max()) + 1 if len(frames) else 0
+        self.frames += number_of_frames
+
+        cells = self.get_cells(positions)
+        valid = cells >= 0
+        if not valid.any():
+            return
+        frames, track_ids, teams, cells = frames[valid], track_ids[valid], teams[valid], cells[valid]
+
+        # per player
+        rows = self.get_player_rows(track_ids)
+        player_rows, player_cells, counts = self.count_pairs(rows, cells)
+        self.player_grids[player_rows, player_cells] += counts
+        known_team = teams != 0
+        self.player_teams[rows[known_team]] = teams[known_team] # last team of the detections (in frame order)
+
+        # per team, and per team & phase when the possession is known
+        frames, teams, cells = frames[known_team], teams[known_team], cells[known_team]
+        self.add_to_grids(self.team_grids, teams, cells)
+        if possession_teams is not None and len(frames):
+            possession_team = np.asarray(possession_teams, dtype=np.int64)[frames]
+            with_ball = possession_team != 0 # nobody has the ball : no phase
+            phases = np.where(possession_team == teams, 0, 1) # index in PHASES
+            self.add_to_grids(self.phase_grids, (teams * len(PHASES) + phases)[with_ball], cells[with_ball])
+
+    def update_store(self, store, possession=None):
+        """
+        Adds the players of a TrackStore (whole match), straight from its columns.
+        """
+        players = store["players"]
+        teams = players.columns["team"] if "team" in players.populated else None
+        self.update_arrays(players.frame, players.track_id, players.columns["position_transformed"], teams,
+                           possession["team"] if possession is not None else None, players.num_frames)
+
+    def update_window(self, tracks, possession=None):
+        """
+        Adds the players of consecutive frames in the tracks dictionary format (a streamed window).
+        """
+        frames, track_ids, positions, teams = [], [], [], []
+        for frame_num, player_track in enumerate(tracks["players"]):
+            for player_id, player in player_track.items():
+                position = player.get('position_transformed')
+                frames.append(frame_num)
+                track_ids.append(player_id)
+                positions.append(position if position is not None else (np.nan, np.nan))
+                teams.append(player.get('team', 0))
+        self.update_arrays(frames, track_ids, positions, teams,
+                           possession["team"] if possession is not None else None, len(tracks["players"]))
+
+    def update_frame(self, player_track, possession_team=0):
+        """
+        Adds one frame : {track_id: player} of the frame and the team in possession (0 : nobody).
+        """
+        self.update_window({"players": [player_track]}, {"team": [possession_team]})
+
+    def get_grid(self, kind, key, seconds=False):
+        """
+        Grid of a player (kind "player", key track ID), team ("team", key team) or team & phase
+        ("phase", key (team, phase)) as rows (pitch width) x columns (pitch length).
+
+        Returns:
+            np.ndarray: Frames (or seconds) spent in each cell, zeros when nothing was counted.
+        """
+        if kind == "player":
+            grid = self.player_grids[self.player_index[key]] if key in self.player_index else None
+        elif kind == "team":
+            grid = self.team_grids.get(key)
+        elif kind == "phase":
+            grid = self.phase_grids.get(key[0] * len(PHASES) + PHASES.index(key[1]))
+        else:
+            raise ValueError(f"Unknown grid kind {kind}, expected player, team or phase")
+        grid = np.zeros(self.grid_shape, dtype=np.int64) if grid is None else grid.reshape(self.grid_shape)
+        return grid / self.fps if seconds else grid
+
+    def to_dict(self, min_frames=1):
+        """
+        Serializable summary of every grid (encode_grid format), for the dashboard.
+
+        Args:
+            min_frames (int): Players counted on fewer frames are left out (short lived track IDs).
+        """
+        players = {}
+        for track_id, team, grid in zip(self.player_ids.tolist(), self.player_teams.tolist(), self.player_grids):
+            if grid.sum() >= min_frames:
+                players[str(track_id)] = {"team": team, "frames": int(grid.sum()), "grid": encode_grid(grid.reshape(self.grid_shape))}
+        return {
+            "pitch_size": list(self.pitch_size),
+            "cell_size": self.cell_size,
+            "grid_shape": list(self.grid_shape),
+            "fps": self.fps,
+            "frames": self.frames,
+            "players": players,
+            "teams": {str(team): encode_grid(grid.reshape(self.grid_shape)) for team, grid in sorted(self.team_grids.items())},
+            "phases": {f"{key // len(PHASES)}/{PHASES[key % len(PHASES)]}": encode_grid(grid.reshape(self.grid_shape))
+                       for key, grid in sorted(self.phase_grids.items())}
+        }
+
+    def save(self, path, min_frames=1):
+        # JSON (gzip compressed for a .gz path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt') as f:
+            json.dump(self.to_dict(min_frames), f, separators=(',', ':'))
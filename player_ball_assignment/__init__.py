@@ -1 +1,3 @@
-from .player_ball_assigner import PlayerBallAssigner
\ No newline at end of file
+from .player_ball_assigner import PlayerBallAssigner
+from .possession_engine import PossessionEngine
+from .possession_stats import PossessionStats
@@ -1,6 +1,8 @@
+import numpy as np
 import sys 
 sys.path.append('../')
-from utils import get_center_of_bbox, measure_distance
+from utils import get_center_of_bbox
+from spatial_index import SpatialIndex
 
 class PlayerBallAssigner():
     def __init__(self):
@@ -8,24 +10,18 @@ class PlayerBallAssigner():
 
     def assign_ball_to_player(self, players, ball_bbox):
         ball_position = get_center_of_bbox(ball_bbox)
+        if not players:
+            return -1
 
-        for player_id , player in players.items():
-            player_bbox = player['bbox']
-
-            minimum_distance = 99999
-            assigned_player = -1 # player with ball possession
-
-            distance_left = measure_distance((player_bbox[0],player_bbox[-1]),ball_position) # left foot (bottom left corner in bbox)
-            distance_right = measure_distance((player_bbox[2],player_bbox[-1]),ball_position) # right foot (bottom right corner in bbox)
-            distance = min(distance_left, distance_right)
-
-
-            if distance < self.max_player_ball_distance: # player within acceptable range
-                if distance < minimum_distance:
-                    minimum_distance = distance
-                    assigned_player = player_id # closest eligible player
-
-        return assigned_player
-
+        player_ids = list(players.keys())
+        player_bboxes = np.array([player['bbox'] for player in players.values()], dtype=np.float64)
 
+        # feet of the frame in a spatial index : point 2*i is the left foot (bottom left corner in bbox), 2*i+1 the right one
+        feet = np.stack([player_bboxes[:,[0,3]], player_bboxes[:,[2,3]]], axis=1).reshape(-1,2)
+        index = SpatialIndex(self.max_player_ball_distance).build(np.zeros(len(feet), dtype=np.int64), feet)
 
+        # closest foot within the acceptable range
+        foot, distance = index.knn(0, [ball_position], k=1, max_radius=self.max_player_ball_distance)
+        if distance[0,0] >= self.max_player_ball_distance:
+            return -1 # player with ball possession
+        return player_ids[foot[0,0] // 2] # closest eligible player
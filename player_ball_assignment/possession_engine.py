@@ -0,0 +1,129 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import scale_length
+from spatial_index import SpatialIndex
+
+class PossessionEngine():
+    """
+    Whole-match (or streaming window) version of PlayerBallAssigner.
+
+    Takes the player bboxes of every frame and the ball center of every frame as arrays and finds
+    the closest player whose left or right foot (bottom corners of the bbox) is within
+    max_player_ball_distance of the ball : the feet of all the frames go in a SpatialIndex and the
+    ball centers are one batched nearest neighbour query on it.
+
+    Attributes:
+        max_player_ball_distance (float): Maximum foot-ball distance (pixels) to own the ball.
+        frame_size (tuple): (width, height) of the video, the distance was set on 1920x1080.
+    """
+    def __init__(self, frame_size=None):
+        self.max_player_ball_distance = scale_length(70, frame_size)
+
+    def build_feet_index(self, player_frames, player_bboxes):
+        # spatial index over the feet (bottom corners of the bboxes), one grid cell per possession radius
+        feet = np.stack([player_bboxes[:,[0,3]], player_bboxes[:,[2,3]]], axis=1).reshape(-1,2) # left foot (bottom left corner in bbox), right foot
+        return SpatialIndex(self.max_player_ball_distance).build(np.repeat(player_frames, 2), feet)
+
+    def assign(self, player_frames, player_ids, player_bboxes, ball_centers, player_teams=None):
+        """
+        Args:
+            player_frames (np.ndarray): Frame index of each player detection (N).
+            player_ids (np.ndarray): Track ID of each player detection (N).
+            player_bboxes (np.ndarray): N x 4 player bboxes.
+            ball_centers (np.ndarray): F x 2 ball center per frame (NaN when there's no ball).
+            player_teams (np.ndarray, optional): Team of each player detection (N).
+
+        Returns:
+            dict: {
+                "player": F possessor track IDs (-1 when nobody has the ball),
+                "team": F possessor teams (0 when nobody has the ball or teams are unknown),
+                "row": F index of the possessor detection in the inputs (-1 when nobody),
+                "player_changes": frames where the possessor differs from the previous frame,
+                "team_changes": frames where the team in possession differs from the previous frame
+            }
+        """
+        player_frames = np.asarray(player_frames, dtype=np.int64)
+        player_bboxes = np.asarray(player_bboxes, dtype=np.float64).reshape(-1,4)
+        ball_centers = np.asarray(ball_centers, dtype=np.float64).reshape(-1,2)
+        number_of_frames = len(ball_centers)
+
+        # both feet of every player in the index : point 2*row is the left foot, 2*row+1 the right one
+        index = self.build_feet_index(player_frames, player_bboxes)
+
+        # closest foot within range of the ball of each frame (ties : first player row, like the scan)
+        frames = np.arange(number_of_frames)
+        feet, distance = index.knn(frames, ball_centers, k=1, max_radius=self.max_player_ball_distance)
+        with_ball = distance[:,0] < self.max_player_ball_distance # NaN ball : no neighbour, inf distance
+        frames_with_ball, rows = frames[with_ball], feet[with_ball,0] // 2
+
+        possessor_row = np.full(number_of_frames, -1, dtype=np.int64)
+        possessor_row[frames_with_ball] = rows
+
+        possessor = np.full(number_of_frames, -1, dtype=np.int64)
+        possessor[frames_with_ball] = np.asarray(player_ids)[rows]
+
+        team = np.zeros(number_of_frames, dtype=np.int64)
+        if player_teams is not None:
+            team[frames_with_ball] = np.asarray(player_teams)[rows]
+
+        return {
+            "player": possessor,
+            "team": team,
+            "row": possessor_row,
+            "player_changes": self.get_changes(possessor),
+            "team_changes": self.get_changes(team)
+        }
+
+    @staticmethod
+    def get_changes(values):
+        # indices i where values[i] != values[i-1]
+        values = np.asarray(values)
+        return np.flatnonzero(values[1:] != values[:-1]) + 1
+
+    def assign_store(self, store):
+        """
+        Possession for a whole TrackStore : also sets the has_ball column of the players.
+        """
+        players = store["players"]
+        ball = store["ball"]
+
+        ball_bbox = ball.columns["bbox"].astype(np.float64)
+        ball_centers = np.full((players.num_frames,2), np.nan)
+        ball_centers[ball.frame] = np.trunc(np.stack([(ball_bbox[:,0]+ball_bbox[:,2])/2, (ball_bbox[:,1]+ball_bbox[:,3])/2], axis=1)) # like get_center_of_bbox
+
+        player_teams = players.columns["team"] if "team" in players.populated else None
+        possession = self.assign(players.frame, players.track_id, players.columns["bbox"], ball_centers, player_teams)
+
+        has_ball = np.zeros(len(players.frame), dtype=bool)
+        has_ball[possession["row"][possession["row"] >= 0]] = True
+        players.set_column("has_ball", has_ball)
+
+        return possession
+
+    def assign_tracks(self, tracks):
+        """
+        Possession for the tracks dictionary (e.g. one streamed window) : the dicts are flattened into
+        arrays once, and 'has_ball' is set on the possessor of each frame.
+        """
+        player_frames, player_ids, player_bboxes, player_teams, player_infos = [], [], [], [], []
+        for frame_num, player_track in enumerate(tracks['players']):
+            for player_id, player in player_track.items():
+                player_frames.append(frame_num)
+                player_ids.append(player_id)
+                player_bboxes.append(player['bbox'])
+                player_teams.append(player.get('team', 0))
+                player_infos.append(player)
+
+        ball_centers = np.full((len(tracks['players']),2), np.nan)
+        for frame_num, ball_track in enumerate(tracks['ball']):
+            if 1 in ball_track:
+                x1, y1, x2, y2 = ball_track[1]['bbox']
+                ball_centers[frame_num] = int((x1+x2)/2), int((y1+y2)/2)
+
+        possession = self.assign(player_frames, player_ids, player_bboxes, ball_centers, player_teams)
+
+        for row in possession["row"][possession["row"] >= 0]:
+            player_infos[row]['has_ball'] = True
+
+        return possession
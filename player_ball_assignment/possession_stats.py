@@ -0,0 +1,77 @@
+from collections import deque
+
+class PossessionStats():
+    """
+    Running possession statistics, updated frame by frame in O(1).
+
+    Keeps per-team and per-player possession counts since the start of the match, plus the team
+    counts over a rolling window (e.g. the last 5 minutes). Frames where nobody has the ball are
+    counted separately, so the shares are over the frames with possession (like the possession
+    panel) while frame numbers stay aligned.
+
+    Attributes:
+        rolling_window (int): Number of frames of the rolling window.
+    """
+    def __init__(self, rolling_window=5*60*24):
+        self.rolling_window = rolling_window # 5 minutes at 24 fps
+        self.number_of_frames = 0
+        self.no_possession_frames = 0
+        self.team_frames = {} # {team: frames with the ball}
+        self.player_frames = {} # {player_id: frames with the ball}
+
+        self.rolling_teams = deque() # team of each frame of the rolling window (0 = nobody)
+        self.rolling_team_frames = {}
+
+    def update(self, player_id, team):
+        """
+        Adds the possessor of the next frame.
+
+        Args:
+            player_id (int): Track ID of the player with the ball, -1 if nobody.
+            team (int): Team of that player, 0 if nobody.
+        """
+        self.number_of_frames += 1
+        if player_id == -1 or team == 0:
+            self.no_possession_frames += 1
+            team = 0
+        else:
+            self.team_frames[team] = self.team_frames.get(team, 0) + 1
+            self.player_frames[player_id] = self.player_frames.get(player_id, 0) + 1
+
+        # rolling window
+        self.rolling_teams.append(team)
+        self.rolling_team_frames[team] = self.rolling_team_frames.get(team, 0) + 1
+        if len(self.rolling_teams) > self.rolling_window:
+            oldest_team = self.rolling_teams.popleft()
+            self.rolling_team_frames[oldest_team] -= 1
+
+    def update_many(self, player_ids, teams):
+        # adds consecutive frames (e.g. a streamed window)
+        for player_id, team in zip(player_ids, teams):
+            self.update(int(player_id), int(team))
+
+    def get_team_share(self, team):
+        # share of the frames with possession where the team had the ball
+        possession_frames = self.number_of_frames - self.no_possession_frames
+        return self.team_frames.get(team, 0) / possession_frames if possession_frames else 0.0
+
+    def get_player_share(self, player_id):
+        possession_frames = self.number_of_frames - self.no_possession_frames
+        return self.player_frames.get(player_id, 0) / possession_frames if possession_frames else 0.0
+
+    def get_rolling_team_share(self, team):
+        possession_frames = len(self.rolling_teams) - self.rolling_team_frames.get(0, 0)
+        return self.rolling_team_frames.get(team, 0) / possession_frames if possession_frames else 0.0
+
+    def get_summary(self):
+        """
+        Returns:
+            dict: Current shares per team & player, rolling team shares and frame counts (for exporters).
+        """
+        return {
+            "frames": self.number_of_frames,
+            "no_possession_frames": self.no_possession_frames,
+            "team_share": {team: self.get_team_share(team) for team in self.team_frames},
+            "rolling_team_share": {team: self.get_rolling_team_share(team) for team in self.rolling_team_frames if team != 0},
+            "player_share": {player_id: self.get_player_share(player_id) for player_id in self.player_frames}
+        }
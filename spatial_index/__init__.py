@@ -0,0 +1,5 @@
+# Exposing
+
+
+from .spatial_index import SpatialIndex
+from .tactical_metrics import nearest_opponent, players_within, pressure_on_ball_carrier, passing_lane_obstruction
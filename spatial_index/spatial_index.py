@@ -0,0 +1,207 @@
+import numpy as np
+
+class SpatialIndex():
+    """
+    Per frame uniform grid over 2D points (player pitch positions, feet in pixels, ...) answering
+    batched radius and k-nearest queries, with team filters.
+
+    The index of many frames is built at once : every point gets the key (frame, cell row, cell
+    column) and the keys are sorted once, so the cells of a grid row around a query are a
+    contiguous run found with searchsorted. Rebuilding it for a new frame or window is a single sort. Queries are arrays
+    (one row per query point, each with its own frame) : the candidate points of the neighbouring
+    cells are gathered for all the queries together and filtered / ranked with array operations,
+    never with a Python loop over players.
+
+    Attributes:
+        cell_size (float): Side of a grid cell, in the unit of the points (best around the usual query radius).
+    """
+    def __init__(self, cell_size=5.0):
+        self.cell_size = cell_size
+        self.build([], np.zeros((0,2)))
+
+    def build(self, frames, points, teams=None, ids=None):
+        """
+        Indexes the points.
+
+        Args:
+            frames (np.ndarray): Frame of each point (N).
+            points (np.ndarray): N x 2 coordinates, NaN rows are left out of the index.
+            teams (np.ndarray, optional): Team of each point (0 : unknown), for the team filters.
+            ids (np.ndarray, optional): Identifier returned for each point (e.g. track ID), the row by default.
+
+        Returns:
+            SpatialIndex: self.
+        """
+        self.frames = np.asarray(frames, dtype=np.int64).reshape(-1)
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1,2)
+        self.teams = np.zeros(len(self.points), dtype=np.int64) if teams is None else np.asarray(teams, dtype=np.int64)
+        self.ids = np.arange(len(self.points)) if ids is None else np.asarray(ids)
+
+        rows = np.flatnonzero(~(np.isnan(self.points[:,0]) | np.isnan(self.points[:,1])))
+        cells = np.floor(self.points[rows] / self.cell_size).astype(np.int64)
+        if len(rows):
+            self.origin = np.array([cells[:,0].min(), cells[:,1].min()]) # (column, row) of the first cell
+            self.grid_size = np.array([cells[:,0].max(), cells[:,1].max()]) - self.origin + 1
+        else:
+            self.origin, self.grid_size = np.zeros(2, dtype=np.int64), np.ones(2, dtype=np.int64)
+
+        keys = self.make_keys(self.frames[rows], cells)
+        order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[order]
+        self.sorted_rows = rows[order]
+        return self
+
+    def make_keys(self, frames, cells):
+        # (frame, cell row, cell column) -> sortable int64 key
+        return (frames * self.grid_size[1] + cells[:,1] - self.origin[1]) * self.grid_size[0] + cells[:,0] - self.origin[0]
+
+    def __len__(self):
+        return len(self.sorted_rows)
+
+    @staticmethod
+    def expand_ranges(queries, starts, ends):
+        # (query, position) pairs of the sorted ranges [start, end) of each query
+        counts = ends - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        offsets = np.cumsum(counts) - counts
+        positions = np.arange(total) - np.repeat(offsets, counts) + np.repeat(starts, counts)
+        return np.repeat(queries, counts), positions
+
+    def get_candidates(self, frames, points, radius=None):
+        """
+        Indexed points that can be within radius of each query : the points of the cells around it,
+        or of its whole frame when radius is None.
+
+        Returns:
+            tuple: (query index, point row) pairs.
+        """
+        query_index = np.flatnonzero(~(np.isnan(points[:,0]) | np.isnan(points[:,1])))
+        query_frames, query_points = frames[query_index], points[query_index]
+        if radius is None:
+            frame_keys = query_frames * self.grid_size[1] * self.grid_size[0]
+            starts = np.searchsorted(self.sorted_keys, frame_keys)
+            ends = np.searchsorted(self.sorted_keys, frame_keys + self.grid_size[1] * self.grid_size[0])
+            queries, positions = self.expand_ranges(query_index, starts, ends)
+            return queries, self.sorted_rows[positions]
+
+        reach = int(np.ceil(np.max(radius, initial=0) / self.cell_size)) # cells around the query covering the (largest) radius
+        query_cells = np.floor(query_points / self.cell_size).astype(np.int64) - self.origin
+        # the cells of a grid row are consecutive keys : one sorted range per row around the query
+        first_column = np.maximum(query_cells[:,0] - reach, 0)
+        last_column = np.minimum(query_cells[:,0] + reach, self.grid_size[0] - 1)
+        all_queries, all_positions = [], []
+        for row_offset in range(-reach, reach+1):
+            rows = query_cells[:,1] + row_offset
+            in_grid = (rows >= 0) & (rows < self.grid_size[1]) & (first_column <= last_column)
+            row_keys = (query_frames[in_grid] * self.grid_size[1] + rows[in_grid]) * self.grid_size[0]
+            starts = np.searchsorted(self.sorted_keys, row_keys + first_column[in_grid], side='left')
+            ends = np.searchsorted(self.sorted_keys, row_keys + last_column[in_grid], side='right')
+            queries, positions = self.expand_ranges(query_index[in_grid], starts, ends)
+            all_queries.append(queries)
+            all_positions.append(positions)
+        return np.concatenate(all_queries), self.sorted_rows[np.concatenate(all_positions)]
+
+    def filter_candidates(self, queries, rows, team=None, exclude_team=None, exclude_rows=None):
+        # team filters : team / exclude_team are a team for every query or one per query
+        keep = np.ones(len(rows), dtype=bool)
+        if team is not None:
+            keep &= self.teams[rows] == (np.asarray(team)[queries] if np.ndim(team) else team)
+        if exclude_team is not None:
+            keep &= self.teams[rows] != (np.asarray(exclude_team)[queries] if np.ndim(exclude_team) else exclude_team)
+        if exclude_rows is not None: # e.g. the query player itself
+            keep &= rows != np.asarray(exclude_rows)[queries]
+        return queries[keep], rows[keep]
+
+    def query_pairs(self, frames, points, radius=None, team=None, exclude_team=None, exclude_rows=None):
+        """
+        (query, point) pairs within radius (every point of the frame when radius is None), sorted by
+        query, distance and point row.
+
+        Returns:
+            tuple: (query index, point row, distance) arrays.
+        """
+        frames = np.broadcast_to(np.asarray(frames, dtype=np.int64), (len(np.asarray(points).reshape(-1,2)),))
+        points = np.asarray(points, dtype=np.float64).reshape(-1,2)
+        queries, rows = self.get_candidates(frames, points, radius)
+        queries, rows = self.filter_candidates(queries, rows, team, exclude_team, exclude_rows)
+
+        distances = np.hypot(self.points[rows,0] - points[queries,0], self.points[rows,1] - points[queries,1])
+        if radius is not None:
+            within = distances <= (np.asarray(radius)[queries] if np.ndim(radius) else radius)
+            queries, rows, distances = queries[within], rows[within], distances[within]
+        order = np.lexsort((rows, distances, queries))
+        return queries[order], rows[order], distances[order]
+
+    def radius_query(self, frames, points, radius, team=None, exclude_team=None, exclude_rows=None):
+        """
+        Indexed points within radius of each query point (same frame).
+
+        Args:
+            frames (np.ndarray or int): Frame of each query (Q), or one frame for all of them.
+            points (np.ndarray): Q x 2 query coordinates (NaN queries get no result).
+            radius (float or np.ndarray): Maximum distance (included), or one per query.
+            team (int or np.ndarray, optional): Only the points of this team (per query with an array).
+            exclude_team (int or np.ndarray, optional): Leaves out the points of this team (e.g. teammates).
+            exclude_rows (np.ndarray, optional): Indexed row left out for each query (-1 : none), e.g. itself.
+
+        Returns:
+            tuple: (query index, point row, distance) pairs, sorted by query then distance.
+        """
+        return self.query_pairs(frames, points, radius, team, exclude_team, exclude_rows)
+
+    def count_within(self, frames, points, radius, team=None, exclude_team=None, exclude_rows=None):
+        # number of indexed points within radius of each query
+        queries, _, _ = self.radius_query(frames, points, radius, team, exclude_team, exclude_rows)
+        return np.bincount(queries, minlength=len(np.asarray(points).reshape(-1,2)))
+
+    def knn(self, frames, points, k=1, team=None, exclude_team=None, exclude_rows=None, max_radius=None):
+        """
+        k nearest indexed points of each query point (same frame), ties broken by point row.
+
+        Args:
+            k (int): Neighbours per query.
+            max_radius (float, optional): Only neighbours within this distance (only the cells around
+                                          the query are searched), the whole frame otherwise.
+            (other arguments as radius_query)
+
+        Returns:
+            tuple: (rows, distances), Q x k arrays : point rows (-1 when fewer neighbours) and their
+                   distances (inf when missing), nearest first.
+        """
+        number_of_queries = len(np.asarray(points).reshape(-1,2))
+        queries, rows, distances = self.query_pairs(frames, points, max_radius, team, exclude_team, exclude_rows)
+
+        # rank of each pair inside its query (pairs are sorted by query then distance)
+        first = np.searchsorted(queries, queries, side='left')
+        rank = np.arange(len(queries)) - first
+        keep = rank < k
+        neighbour_rows = np.full((number_of_queries, k), -1, dtype=np.int64)
+        neighbour_distances = np.full((number_of_queries, k), np.inf)
+        neighbour_rows[queries[keep], rank[keep]] = rows[keep]
+        neighbour_distances[queries[keep], rank[keep]] = distances[keep]
+        return neighbour_rows, neighbour_distances
+
+    @classmethod
+    def from_tracks(cls, tracks, cell_size=5.0, key='position_transformed'):
+        """
+        Index of the players of consecutive frames in the tracks dictionary format, on their pitch
+        positions (key) : ids are the track IDs, teams the assigned teams (0 before team assignment).
+        """
+        frames, points, teams, ids = [], [], [], []
+        for frame_num, player_track in enumerate(tracks["players"]):
+            for player_id, player in player_track.items():
+                point = player.get(key)
+                frames.append(frame_num)
+                points.append(point if point is not None else (np.nan, np.nan))
+                teams.append(player.get('team', 0))
+                ids.append(player_id)
+        return cls(cell_size).build(frames, points, teams, ids)
+
+    @classmethod
+    def from_store(cls, store, cell_size=5.0, key='position_transformed'):
+        # same as from_tracks, straight from the TrackStore columns
+        players = store["players"]
+        teams = players.columns["team"] if "team" in players.populated else None
+        return cls(cell_size).build(players.frame, players.columns[key], teams, players.track_id)
@@ -0,0 +1,78 @@
+import numpy as np
+
+def nearest_opponent(index):
+    """
+    Nearest player of the other team of every indexed player (same frame).
+
+    Returns:
+        tuple: (rows, distances) per indexed point : row of the nearest opponent (-1 when none, or
+               when the team is unknown) and its distance (inf when none).
+    """
+    rows = np.arange(len(index.points))
+    neighbour_rows, distances = index.knn(index.frames, np.where((index.teams != 0)[:,None], index.points, np.nan), k=1,
+                                          exclude_team=index.teams, exclude_rows=rows)
+    return neighbour_rows[:,0], distances[:,0]
+
+def players_within(index, rows, radius, team=None, exclude_team=None):
+    # number of indexed players within radius of the indexed players rows (themselves left out)
+    rows = np.asarray(rows, dtype=np.int64)
+    return index.count_within(index.frames[rows], index.points[rows], radius, team, exclude_team, exclude_rows=rows)
+
+def pressure_on_ball_carrier(index, carrier_rows, radius=5.0):
+    """
+    Opponents within radius of the ball carrier of each frame.
+
+    Args:
+        index (SpatialIndex): Index of the players (with teams).
+        carrier_rows (np.ndarray): Indexed row of the ball carrier of each frame (-1 : nobody).
+        radius (float): Pressure radius, in the unit of the index (meters on pitch positions).
+
+    Returns:
+        tuple: (number of opponents, distance of the closest one (inf when none)) per frame.
+    """
+    carrier_rows = np.asarray(carrier_rows, dtype=np.int64)
+    with_carrier = np.flatnonzero(carrier_rows >= 0)
+    rows = carrier_rows[with_carrier]
+
+    pressure = np.zeros(len(carrier_rows), dtype=np.int64)
+    closest = np.full(len(carrier_rows), np.inf)
+    pressure[with_carrier] = index.count_within(index.frames[rows], index.points[rows], radius, exclude_team=index.teams[rows])
+    _, distances = index.knn(index.frames[rows], index.points[rows], k=1, exclude_team=index.teams[rows], max_radius=radius)
+    closest[with_carrier] = distances[:,0]
+    return pressure, closest
+
+def passing_lane_obstruction(index, carrier_rows, lane_width=2.0):
+    """
+    Opponents blocking the passing lanes of the ball carrier of each frame : for each teammate of
+    the carrier, the opponents closer than lane_width to the carrier -> teammate segment. The
+    candidates come from one radius query around the middle of each lane.
+
+    Args:
+        index (SpatialIndex): Index of the players (with teams).
+        carrier_rows (np.ndarray): Indexed row of the ball carrier of each frame (-1 : nobody).
+        lane_width (float): Distance to the segment that blocks a lane.
+
+    Returns:
+        tuple: (carrier row, teammate row, number of blocking opponents) arrays, one entry per lane.
+    """
+    carrier_rows = np.asarray(carrier_rows, dtype=np.int64)
+    carrier_rows = carrier_rows[carrier_rows >= 0]
+    carrier_rows = carrier_rows[index.teams[carrier_rows] != 0]
+
+    # lanes : the carrier and every teammate of its frame
+    queries, teammates, _ = index.query_pairs(index.frames[carrier_rows], index.points[carrier_rows],
+                                              team=index.teams[carrier_rows], exclude_rows=carrier_rows)
+    carriers = carrier_rows[queries]
+    start, end = index.points[carriers], index.points[teammates]
+    middle, half_length = (start + end) / 2, np.hypot(*(end - start).T) / 2
+
+    # opponents near the middle of the lane, then their distance to the segment
+    lane_index, opponents, _ = index.radius_query(index.frames[carriers], middle, half_length + lane_width,
+                                                  exclude_team=index.teams[carriers])
+
+    segment = end[lane_index] - start[lane_index]
+    length_squared = np.maximum((segment**2).sum(axis=1), 1e-12)
+    t = np.clip(((index.points[opponents] - start[lane_index]) * segment).sum(axis=1) / length_squared, 0, 1)
+    distance = np.hypot(*(start[lane_index] + t[:,None]*segment - index.points[opponents]).T)
+    blocking = np.bincount(lane_index[distance <= lane_width], minlength=len(carriers))
+    return carriers, teammates, blocking
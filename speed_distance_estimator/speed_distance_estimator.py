@@ -1,7 +1,8 @@
 import cv2
+import numpy as np
 import sys 
 sys.path.append('../')
-from utils import measure_distance ,get_foot_position
+from utils import measure_distance ,get_foot_position, scale_length
 
 class SpeedAndDistanceEstimator():
     """
@@ -17,10 +18,94 @@ class SpeedAndDistanceEstimator():
         self.frame_window = 5 # number of frames used to calculate speed and distance.
         self.frame_rate = 24 # frame rate of the video in frames per second (fps).
     
-    def add_speed_and_distance_to_tracks(self,tracks):
+    def compute_speed_and_distance(self, frames, track_ids, positions, number_of_frames, initial_distance=None):
+        """
+        Speed (km/h) and cumulative distance (m) of every detection, computed per track with NumPy.
+
+        Frames are grouped in batches of frame_window frames : for each batch starting at frame s, a
+        track present (with a valid position) at s and at min(s+frame_window, number_of_frames-1) gets
+        the distance between both positions, the matching speed, and its cumulative distance, written
+        on every frame of the batch except the last one.
+
+        Args:
+            frames (np.ndarray): Frame index of each detection (N).
+            track_ids (np.ndarray): Track ID of each detection (N).
+            positions (np.ndarray): N x 2 transformed positions (NaN outside the court).
+            number_of_frames (int): Number of frames of the video (or window).
+            initial_distance (dict, optional): {track_id: distance} already covered (previous windows).
+
+        Returns:
+            tuple: (speed, distance, total_distance) where speed and distance are N arrays (NaN when
+                   not computed) and total_distance the {track_id: distance} at the end.
+        """
+        frames = np.asarray(frames, dtype=np.int64)
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1,2)
+        speed = np.full(len(frames), np.nan)
+        distance = np.full(len(frames), np.nan)
+        total_distance = dict(initial_distance) if initial_distance else {}
+        if len(frames) == 0:
+            return speed, distance, total_distance
+
+        # detection lookup by (track, frame)
+        keys = track_ids * (number_of_frames+1) + frames
+        key_order = np.argsort(keys)
+        sorted_keys = keys[key_order]
+
+        # start & end detection of every (track, batch)
+        batch_start = (frames // self.frame_window) * self.frame_window
+        batch_last = np.minimum(batch_start + self.frame_window, number_of_frames-1)
+        start_rows = np.flatnonzero((frames == batch_start) & (batch_last > batch_start))
+        end_keys = track_ids[start_rows] * (number_of_frames+1) + batch_last[start_rows]
+        end_index = np.minimum(np.searchsorted(sorted_keys, end_keys), len(sorted_keys)-1)
+        found = sorted_keys[end_index] == end_keys
+        start_rows = start_rows[found]
+        end_rows = key_order[end_index[found]]
+
+        # skip if positions are invalid (e.g., outside the court area).
+        valid = ~np.isnan(positions[start_rows]).any(axis=1) & ~np.isnan(positions[end_rows]).any(axis=1)
+        start_rows, end_rows = start_rows[valid], end_rows[valid]
+
+        # distance covered, time elapsed & speed of each (track, batch)
+        distance_covered = np.hypot(*(positions[end_rows] - positions[start_rows]).T)
+        time_elapsed = (frames[end_rows] - frames[start_rows]) / self.frame_rate
+        batch_speed = distance_covered / time_elapsed * 3.6 # m/s -> km/h
+
+        # cumulative distance per track, batches in frame order
+        batch_track = track_ids[start_rows]
+        batch_frame = frames[start_rows]
+        order = np.lexsort((batch_frame, batch_track))
+        batch_track, batch_frame = batch_track[order], batch_frame[order]
+        batch_speed, distance_covered = batch_speed[order], distance_covered[order]
+        cumulative = np.cumsum(distance_covered)
+        track_first = np.flatnonzero(np.r_[len(batch_track) > 0, batch_track[1:] != batch_track[:-1]]) # none without batches
+        track_length = np.diff(np.r_[track_first, len(batch_track)])
+        cumulative -= np.repeat(cumulative[track_first] - distance_covered[track_first], track_length)
+        initial = np.array([total_distance.get(int(track_id), 0) for track_id in batch_track[track_first]], dtype=np.float64)
+        cumulative += np.repeat(initial, track_length)
+
+        for track_id, track_total in zip(batch_track[track_first + track_length - 1], cumulative[track_first + track_length - 1]):
+            total_distance[int(track_id)] = float(track_total)
+
+        # scatter back on every detection of the batch (except the last frame)
+        batch_keys = batch_track * (number_of_frames+1) + batch_frame
+        row_keys = track_ids * (number_of_frames+1) + batch_start
+        batch_index = np.minimum(np.searchsorted(batch_keys, row_keys), max(len(batch_keys)-1, 0))
+        has_batch = (len(batch_keys) > 0) & (frames < batch_last)
+        if len(batch_keys):
+            has_batch &= batch_keys[batch_index] == row_keys
+        speed[has_batch] = batch_speed[batch_index[has_batch]]
+        distance[has_batch] = cumulative[batch_index[has_batch]]
+
+        return speed, distance, total_distance
+
+    def add_speed_and_distance_to_tracks(self,tracks, total_distance=None):
         """
         Adds speed (in km/h) and cumulative distance (in meters) to the tracking data.
 
+        The position_transformed time series are gathered once into arrays, computed with
+        compute_speed_and_distance and scattered back into the frame dicts.
+
         Args:
             tracks (dict): Tracking data for objects. Expected structure:
                            {
@@ -29,8 +114,11 @@ class SpeedAndDistanceEstimator():
                                "referees": [frame_0, frame_1, ...]
                            }
                            Each frame contains tracked objects with keys like 'position_transformed'.
+            total_distance (dict, optional): Cumulative distances carried over from previous windows
+                                             of a streamed video. Updated in place.
         """
-        total_distance= {} # dict to store cumulative distance for each object and track ID.
+        if total_distance is None:
+            total_distance= {} # dict to store cumulative distance for each object and track ID.
 
         # iterate over all tracked objects (e.g., players, ball, referees).
         for object, object_tracks in tracks.items():
@@ -38,52 +126,160 @@ class SpeedAndDistanceEstimator():
             if object == "ball" or object == "referees":
                 continue 
 
-            number_of_frames = len(object_tracks) # total number of frames for this object.
-
-            # process frames in batches of size `frame_window`.
-            for frame_num in range(0,number_of_frames, self.frame_window):
-                # determine the last frame in the current batch.
-                last_frame = min(frame_num+self.frame_window,number_of_frames-1 )
-
-                # iterate over all tracked IDs in the current frame.
-                for track_id,_ in object_tracks[frame_num].items():
-                     # skip if the object is not present in the last frame of the batch.
-                    if track_id not in object_tracks[last_frame]:
-                        continue
-
-                    # get the start & end positions for the object in the batch.        
-                    start_position = object_tracks[frame_num][track_id]['position_transformed']
-                    end_position = object_tracks[last_frame][track_id]['position_transformed']
-
-                    # skip if positions are invalid (e.g., outside the court area).
-                    if start_position is None or end_position is None:
-                        continue
-                    
-                    # calculate distance covered in the batch (in meters).
-                    distance_covered = measure_distance(start_position,end_position)
-                    # calculate time elapsed in the batch (in seconds).
-                    time_elapsed = (last_frame-frame_num)/self.frame_rate
-                    # Calculate speed in meters per second and convert to km/h.
-                    speed_meteres_per_second = distance_covered/time_elapsed
-                    speed_km_per_hour = speed_meteres_per_second*3.6
-
-                    # initialize the total distance dictionary for this object and track ID.
-
-                    if object not in total_distance:
-                        total_distance[object]= {}
-                    
-                    if track_id not in total_distance[object]:
-                        total_distance[object][track_id] = 0
-
-                    # update cumulative distance.
-                    total_distance[object][track_id] += distance_covered
-
-                    # add speed & distance to each frame in the current batch.
-                    for frame_num_batch in range(frame_num,last_frame):
-                        if track_id not in tracks[object][frame_num_batch]:
-                            continue
-                        tracks[object][frame_num_batch][track_id]['speed'] = speed_km_per_hour
-                        tracks[object][frame_num_batch][track_id]['distance'] = total_distance[object][track_id]
+            total_distance[object] = self.add_to_frames(object_tracks, len(object_tracks), total_distance.get(object))
+
+    def add_to_frames(self, object_frames, number_of_frames, initial_distance=None):
+        """
+        Gathers the positions of the first number_of_frames frame dicts, computes their speed &
+        distance with compute_speed_and_distance and scatters them back into the dicts.
+
+        Returns:
+            dict: {track_id: cumulative distance} at the end.
+        """
+        # gather
+        frames, track_ids, positions, track_infos = [], [], [], []
+        for frame_num in range(number_of_frames):
+            for track_id, track_info in object_frames[frame_num].items():
+                frames.append(frame_num)
+                track_ids.append(track_id)
+                position = track_info['position_transformed']
+                positions.append(position if position is not None else (np.nan, np.nan))
+                track_infos.append(track_info)
+
+        speed, distance, total_distance = self.compute_speed_and_distance(frames, track_ids, positions,
+                                                                          number_of_frames, initial_distance)
+        # scatter
+        for row in np.flatnonzero(~np.isnan(speed)):
+            track_infos[row]['speed'] = float(speed[row])
+            track_infos[row]['distance'] = float(distance[row])
+        return total_distance
+
+    def start_windows(self):
+        """
+        Resets the windowed estimation, see add_speed_and_distance_to_window.
+        """
+        self.window_total_distance = {} # {object: {track_id: cumulative distance}}
+        self.window_carry = {} # {object: frame dicts of the open batch, carried to the next window}
+        self.window_carry_start = 0 # frame number of the first carried frame (start of the open batch)
+
+    def add_speed_and_distance_to_window(self, tracks, final=False):
+        """
+        Windowed variant of add_speed_and_distance_to_tracks for consecutive windows of a stream, of
+        any size : batches stay aligned on the frame numbers of the whole video. The batches whose
+        end frame is in a later window are carried (their frame dicts are kept) and computed, in
+        the same vectorized pass, with the next window. The result is the same as computing the
+        whole video at once.
+
+        Args:
+            tracks (dict): Tracks of the next window (with 'position_transformed').
+            final (bool): Last window of the video : the open batches end on its last frame.
+
+        Returns:
+            int: Frame number (in the whole video) before which every frame has its final speed & distance.
+        """
+        if not hasattr(self, "window_carry"):
+            self.start_windows()
+
+        carry_length = len(next(iter(self.window_carry.values()), []))
+        window_length = max((len(object_tracks) for object_tracks in tracks.values()), default=0)
+        number_of_frames = carry_length + window_length # frames since the start of the open batch
+        if final:
+            closed_frames = number_of_frames
+        else: # up to the start of the first batch that doesn't end in this window (its end frame included)
+            closed_frames = max(0, (number_of_frames - 1) // self.frame_window * self.frame_window + 1)
+
+        for object, object_tracks in tracks.items():
+            # skip "ball" and "referees" as speed and distance are not calculated for them.
+            if object == "ball" or object == "referees":
+                continue
+            object_frames = self.window_carry.get(object, []) + list(object_tracks)
+            self.window_total_distance[object] = self.add_to_frames(object_frames, closed_frames,
+                                                                    self.window_total_distance.get(object))
+            self.window_carry[object] = object_frames[max(closed_frames-1, 0):] if not final else []
+
+        ready_until = self.window_carry_start + (number_of_frames if final else max(closed_frames-1, 0))
+        self.window_carry_start = ready_until
+        return ready_until
+
+    def add_speed_and_distance_to_store(self, store):
+        """
+        Speed & distance columns of a TrackStore (players only), computed on the whole match at once.
+        """
+        players = store["players"]
+        speed, distance, _ = self.compute_speed_and_distance(players.frame, players.track_id,
+                                                             players.columns["position_transformed"], players.num_frames)
+        players.set_column("speed", speed)
+        players.set_column("distance", distance)
+
+    def start_stream(self):
+        """
+        Resets the online (frame by frame) estimation, see update_speed_and_distance.
+        """
+        self.stream_total_distance = {} # {track_id: cumulative distance}
+        self.stream_batch_start = None # first frame of the open batch
+        self.stream_start_positions = {} # {track_id: position} at the first frame of the open batch
+        self.stream_batch_frames = [] # (frame_num, frame dict) of the open batch
+
+    def update_speed_and_distance(self, frame_num, frame_tracks):
+        """
+        Online variant of add_speed_and_distance_to_tracks : feed the player dict of each frame as it
+        arrives. When a batch closes (every frame_window frames) its speed & distance are written into
+        the frame dicts of the batch, without recomputing any history.
+
+        Args:
+            frame_num (int): Index of the frame in the video.
+            frame_tracks (dict): {track_id: track_info} of the frame (with 'position_transformed').
+
+        Returns:
+            list: Frame numbers whose speed & distance have just been written.
+        """
+        if not hasattr(self, "stream_batch_frames"):
+            self.start_stream()
+
+        finished_frames = []
+        if self.stream_batch_start is not None and frame_num - self.stream_batch_start >= self.frame_window:
+            finished_frames = self._close_stream_batch(frame_num, frame_tracks)
+
+        if self.stream_batch_start is None: # this frame opens a new batch
+            self.stream_batch_start = frame_num
+            self.stream_start_positions = {track_id: track_info.get('position_transformed') for track_id, track_info in frame_tracks.items()}
+        self.stream_batch_frames.append((frame_num, frame_tracks))
+
+        return finished_frames
+
+    def finish_stream(self):
+        """
+        Closes the open batch with its last frame as end (like the last batch of a video) and
+        returns the frame numbers written.
+        """
+        if not getattr(self, "stream_batch_frames", None):
+            return []
+        last_frame, last_tracks = self.stream_batch_frames[-1]
+        self.stream_batch_frames = self.stream_batch_frames[:-1]
+        finished_frames = self._close_stream_batch(last_frame, last_tracks)
+        self.stream_batch_start = None
+        return finished_frames + [last_frame]
+
+    def _close_stream_batch(self, last_frame, last_tracks):
+        time_elapsed = (last_frame - self.stream_batch_start)/self.frame_rate
+        for track_id, start_position in self.stream_start_positions.items():
+            end_position = last_tracks[track_id].get('position_transformed') if track_id in last_tracks else None
+            if start_position is None or end_position is None or time_elapsed == 0:
+                continue
+
+            distance_covered = measure_distance(start_position, end_position)
+            speed_km_per_hour = distance_covered/time_elapsed*3.6
+            self.stream_total_distance[track_id] = self.stream_total_distance.get(track_id, 0) + distance_covered
+
+            for _, frame_tracks in self.stream_batch_frames:
+                if track_id in frame_tracks:
+                    frame_tracks[track_id]['speed'] = speed_km_per_hour
+                    frame_tracks[track_id]['distance'] = self.stream_total_distance[track_id]
+
+        finished_frames = [frame_num for frame_num, _ in self.stream_batch_frames]
+        self.stream_batch_frames = []
+        self.stream_batch_start = None
+        return finished_frames
     
     def draw_speed_and_distance(self,frames,tracks):
         """
@@ -100,6 +296,10 @@ class SpeedAndDistanceEstimator():
 
         # loop over all frames.
         for frame_num, frame in enumerate(frames):
+            # label offsets & font set on 1920x1080 frames
+            scale = scale_length(1.0, (frame.shape[1], frame.shape[0]))
+            offset, line_height = int(round(40*scale)), int(round(20*scale))
+            font_scale, thickness = 0.5*scale, max(1, int(round(2*scale)))
             # loop over all tracked objects
             for object, object_tracks in tracks.items():
                 # skipping since we're uninterested rn by ball & referee stats
@@ -119,11 +319,11 @@ class SpeedAndDistanceEstimator():
                        bbox = track_info['bbox']
                        position = get_foot_position(bbox)
                        position = list(position)
-                       position[1]+=40
+                       position[1]+=offset
 
                        position = tuple(map(int,position))
-                       cv2.putText(frame, f"{speed:.2f} km/h",position,cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,0,0),2)
-                       cv2.putText(frame, f"{distance:.2f} m",(position[0],position[1]+20),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,0,0),2)
+                       cv2.putText(frame, f"{speed:.2f} km/h",position,cv2.FONT_HERSHEY_SIMPLEX,font_scale,(0,0,0),thickness)
+                       cv2.putText(frame, f"{distance:.2f} m",(position[0],position[1]+line_height),cv2.FONT_HERSHEY_SIMPLEX,font_scale,(0,0,0),thickness)
             output_frames.append(frame)
         
         return output_frames
\ No newline at end of file
@@ -0,0 +1 @@
+from .stage_cache import StageCache
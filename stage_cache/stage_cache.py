@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+import numpy as np
+try:
+    import fcntl
+except ImportError: # not on Windows : the manifest isn't locked across processes there
+    fcntl = None
+
+class StageCache():
+    """
+    Content-addressed cache for stage results (tracks, camera movement, ...).
+
+    Entries are keyed by a hash of the input video, the model weights and the stage parameters, so a
+    result computed on another video, model or parameter set can never be reused by mistake. Each
+    entry is a directory of .npy arrays (loaded memory-mapped) covering a frame range, listed in a
+    JSON manifest with its size; the least recently used entries are evicted when the cache grows
+    over max_bytes. The manifest is only written by put() and evictions : the last access of an
+    entry is the modification time of its directory, so a hit never rewrites it.
+
+    Several processes can share a cache (e.g. the workers of a batch) : every read-modify-write of the
+    manifest holds an exclusive lock on manifest.lock, and entries are written in a temporary
+    directory renamed once complete.
+
+    Array naming : "<group>/<column>" arrays are rows of a group whose "<group>/frame" column holds the
+    (sorted) frame of each row, other arrays have one row per frame of the entry's range. This is what
+    lets get() serve any sub-range of a cached entry, or a range spanning adjacent entries (e.g. the
+    windows of a streamed run) put back together.
+
+    Attributes:
+        cache_dir (str): Directory of the cache.
+        max_bytes (int): Size limit of the cache.
+    """
+    def __init__(self, cache_dir='cache', max_bytes=4*1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.lock_path = os.path.join(cache_dir, 'manifest.lock')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"entries": {}, "file_hashes": {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    @contextmanager
+    def lock(self):
+        # exclusive lock of the manifest across processes, held while it's read, modified and saved
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save_manifest(self, manifest):
+        # write then rename : readers never see a half written manifest
+        tmp_path = self.manifest_path + f'.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def hash_file(self, path):
+        """
+        sha256 of a file (video or weights), memoized in the manifest by path, size and mtime.
+        Falls back to hashing the path itself when the file doesn't exist.
+        """
+        if path is None:
+            return None
+        if not os.path.exists(path):
+            return hashlib.sha256(str(path).encode()).hexdigest()
+
+        stat = os.stat(path)
+        file_id = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        manifest = self.load_manifest()
+        if file_id in manifest["file_hashes"]:
+            return manifest["file_hashes"][file_id]
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(8*1024*1024), b''):
+                sha.update(chunk)
+        file_hash = sha.hexdigest()
+
+        with self.lock():
+            manifest = self.load_manifest()
+            manifest["file_hashes"][file_id] = file_hash
+            self.save_manifest(manifest)
+        return file_hash
+
+    def make_key(self, stage, video_path, model_path=None, params=None):
+        """
+        Key of a stage result : hash of the stage name, video content, model weights and parameters.
+        """
+        key_content = {
+            "stage": stage,
+            "video": self.hash_file(video_path),
+            "model": self.hash_file(model_path),
+            "params": params or {}
+        }
+        return hashlib.sha256(json.dumps(key_content, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    def put(self, key, arrays, frame_range, stage=None):
+        """
+        Stores arrays for frames [frame_range[0], frame_range[1]) under key.
+
+        Args:
+            key (str): Key from make_key.
+            arrays (dict): Name -> np.ndarray (see the naming convention above).
+            frame_range (tuple): (start_frame, end_frame) covered by the arrays.
+            stage (str, optional): Stage name, informative only.
+        """
+        start_frame, end_frame = int(frame_range[0]), int(frame_range[1])
+        entry_id = f"{key}_{start_frame}_{end_frame}"
+        entry_dir = os.path.join(self.cache_dir, entry_id)
+        tmp_dir = os.path.join(self.cache_dir, f"{entry_id}.{os.getpid()}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        try:
+            names = []
+            number_of_bytes = 0
+            for i, (name, array) in enumerate(arrays.items()):
+                array = np.ascontiguousarray(array)
+                np.save(os.path.join(tmp_dir, f"{i}.npy"), array)
+                names.append(name)
+                number_of_bytes += array.nbytes
+
+            with self.lock():
+                # an older entry of the same range is replaced : renamed away first, its readers keep their memory maps
+                if os.path.exists(entry_dir):
+                    trash_dir = os.path.join(self.cache_dir, f"{entry_id}.{os.getpid()}.replaced.tmp")
+                    os.replace(entry_dir, trash_dir)
+                    shutil.rmtree(trash_dir, ignore_errors=True)
+                os.replace(tmp_dir, entry_dir)
+
+                manifest = self.load_manifest()
+                now = time.time()
+                manifest["entries"][entry_id] = {
+                    "key": key,
+                    "stage": stage,
+                    "frame_range": [start_frame, end_frame],
+                    "arrays": names,
+                    "bytes": number_of_bytes,
+                    "created": now,
+                    "last_access": now
+                }
+                self.evict(manifest, keep=entry_id)
+                self.save_manifest(manifest)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True) # left only when the write failed
+
+    def get_entries(self, manifest, key):
+        # entries of key, by start frame
+        entries = [(entry_id, entry) for entry_id, entry in manifest["entries"].items() if entry["key"] == key]
+        return sorted(entries, key=lambda item: tuple(item[1]["frame_range"]))
+
+    @staticmethod
+    def find_pieces(entries, start_frame, end_frame):
+        """
+        Entries covering [start_frame, end_frame) one after the other (the one reaching furthest at
+        each step).
+
+        Returns:
+            list or None: (entry_id, entry, piece_start, piece_end) of each piece, None when a frame isn't covered.
+        """
+        if start_frame == end_frame: # empty range : any entry around it
+            for entry_id, entry in entries:
+                if entry["frame_range"][0] <= start_frame <= entry["frame_range"][1]:
+                    return [(entry_id, entry, start_frame, end_frame)]
+            return None
+
+        pieces, frame = [], start_frame
+        while frame < end_frame:
+            covering = [(entry_id, entry) for entry_id, entry in entries if entry["frame_range"][0] <= frame < entry["frame_range"][1]]
+            if not covering:
+                return None
+            entry_id, entry = max(covering, key=lambda item: item[1]["frame_range"][1])
+            piece_end = min(end_frame, entry["frame_range"][1])
+            pieces.append((entry_id, entry, frame, piece_end))
+            frame = piece_end
+        return pieces
+
+    def covers(self, key, frame_range):
+        # True when get(key, frame_range) can be served (from the manifest only, nothing is loaded)
+        return self.find_pieces(self.get_entries(self.load_manifest(), key), int(frame_range[0]), int(frame_range[1])) is not None
+
+    def get(self, key, frame_range=None):
+        """
+        Loads the arrays of key for frame_range : memory-mapped and sliced from the entry covering it,
+        or concatenated from adjacent entries covering it together.
+
+        Args:
+            key (str): Key from make_key.
+            frame_range (tuple, optional): (start_frame, end_frame) wanted, the whole (first) entry if None.
+
+        Returns:
+            dict or None: Name -> array, None on a cache miss.
+        """
+        entries = self.get_entries(self.load_manifest(), key)
+        if not entries:
+            return None
+        start_frame, end_frame = frame_range if frame_range is not None else entries[0][1]["frame_range"]
+        pieces = self.find_pieces(entries, int(start_frame), int(end_frame))
+        if pieces is None:
+            return None
+
+        sliced_pieces = []
+        for entry_id, entry, piece_start, piece_end in pieces:
+            entry_dir = os.path.join(self.cache_dir, entry_id)
+            try:
+                arrays = {name: np.load(os.path.join(entry_dir, f"{i}.npy"), mmap_mode='r') for i, name in enumerate(entry["arrays"])}
+                os.utime(entry_dir) # last access, for the LRU eviction
+            except (OSError, ValueError): # entry removed by another process
+                return None
+            sliced_pieces.append(self.slice_arrays(arrays, entry["frame_range"][0], piece_start, piece_end))
+
+        if len(sliced_pieces) == 1:
+            return sliced_pieces[0]
+        if any(piece.keys() != sliced_pieces[0].keys() for piece in sliced_pieces):
+            return None # adjacent entries of different layouts
+        return {name: np.concatenate([piece[name] for piece in sliced_pieces]) for name in sliced_pieces[0]}
+
+    def get_last_access(self, entry_id, entry):
+        try:
+            return os.path.getmtime(os.path.join(self.cache_dir, entry_id))
+        except OSError:
+            return entry["last_access"]
+
+    @staticmethod
+    def slice_arrays(arrays, entry_start, start_frame, end_frame):
+        # rows of each group whose frame is in range, and the per-frame arrays of the range
+        row_slices = {}
+        for name, array in arrays.items():
+            if name.endswith('/frame'):
+                row_slices[name.rsplit('/',1)[0]] = slice(*np.searchsorted(array, [start_frame, end_frame]))
+
+        sliced = {}
+        for name, array in arrays.items():
+            group = name.rsplit('/',1)[0] if '/' in name else None
+            if group in row_slices:
+                sliced[name] = array[row_slices[group]]
+            else:
+                sliced[name] = array[start_frame-entry_start:end_frame-entry_start]
+        return sliced
+
+    def evict(self, manifest, keep=None):
+        # least recently used entries removed until the cache fits in max_bytes (manifest lock held)
+        total_bytes = sum(entry["bytes"] for entry in manifest["entries"].values())
+        for entry_id, entry in sorted(manifest["entries"].items(), key=lambda item: self.get_last_access(*item)):
+            if total_bytes <= self.max_bytes:
+                break
+            if entry_id == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, entry_id), ignore_errors=True)
+            del manifest["entries"][entry_id]
+            total_bytes -= entry["bytes"]
+
+    def clear(self):
+        with self.lock():
+            manifest = self.load_manifest()
+            for entry_id in list(manifest["entries"]):
+                shutil.rmtree(os.path.join(self.cache_dir, entry_id), ignore_errors=True)
+            manifest["entries"] = {}
+            self.save_manifest(manifest)
@@ -0,0 +1,70 @@
+import numpy as np
+
+def batch_player_colors(images, max_iter=10):
+    """
+    Dominant kit color of many player crops at once.
+
+    Runs the same 2-cluster k-means as TeamAssigner.get_player_color on every image, but all the
+    pixels are stacked in one array and the Lloyd iterations of every image run together
+    (segment sums with np.bincount), instead of fitting one sklearn KMeans per crop.
+    Each image is initialised with its top-left pixel (background) and the mean of the pixels
+    farthest from it.
+
+    Args:
+        images (list): Top-half crops (H x W x 3 arrays), one per player.
+        max_iter (int): Maximum number of Lloyd iterations.
+
+    Returns:
+        np.ndarray: N x 3 array of player colors (zeros for empty crops).
+    """
+    number_of_images = len(images)
+    player_colors = np.zeros((number_of_images,3))
+    images = [(i, image) for i, image in enumerate(images) if image.shape[0] > 0 and image.shape[1] > 0]
+    if not images:
+        return player_colors
+
+    image_indices = np.array([i for i, _ in images])
+    heights = np.array([image.shape[0] for _, image in images])
+    widths = np.array([image.shape[1] for _, image in images])
+    sizes = heights*widths
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]) # first pixel of each image
+
+    pixels = np.concatenate([image.reshape(-1,3) for _, image in images]).astype(np.float64)
+    segment = np.repeat(np.arange(len(images)), sizes) # image of each pixel
+    number_of_segments = len(images)
+
+    # init : top-left pixel & the mean of the quarter of pixels farthest from it (a single farthest
+    # pixel would be an outlier such as a pitch line mark rather than the kit)
+    centers = np.empty((number_of_segments,2,3))
+    centers[:,0] = pixels[offsets]
+    distance = ((pixels - centers[segment,0])**2).sum(axis=1)
+    farthest = np.lexsort((-distance, segment)) # sorted by image then decreasing distance
+    rank = np.arange(len(pixels)) - offsets[segment] # rank of farthest[i] in its image (same segment layout)
+    far_pixels = farthest[rank < np.maximum(sizes//4, 1)[segment]]
+    far_counts = np.bincount(segment[far_pixels], minlength=number_of_segments)
+    for channel in range(3):
+        centers[:,1,channel] = np.bincount(segment[far_pixels], weights=pixels[far_pixels,channel], minlength=number_of_segments) / far_counts
+
+    labels = None
+    for _ in range(max_iter):
+        distance_0 = ((pixels - centers[segment,0])**2).sum(axis=1)
+        distance_1 = ((pixels - centers[segment,1])**2).sum(axis=1)
+        new_labels = (distance_1 < distance_0).astype(np.int64)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        # new centers : mean of the pixels of each (image, cluster)
+        cluster = segment*2 + labels
+        counts = np.bincount(cluster, minlength=number_of_segments*2).reshape(-1,2)
+        for channel in range(3):
+            sums = np.bincount(cluster, weights=pixels[:,channel], minlength=number_of_segments*2).reshape(-1,2)
+            centers[:,:,channel] = np.where(counts > 0, sums / np.maximum(counts,1), centers[:,:,channel]) # empty cluster keeps its center
+
+    # the cluster of the corners is the background, like get_player_color (ties -> cluster 0)
+    corners = np.stack([offsets, offsets+widths-1, offsets+(heights-1)*widths, offsets+sizes-1], axis=1)
+    non_player_cluster = (labels[corners].sum(axis=1) >= 3).astype(np.int64)
+    player_cluster = 1 - non_player_cluster
+
+    player_colors[image_indices] = centers[np.arange(number_of_segments), player_cluster]
+    return player_colors
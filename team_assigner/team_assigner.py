@@ -1,5 +1,9 @@
 from sklearn.cluster import KMeans
 import numpy as np 
+from .color_engine import batch_player_colors
+import sys
+sys.path.append('../')
+from instrumentation import metrics
 
 class TeamAssigner:
     def __init__(self):
@@ -22,7 +26,9 @@ class TeamAssigner:
         top_half_img = image[0:int(image.shape[0]/2),:]  # kit color can be extracted from tshirt only
         
         # clustering
-        k_means = self.get_clustering_model(top_half_img) 
+        with metrics.timer("player_color_seconds", method="kmeans"):
+            k_means = self.get_clustering_model(top_half_img) 
+        metrics.inc("player_color_crops_total", method="kmeans")
 
         # get cluster labels
         labels = k_means.labels_
@@ -44,13 +50,28 @@ class TeamAssigner:
         return player_color
     
 
+    def get_player_colors(self, frame, bboxes):
+        """
+        Batched get_player_color : dominant kit color of every bbox of a frame in one
+        batch_player_colors call.
+
+        Returns:
+            np.ndarray: N x 3 array of player colors.
+        """
+        top_half_images = []
+        for bbox in bboxes:
+            x1, y1, x2, y2 = (max(0,int(v)) for v in bbox)
+            image = frame[y1:y2, x1:x2]
+            top_half_images.append(image[0:int(image.shape[0]/2),:]) # kit color can be extracted from tshirt only
+        with metrics.timer("player_color_seconds", method="batch"):
+            player_colors = batch_player_colors(top_half_images)
+        metrics.inc("player_color_crops_total", len(top_half_images), method="batch")
+        return player_colors
+
     def assign_team_color(self, frame, player_detections):
-        player_colors = []
-        for _, player_detections in player_detections.items():
-            bbox = player_detections["bbox"]
-            # dominant kit color 
-            player_color = self.get_player_color(frame, bbox)
-            player_colors.append(player_color)
+        bboxes = [player_detection["bbox"] for player_detection in player_detections.values()]
+        # dominant kit color of every player in one batch
+        player_colors = self.get_player_colors(frame, bboxes)
         
         kmeans= KMeans(n_clusters=2, init="k-means++",n_init=1)
         kmeans.fit(player_colors)
@@ -75,3 +96,27 @@ class TeamAssigner:
         self.player_team_dict[player_id] = team_id
         
         return team_id
+
+    def get_player_teams(self, frame, player_detections):
+        """
+        Batched get_player_team for all the players of a frame : the colors of the player IDs not
+        seen before are extracted together and classified with one kmeans.predict call.
+
+        Args:
+            frame (np.ndarray): The video frame.
+            player_detections (dict): {player_id: {"bbox": [...]}} of the frame.
+
+        Returns:
+            dict: {player_id: team_id}
+        """
+        new_player_ids = [player_id for player_id in player_detections if player_id not in self.player_team_dict]
+        if new_player_ids:
+            player_colors = self.get_player_colors(frame, [player_detections[player_id]["bbox"] for player_id in new_player_ids])
+            team_ids = self.kmeans.predict(player_colors) + 1 # ( team 1 or team 2)
+
+            for player_id, team_id in zip(new_player_ids, team_ids):
+                if player_id == 91: # goalkeeper id of team 1
+                    team_id = 2
+                self.player_team_dict[player_id] = int(team_id)
+
+        return {player_id: self.player_team_dict[player_id] for player_id in player_detections}
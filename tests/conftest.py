@@ -0,0 +1,4 @@
+# tests run from any directory : the packages are imported from the root of the repository
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,13 @@
+from benchmarks import SyntheticMatch
+from camera_estimator import CameraMovementEstimator
+
+def test_parallel_camera_movement_matches_the_sequential_one():
+    frames = SyntheticMatch(120).frames
+    estimator = CameraMovementEstimator(frames[0], fast=True)
+    estimator.reset_stream()
+    reference = estimator.get_camera_movement_window(frames)
+    # several chunk borders, some of them in the middle of a still camera (repaired chunks)
+    for chunk_size, max_in_flight in ((25, None), (7, 2)):
+        parallel = CameraMovementEstimator(frames[0], fast=True).get_camera_movement_parallel(
+            frames, num_workers=2, chunk_size=chunk_size, max_in_flight=max_in_flight)
+        assert CameraMovementEstimator.compare_camera_movement(reference, parallel, tolerance=0) == (True, 0.0)
@@ -0,0 +1,22 @@
+import json
+from benchmarks import SyntheticMatch
+from event_bus import FramePublisher, FileEventSink
+from player_ball_assignment import PossessionEngine
+
+def test_published_frames_carry_the_ball(tmp_path):
+    match = SyntheticMatch(96)
+    tracks = match.tracks_after("possession")
+    possession = PossessionEngine().assign_tracks(match.tracks_after("teams"))
+    path = str(tmp_path / "frames.jsonl")
+    publisher = FramePublisher(FileEventSink(path), match_id="test", fps=25, drop_when_full=False)
+    publisher.publish_window(tracks, possession, start_frame=100)
+    publisher.close()
+
+    with open(path) as f:
+        messages = [json.loads(line) for line in f]
+    assert [message["f"] for message in messages] == list(range(100, 196))
+    assert messages[-1]["t"] == round(195 / 25, 3) # match time at the fps of the video
+    for message, ball in zip(messages, tracks["ball"]):
+        position = ball[1].get("position_transformed") if 1 in ball else None
+        assert (message["b"] is None) == (position is None)
+    assert any(message["b"] is not None for message in messages)
@@ -0,0 +1,70 @@
+import os
+import cv2
+import numpy as np
+from frame_cache import FrameCache, CachedVideo
+from utils import read_video, read_video_windows
+
+def write_clip(path, number_of_frames=30, size=(64, 48), seed=0):
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 24, size)
+    for _ in range(number_of_frames):
+        writer.write(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+def no_decoder(video_path):
+    raise AssertionError("the decoder ran on a cached video")
+
+def test_decoded_once_then_served_from_the_cache(tmp_path, monkeypatch):
+    video_path = write_clip(tmp_path / "clip.avi")
+    cache = FrameCache(str(tmp_path / "frames"))
+    reference = read_video(video_path)
+
+    video = cache.read_video(video_path) # miss : decoded into the cache
+    assert isinstance(video, CachedVideo) and len(video) == len(reference) == 30
+    monkeypatch.setattr(FrameCache, "decode", staticmethod(no_decoder))
+
+    video = cache.read_video(video_path)
+    for frame, reference_frame in zip(video, reference):
+        np.testing.assert_array_equal(frame, reference_frame)
+    assert not video[3].flags.writeable and isinstance(video[2:5], list)
+    np.testing.assert_array_equal(video[17], reference[17]) # random access
+    windows = list(cache.read_windows(video_path, 8))
+    assert [(start, len(frames)) for start, frames in windows] == [(start, len(frames)) for start, frames in read_video_windows(video_path, 8)]
+    assert video.fps == 24 and video.frame_size == (64, 48)
+
+def test_streamed_frames_are_recorded(tmp_path):
+    video_path = write_clip(tmp_path / "clip.avi")
+    cache = FrameCache(str(tmp_path / "frames"))
+    # stopped early : no partial entry
+    for frame_num, _ in enumerate(cache.iter_frames(video_path)):
+        if frame_num == 5:
+            break
+    assert cache.open(video_path) is None and cache.get_entries() == []
+
+    frames = [frame.copy() for frame in cache.iter_frames(video_path)]
+    assert len(frames) == 30 and cache.open(video_path) is not None
+    np.testing.assert_array_equal(np.stack(frames), np.stack(list(cache.iter_frames(video_path))))
+
+def test_size_limit_and_lru_eviction(tmp_path):
+    video_bytes = 30 * 64 * 48 * 3
+    paths = [write_clip(tmp_path / f"clip{i}.avi", seed=i) for i in range(3)]
+    cache = FrameCache(str(tmp_path / "frames"), max_bytes=2*video_bytes)
+
+    cache.read_video(paths[0])
+    cache.read_video(paths[1])
+    os.utime(os.path.join(cache.cache_dir, cache.get_key(paths[1]), "frames.raw"), (1, 1)) # clip1 least recently used
+    cache.read_video(paths[2])
+    assert cache.open(paths[1]) is None
+    assert cache.open(paths[0]) is not None and cache.open(paths[2]) is not None
+    assert sum(number_of_bytes for _, number_of_bytes, _ in cache.get_entries()) <= cache.max_bytes
+
+    # over the limit : decoded, not cached
+    small_cache = FrameCache(str(tmp_path / "small"), max_bytes=video_bytes // 2)
+    frames = small_cache.read_video(paths[0])
+    assert isinstance(frames, list) and len(frames) == 30 and small_cache.get_entries() == []
+
+    # a modified video is a new entry
+    write_clip(paths[0], number_of_frames=10)
+    os.utime(paths[0], ns=(0, 12345))
+    assert cache.open(paths[0]) is None and len(cache.read_video(paths[0])) == 10
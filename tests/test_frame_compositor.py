@@ -0,0 +1,22 @@
+import numpy as np
+from benchmarks import SyntheticMatch
+from benchmarks.parity import check_frame_compositor
+from tracking import Tracker
+
+def test_compositor_matches_the_drawing_stages_at_any_resolution():
+    for width, height in ((1920, 1080), (960, 540)):
+        max_error, tolerance = check_frame_compositor(SyntheticMatch(6, width=width, height=height))
+        assert max_error <= tolerance
+
+def test_overlays_scale_with_the_resolution():
+    # ID tag & ball triangle of a half resolution frame cover about a quarter of the pixels
+    def drawn_pixels(width, height):
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        scale = width / 1920
+        bbox = [800*scale, 400*scale, 840*scale, 480*scale]
+        Tracker(None).draw_ellipse(frame, bbox, (255,255,255), track_id=7)
+        Tracker(None).draw_triangle(frame, bbox, (255,255,255))
+        return np.count_nonzero(frame.any(axis=2))
+
+    ratio = drawn_pixels(960, 540) / drawn_pixels(1920, 1080)
+    assert 0.15 < ratio < 0.35
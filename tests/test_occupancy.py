@@ -0,0 +1,90 @@
+import numpy as np
+from benchmarks import SyntheticMatch
+from player_ball_assignment import PossessionEngine
+from pitch_occupancy import OccupancyEngine, encode_grid, decode_grid
+from track_store import TrackStore
+
+def reference_grids(tracks, possession, engine):
+    # per point histograms (np.histogram2d per player / team / phase)
+    points = {}
+    for frame_num, player_track in enumerate(tracks["players"]):
+        for player_id, player in player_track.items():
+            if player.get("position_transformed") is None:
+                continue
+            team, possession_team = player["team"], int(possession["team"][frame_num])
+            keys = [("player", player_id), ("team", team)]
+            if possession_team != 0:
+                keys.append(("phase", (team, "in_possession" if possession_team == team else "out_of_possession")))
+            for key in keys:
+                points.setdefault(key, []).append(player["position_transformed"])
+
+    rows, columns = engine.grid_shape
+    grids = {}
+    for key, key_points in points.items():
+        key_points = np.array(key_points)
+        grid, _, _ = np.histogram2d(np.clip(np.floor(key_points[:,1] / engine.cell_size), 0, rows-1),
+                                    np.clip(np.floor(key_points[:,0] / engine.cell_size), 0, columns-1),
+                                    bins=(rows, columns), range=((0, rows), (0, columns)))
+        grids[key] = grid.astype(np.int64)
+    return grids
+
+def test_grids_match_per_point_histograms():
+    match = SyntheticMatch(96)
+    tracks = match.tracks_after("teams")
+    possession = PossessionEngine().assign_tracks(tracks)
+    engine = OccupancyEngine(cell_size=2.0)
+    engine.update_window(tracks, possession)
+
+    reference = reference_grids(tracks, possession, engine)
+    assert len(reference) > 4
+    for (kind, key), grid in reference.items():
+        np.testing.assert_array_equal(engine.get_grid(kind, key), grid)
+    assert engine.frames == 96
+
+def test_windows_frames_and_store_give_the_same_grids():
+    match = SyntheticMatch(120)
+    tracks = match.tracks_after("teams")
+    possession = PossessionEngine().assign_tracks(tracks)
+
+    whole = OccupancyEngine()
+    whole.update_store(TrackStore.from_tracks(tracks), possession)
+
+    windowed = OccupancyEngine()
+    for start in range(0, 120, 50):
+        windowed.update_window({"players": tracks["players"][start:start+50]},
+                               {"team": possession["team"][start:start+50]})
+
+    framed = OccupancyEngine()
+    for frame_num, player_track in enumerate(tracks["players"]):
+        framed.update_frame(player_track, int(possession["team"][frame_num]))
+
+    for engine in (windowed, framed):
+        assert engine.frames == whole.frames == 120
+        assert engine.to_dict() == whole.to_dict()
+
+def test_serialized_grids_round_trip():
+    grid = np.zeros((68, 24), dtype=np.int64)
+    grid[10, 5] = 70000 # over uint16
+    grid[3, 2] = 7
+    encoded = encode_grid(grid)
+    assert encoded["dtype"] == "uint32"
+    np.testing.assert_array_equal(decode_grid(encoded), grid)
+    assert encode_grid(np.ones((68, 24)))["dtype"] == "uint8"
+
+def test_full_match_in_one_update():
+    # 90 minutes at 25 fps, 22 players : ~3M points
+    rng = np.random.default_rng(0)
+    number_of_frames, number_of_players = 90*60*25, 22
+    frames = np.repeat(np.arange(number_of_frames), number_of_players)
+    track_ids = np.tile(np.arange(1, number_of_players+1), number_of_frames)
+    positions = rng.uniform((0, 0), (23.32, 68), size=(len(frames), 2))
+    positions[::50] = np.nan # outside the court
+    teams = 1 + track_ids % 2
+    possession_teams = rng.integers(0, 3, number_of_frames)
+
+    engine = OccupancyEngine()
+    engine.update_arrays(frames, track_ids, positions, teams, possession_teams)
+    counted = len(frames) - len(positions[::50])
+    assert engine.player_grids.sum() == counted
+    assert sum(grid.sum() for grid in engine.team_grids.values()) == counted
+    assert sum(grid.sum() for grid in engine.phase_grids.values()) == (possession_teams[frames] != 0)[~np.isnan(positions[:,0])].sum()
@@ -0,0 +1,6 @@
+from benchmarks import SyntheticMatch, run_parity_checks
+
+def test_fast_paths_match_their_references():
+    # same gate as the benchmark suite, on a match length that isn't a multiple of the speed batches
+    results = run_parity_checks(SyntheticMatch(61), with_frames=False, log=lambda line: None)
+    assert {name: result for name, result in results.items() if not result["passed"]} == {}
@@ -0,0 +1,90 @@
+import numpy as np
+from benchmarks import SyntheticMatch
+from benchmarks.parity import check_possession, scan_ball_possessor
+from player_ball_assignment import PlayerBallAssigner, PossessionEngine
+from spatial_index import SpatialIndex, nearest_opponent, players_within, pressure_on_ball_carrier, passing_lane_obstruction
+
+def random_players(number_of_frames=50, number_of_players=22, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = np.repeat(np.arange(number_of_frames), number_of_players)
+    points = rng.uniform((0, 0), (23.32, 68), size=(len(frames), 2))
+    points[::17] = np.nan # outside the court
+    teams = 1 + np.tile(np.arange(number_of_players), number_of_frames) % 2
+    return frames, points, teams
+
+def brute_force(frames, points, teams, query_frames, query_points):
+    # distance of every point to every query, inf across frames / for missing points
+    distances = np.hypot(points[None,:,0] - query_points[:,None,0], points[None,:,1] - query_points[:,None,1])
+    distances[query_frames[:,None] != frames[None,:]] = np.inf
+    return np.where(np.isnan(distances), np.inf, distances)
+
+def test_radius_and_knn_match_brute_force():
+    frames, points, teams = random_players()
+    index = SpatialIndex(cell_size=4.0).build(frames, points, teams)
+    rng = np.random.default_rng(1)
+    query_frames = rng.integers(0, 50, 300)
+    query_points = rng.uniform((-5, -5), (30, 75), size=(300, 2))
+    distances = brute_force(frames, points, teams, query_frames, query_points)
+
+    # radius, with and without a team filter
+    for team in (None, 2):
+        queries, rows, found = index.radius_query(query_frames, query_points, 7.5, team=team)
+        expected = distances <= 7.5
+        if team is not None:
+            expected &= (teams == team)[None,:]
+        assert sorted(zip(queries.tolist(), rows.tolist())) == sorted(zip(*np.nonzero(expected)))
+        np.testing.assert_array_equal(found, distances[queries, rows])
+    np.testing.assert_array_equal(index.count_within(query_frames, query_points, 7.5), (distances <= 7.5).sum(axis=1))
+
+    # k nearest over the whole frame and within a radius
+    rows, found = index.knn(query_frames, query_points, k=3)
+    np.testing.assert_array_equal(found, np.sort(distances, axis=1)[:,:3])
+    rows, found = index.knn(query_frames, query_points, k=3, max_radius=5.0)
+    expected = np.sort(distances, axis=1)[:,:3]
+    np.testing.assert_array_equal(found, np.where(expected <= 5.0, expected, np.inf))
+    assert ((rows >= 0) == np.isfinite(found)).all()
+
+def test_tactical_metrics_match_brute_force():
+    frames, points, teams = random_players(number_of_frames=20)
+    index = SpatialIndex(cell_size=5.0).build(frames, points, teams)
+    distances = brute_force(frames, points, teams, frames, points)
+    opponents = teams[None,:] != teams[:,None]
+
+    rows, found = nearest_opponent(index)
+    np.testing.assert_array_equal(found, np.where(opponents, distances, np.inf).min(axis=1))
+    present = np.isfinite(found)
+    assert (teams[rows[present]] != teams[present]).all()
+
+    all_rows = np.flatnonzero(~np.isnan(points[:,0]))
+    expected = ((distances <= 6.0) & ~np.eye(len(points), dtype=bool)).sum(axis=1)[all_rows]
+    np.testing.assert_array_equal(players_within(index, all_rows, 6.0), expected)
+
+    carriers = np.array([frame_rows[~np.isnan(points[frame_rows,0])][0] for frame_rows in np.split(np.arange(len(frames)), 20)])
+    carriers[3] = -1 # nobody has the ball
+    pressure, closest = pressure_on_ball_carrier(index, carriers, radius=8.0)
+    for frame_num, carrier in enumerate(carriers):
+        opponent_distances = distances[carrier][opponents[carrier]] if carrier >= 0 else np.array([])
+        assert pressure[frame_num] == (opponent_distances <= 8.0).sum()
+        assert closest[frame_num] == np.where(opponent_distances <= 8.0, opponent_distances, np.inf).min(initial=np.inf)
+
+def test_passing_lanes():
+    # carrier at (0, 0), teammates at (10, 0) and (0, 10), one opponent on the first lane, one beside it
+    frames = np.zeros(5, dtype=np.int64)
+    points = np.array([[0, 0], [10, 0], [0, 10], [5, 1], [5, 6]], dtype=np.float64)
+    teams = np.array([1, 1, 1, 2, 2])
+    index = SpatialIndex(cell_size=2.0).build(frames, points, teams)
+    carriers, teammates, blocking = passing_lane_obstruction(index, [0], lane_width=2.0)
+    assert dict(zip(teammates.tolist(), blocking.tolist())) == {1: 1, 2: 0}
+    assert (carriers == 0).all()
+
+def test_possession_on_the_index_matches_the_linear_scan():
+    match = SyntheticMatch(240)
+    assert check_possession(match) == (0.0, 0.0)
+
+    # ties and empty frames : first player of the dict wins, like the scan
+    players = {7: {"bbox": [100, 100, 120, 200]}, 3: {"bbox": [140, 100, 160, 200]}}
+    ball_bbox = [126, 196, 134, 204] # center (130, 200), 10 px from both players
+    assert PlayerBallAssigner().assign_ball_to_player(players, ball_bbox) == scan_ball_possessor(players, ball_bbox) == 7
+    assert PlayerBallAssigner().assign_ball_to_player({}, ball_bbox) == -1
+    possession = PossessionEngine().assign([0, 0], [7, 3], [players[7]["bbox"], players[3]["bbox"]], [[130, 200], [np.nan, np.nan]])
+    assert possession["player"].tolist() == [7, -1]
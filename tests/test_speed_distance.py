@@ -0,0 +1,30 @@
+from benchmarks import SyntheticMatch
+from benchmarks.parity import add_speed_windows, column_of, max_difference
+from speed_distance_estimator import SpeedAndDistanceEstimator
+
+def test_windowed_speed_matches_the_whole_match():
+    match = SyntheticMatch(250)
+    reference = match.tracks_after("speed_distance")
+    for window_sizes in ((7,), (12, 1, 30), (250,), (120,)):
+        tracks = match.tracks_after("ball_interpolation")
+        add_speed_windows(SpeedAndDistanceEstimator(), tracks, window_sizes)
+        assert max_difference(column_of(reference, "players", "speed", 1), column_of(tracks, "players", "speed", 1)) == 0
+        # running totals restart from the carried total of each window : only the rounding of the sum differs
+        assert max_difference(column_of(reference, "players", "distance", 1), column_of(tracks, "players", "distance", 1)) < 1e-9
+
+    # the last frames of a 120 frames window get the speed of their batch, which ends in the next window
+    for frame_num in range(115, 120):
+        assert any("speed" in player for player in tracks["players"][frame_num].values())
+        assert all(player["speed"] == reference["players"][frame_num][player_id]["speed"]
+                   for player_id, player in tracks["players"][frame_num].items()
+                   if "speed" in reference["players"][frame_num].get(player_id, {}))
+
+def test_window_returns_the_finished_frames():
+    tracks = SyntheticMatch(30).tracks_after("ball_interpolation")
+    estimator = SpeedAndDistanceEstimator()
+    estimator.start_windows()
+    window = lambda start, end: {object: object_tracks[start:end] for object, object_tracks in tracks.items()}
+    assert estimator.add_speed_and_distance_to_window(window(0, 12)) == 10 # batch 10-15 still open
+    assert estimator.add_speed_and_distance_to_window(window(12, 13)) == 10
+    assert estimator.add_speed_and_distance_to_window(window(13, 17)) == 15
+    assert estimator.add_speed_and_distance_to_window(window(17, 30), final=True) == 30
@@ -0,0 +1,52 @@
+import multiprocessing
+import os
+import numpy as np
+from stage_cache import StageCache
+
+def window_arrays(start_frame, end_frame):
+    # two rows per frame in the "detections" group, one value per frame
+    frames = np.repeat(np.arange(start_frame, end_frame), 2)
+    return {"detections/frame": frames, "detections/xyxy": np.stack([frames]*4, axis=1).astype(np.float32),
+            "movement": np.arange(start_frame, end_frame, dtype=np.float64)}
+
+def test_a_hit_never_rewrites_the_manifest(tmp_path):
+    cache = StageCache(str(tmp_path))
+    cache.put("key", window_arrays(0, 10), (0, 10))
+    with open(cache.manifest_path) as f:
+        manifest = f.read()
+    os.utime(cache.manifest_path, (0, 0))
+
+    assert cache.get("key", (2, 5)) is not None
+    assert os.path.getmtime(cache.manifest_path) == 0
+    with open(cache.manifest_path) as f:
+        assert f.read() == manifest
+
+def test_adjacent_entries_are_put_back_together(tmp_path):
+    cache = StageCache(str(tmp_path))
+    for start_frame, end_frame in ((0, 7), (7, 14), (14, 20)):
+        cache.put("key", window_arrays(start_frame, end_frame), (start_frame, end_frame))
+    reference = window_arrays(3, 17)
+
+    assert cache.covers("key", (3, 17)) and cache.covers("key", (0, 20))
+    arrays = cache.get("key", (3, 17))
+    for name, array in reference.items():
+        np.testing.assert_array_equal(arrays[name], array)
+    assert not cache.covers("key", (15, 21)) and cache.get("key", (15, 21)) is None
+    assert cache.get("other", (0, 5)) is None
+
+def put_windows(cache_dir, first_window):
+    cache = StageCache(cache_dir)
+    for start_frame in range(first_window*5, 100, 20):
+        cache.put("key", window_arrays(start_frame, start_frame+5), (start_frame, start_frame+5))
+
+def test_concurrent_puts_keep_every_entry(tmp_path):
+    # 4 processes putting interleaved windows : no entry lost to a concurrent manifest write
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=put_windows, args=(str(tmp_path), first_window)) for first_window in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    cache = StageCache(str(tmp_path))
+    assert len(cache.load_manifest()["entries"]) == 20 and cache.covers("key", (0, 100))
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path))
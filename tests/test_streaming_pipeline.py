@@ -0,0 +1,52 @@
+from benchmarks import SyntheticMatch
+from benchmarks.parity import column_of, max_difference
+from camera_estimator import CameraMovementEstimator
+from pipeline import StreamingPipeline
+from tracking import Tracker, BallInterpolator
+
+def stream_tracks(match, window_size, max_gap=48):
+    # look-ahead stages of the pipeline on windows of the synthetic tracks : ready frames put back together
+    pipeline = StreamingPipeline(None, window_size=window_size, tracker=Tracker(None))
+    pipeline.camera_movement_estimator = CameraMovementEstimator(match.blank_frame())
+    pipeline.ball_interpolator = BallInterpolator(max_gap)
+    tracks = match.tracks_after("view_transform")
+    streamed = {"players": [], "referees": [], "ball": []}
+
+    def take_ready():
+        start_frame, frames, ready_tracks, _ = pipeline.pop_ready()
+        assert start_frame == len(streamed["players"])
+        for object, object_tracks in ready_tracks.items():
+            streamed[object] += object_tracks
+
+    for start_frame in range(0, match.num_frames, window_size):
+        end_frame = min(start_frame + window_size, match.num_frames)
+        window = {object: object_tracks[start_frame:end_frame] for object, object_tracks in tracks.items()}
+        pipeline.add_window(start_frame, [None]*(end_frame-start_frame), window, match.camera_movement[start_frame:end_frame])
+        take_ready()
+    pipeline.flush_windows()
+    take_ready()
+    return streamed
+
+def test_streamed_speed_matches_the_whole_match():
+    match = SyntheticMatch(250)
+    reference = match.tracks_after("speed_distance")
+    for window_size in (7, 12, 120, 250):
+        streamed = stream_tracks(match, window_size)
+        assert len(streamed["players"]) == match.num_frames
+        assert max_difference(column_of(reference, "players", "speed", 1), column_of(streamed, "players", "speed", 1)) == 0
+        assert max_difference(column_of(reference, "players", "distance", 1), column_of(streamed, "players", "distance", 1)) < 1e-9
+
+def test_streamed_ball_matches_the_whole_match_interpolation():
+    match = SyntheticMatch(250)
+    reference = Tracker(None).interpolate_ball_positions(match.tracks_after(None)["ball"])
+    for window_size in (7, 120):
+        # gaps spanning windows are interpolated once the next detection comes
+        streamed = stream_tracks(match, window_size, max_gap=match.num_frames)
+        assert [ball[1]["bbox"] for ball in streamed["ball"]] == [ball[1]["bbox"] for ball in reference]
+
+def test_streamed_ball_has_its_pitch_position():
+    match = SyntheticMatch(250)
+    reference = match.tracks_after("ball_interpolation")
+    streamed = stream_tracks(match, 12)
+    assert all("position_transformed" in ball[1] for ball in streamed["ball"])
+    assert max_difference(column_of(reference, "ball", "position_transformed"), column_of(streamed, "ball", "position_transformed")) < 1e-3
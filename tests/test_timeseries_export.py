@@ -0,0 +1,16 @@
+from benchmarks import SyntheticMatch
+from player_ball_assignment import PossessionEngine
+from timeseries_export import MatchMetricsExporter
+
+def test_ball_points_are_exported():
+    # interpolated balls get their pitch position again : every frame with the ball in the court has a point
+    match = SyntheticMatch(96)
+    tracks = match.tracks_after("possession")
+    possession = PossessionEngine().assign_tracks(match.tracks_after("teams"))
+    exporter = MatchMetricsExporter([], fps=25, start_time=0)
+    lines = list(exporter.iter_window_lines(tracks, possession, match.camera_movement))
+
+    ball_lines = [line for line in lines if line.startswith("ball,")]
+    in_court = [ball[1].get("position_transformed") is not None for ball in tracks["ball"] if 1 in ball]
+    assert len(ball_lines) == sum(in_court) > 0
+    assert lines[-1].endswith(f" {int(round(95 * 1e9 / 25))}") # timestamps at the fps of the video
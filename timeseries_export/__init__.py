@@ -0,0 +1,6 @@
+# Exposing
+
+
+from .line_protocol import format_point
+from .sinks import LineProtocolFileSink, HttpLineProtocolSink
+from .match_exporter import MatchMetricsExporter
@@ -0,0 +1,47 @@
+import math
+
+# InfluxDB line protocol : measurement,tag=value field=value timestamp
+# https://docs.influxdata.com/influxdb/v2/reference/syntax/line-protocol/
+
+def escape_key(key):
+    # measurement names, tag keys/values and field keys : commas, equal signs and spaces are escaped
+    return str(key).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+def format_field_value(value):
+    # None for a value that can't be written (missing / NaN / inf)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    if value is None:
+        return None
+    value = float(value)
+    if math.isnan(value) or math.isinf(value):
+        return None
+    return repr(value)
+
+def format_point(measurement, tags, fields, timestamp_ns):
+    """
+    Formats one point in line protocol.
+
+    Args:
+        measurement (str): Measurement name.
+        tags (dict): Tag key -> value (indexed, e.g. the match & player IDs).
+        fields (dict): Field key -> value (int, float, bool or str, missing values are skipped).
+        timestamp_ns (int): Timestamp in nanoseconds since the epoch.
+
+    Returns:
+        str or None: The line (without newline), None when the point has no valid field.
+    """
+    field_values = []
+    for key, value in fields.items():
+        formatted = format_field_value(value)
+        if formatted is not None:
+            field_values.append(f"{escape_key(key)}={formatted}")
+    if not field_values:
+        return None
+
+    tag_values = "".join(f",{escape_key(key)}={escape_key(value)}" for key, value in sorted(tags.items()) if value is not None and value != '')
+    return f"{escape_key(measurement)}{tag_values} {','.join(field_values)} {int(timestamp_ns)}"
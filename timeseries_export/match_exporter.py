@@ -0,0 +1,113 @@
+import itertools
+import time
+import sys
+sys.path.append('../')
+from player_ball_assignment import PossessionStats
+from .line_protocol import format_point
+
+class MatchMetricsExporter():
+    """
+    Exports the match metrics as time series (InfluxDB line protocol) to one or more sinks :
+
+    - player (tags match, player_id, team) : speed (km/h), distance (m, cumulative), x & y pitch
+      position (m), has_ball
+    - ball (tag match) : x & y pitch position (m)
+    - team (tags match, team) : possession_share & rolling_possession_share since the match start
+    - camera (tag match) : dx & dy camera movement (px)
+
+    Points are timestamped with the match time (start_time + frame / fps) and generated lazily,
+    window after window (or once for a whole match), and written to the sinks in batches : a full
+    match (millions of points) never exists as a list.
+
+    Attributes:
+        sinks (list): LineProtocolFileSink / HttpLineProtocolSink (anything with write(lines) & close()).
+        match_id (str): Value of the match tag.
+        fps (float): Frame rate of the video.
+        start_time (float): Match kick-off as a Unix timestamp (seconds), now by default.
+        batch_size (int): Lines handed to the sinks at once.
+    """
+    def __init__(self, sinks, match_id='match', fps=24, start_time=None, batch_size=5000):
+        self.sinks = sinks
+        self.match_id = match_id
+        self.fps = fps
+        self.start_time_ns = int((start_time if start_time is not None else time.time()) * 1e9)
+        self.batch_size = batch_size
+        self.possession_stats = PossessionStats(rolling_window=int(5*60*fps)) # 5 minutes
+        self.points_exported = 0
+
+    def frame_timestamp(self, frame_num):
+        return self.start_time_ns + int(round(frame_num * 1e9 / self.fps))
+
+    def iter_window_lines(self, tracks, possession, camera_movement_per_frame, start_frame=0):
+        """
+        Lines of consecutive frames (generator).
+
+        Args:
+            tracks (dict): Tracks of the frames (tracks dict or TrackStore view).
+            possession (dict): PossessionEngine result of the frames.
+            camera_movement_per_frame (list): Camera movement of the frames.
+            start_frame (int): Index of the first frame in the whole match.
+
+        Yields:
+            str: Line protocol lines.
+        """
+        match_tags = {"match": self.match_id}
+        for frame_num, player_track in enumerate(tracks["players"]):
+            timestamp = self.frame_timestamp(start_frame + frame_num)
+            possessor = int(possession["player"][frame_num])
+            possessor_team = int(possession["team"][frame_num])
+
+            for player_id, player in player_track.items():
+                position = player.get("position_transformed")
+                line = format_point("player",
+                                    {"match": self.match_id, "player_id": player_id, "team": player.get("team")},
+                                    {"speed": player.get("speed"),
+                                     "distance": player.get("distance"),
+                                     "x": position[0] if position is not None else None,
+                                     "y": position[1] if position is not None else None,
+                                     "has_ball": player_id == possessor},
+                                    timestamp)
+                if line is not None:
+                    yield line
+
+            for _, ball in tracks["ball"][frame_num].items():
+                position = ball.get("position_transformed")
+                if position is not None:
+                    line = format_point("ball", match_tags, {"x": position[0], "y": position[1]}, timestamp)
+                    if line is not None:
+                        yield line
+
+            self.possession_stats.update(possessor, possessor_team)
+            for team in (1, 2):
+                yield format_point("team", {"match": self.match_id, "team": team},
+                                   {"possession_share": self.possession_stats.get_team_share(team),
+                                    "rolling_possession_share": self.possession_stats.get_rolling_team_share(team),
+                                    "has_ball": possessor_team == team},
+                                   timestamp)
+
+            dx, dy = camera_movement_per_frame[frame_num]
+            yield format_point("camera", match_tags, {"dx": dx, "dy": dy}, timestamp)
+
+    def export_window(self, tracks, possession, camera_movement_per_frame, start_frame=0):
+        """
+        Writes the lines of consecutive frames to every sink, batch_size lines at a time.
+
+        Returns:
+            int: Number of points written.
+        """
+        lines = self.iter_window_lines(tracks, possession, camera_movement_per_frame, start_frame)
+        number_of_points = 0
+        while True:
+            batch = list(itertools.islice(lines, self.batch_size))
+            if not batch:
+                break
+            for sink in self.sinks:
+                sink.write(batch)
+            number_of_points += len(batch)
+        self.points_exported += number_of_points
+        return number_of_points
+
+    def close(self):
+        # flushes & closes every sink
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,174 @@
+import gzip
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+import sys
+sys.path.append('../')
+from instrumentation import metrics
+
+class LineProtocolFileSink():
+    """
+    Writes line protocol to a file (gzip compressed when the path ends with .gz), ready for
+    `influx write --file`. Lines are written in chunks as they come, nothing is held in memory.
+
+    Attributes:
+        path (str): Output file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') else open(path, 'w', encoding='utf-8')
+        self.points_written = 0
+
+    def write(self, lines):
+        if not lines:
+            return
+        self.file.write("\n".join(lines))
+        self.file.write("\n")
+        self.points_written += len(lines)
+        metrics.inc("export_points_total", len(lines), sink="file")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+class HttpLineProtocolSink():
+    """
+    Sends line protocol to an HTTP write endpoint (InfluxDB /api/v2/write or /write, Telegraf,
+    VictoriaMetrics, ...) in batches from a background thread.
+
+    Lines are buffered in chunks of batch_size : a chunk is sent when it's full or when it has
+    waited flush_interval seconds. The buffer is bounded (max_buffer lines), write() blocks when
+    it's full so a slow server slows the producer down instead of growing memory. Failed requests
+    (connection errors, 5xx, 429) are retried with exponential backoff, a batch still failing after
+    max_retries is dropped and counted.
+
+    Attributes:
+        url (str): Write endpoint with its query (e.g. http://localhost:8086/api/v2/write?org=o&bucket=b&precision=ns).
+        token (str): Optional API token (Authorization: Token ...).
+        batch_size (int): Lines per request.
+        max_buffer (int): Maximum number of lines waiting to be sent.
+        flush_interval (float): Maximum time (s) a line waits before being sent.
+        max_retries (int): Retries of a failed request.
+        retry_backoff (float): First retry delay (s), doubled at each retry.
+        timeout (float): Request timeout (s).
+        compress (bool): Gzip the request bodies.
+    """
+    def __init__(self, url, token=None, batch_size=5000, max_buffer=100000, flush_interval=1.0,
+                 max_retries=5, retry_backoff=0.5, timeout=10.0, compress=True):
+        self.url = url
+        self.token = token
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.compress = compress
+
+        self.chunks = queue.Queue(maxsize=max(1, max_buffer // batch_size)) # full chunks waiting to be sent
+        self.pending = [] # chunk being filled by write()
+        self.pending_since = None
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+
+        self.points_sent = 0
+        self.points_dropped = 0
+        self.requests_failed = 0
+        self.last_error = None
+
+        self.closed = False
+        self.thread = threading.Thread(target=self.send_loop, daemon=True)
+        self.thread.start()
+
+    def write(self, lines):
+        if self.closed:
+            raise ValueError("write() on a closed HttpLineProtocolSink")
+        for line in lines:
+            with self.lock:
+                if not self.pending:
+                    self.pending_since = time.monotonic()
+                self.pending.append(line)
+                chunk = None
+                if len(self.pending) >= self.batch_size:
+                    chunk, self.pending = self.pending, []
+            if chunk is not None:
+                self.chunks.put(chunk) # blocks when the buffer is full (backpressure)
+                metrics.set("queue_depth", self.chunks.qsize()*self.batch_size, queue="timeseries_http")
+
+    def take_pending(self, force=False):
+        # the chunk being filled, once it waited flush_interval (or when forced)
+        with self.lock:
+            if self.pending and (force or time.monotonic() - self.pending_since >= self.flush_interval):
+                chunk, self.pending = self.pending, []
+                return chunk
+        return None
+
+    def send_loop(self):
+        while True:
+            try:
+                chunk = self.chunks.get(timeout=self.flush_interval/2)
+            except queue.Empty:
+                with self.send_lock: # flush() waits for this send too
+                    chunk = self.take_pending()
+                    if chunk is not None:
+                        self.send(chunk)
+                continue
+
+            if chunk is None: # close marker
+                self.chunks.task_done()
+                break
+            self.send(chunk)
+            self.chunks.task_done()
+
+    def send(self, lines):
+        body = ("\n".join(lines) + "\n").encode('utf-8')
+        headers = {'Content-Type': 'text/plain; charset=utf-8'}
+        if self.compress:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        if self.token:
+            headers['Authorization'] = f"Token {self.token}"
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+                self.points_sent += len(lines)
+                metrics.inc("export_points_total", len(lines), sink="http")
+                return True
+            except urllib.error.HTTPError as error:
+                self.last_error = error
+                if error.code != 429 and error.code < 500: # bad request / auth : retrying won't help
+                    self.requests_failed += 1
+                    break
+            except (urllib.error.URLError, OSError) as error:
+                self.last_error = error
+            self.requests_failed += 1
+            if attempt < self.max_retries:
+                time.sleep(self.retry_backoff * 2**attempt)
+
+        self.points_dropped += len(lines)
+        metrics.inc("export_dropped_points_total", len(lines), sink="http")
+        return False
+
+    def flush(self):
+        # blocks until every line written so far has been sent (or dropped)
+        chunk = self.take_pending(force=True)
+        if chunk is not None:
+            self.chunks.put(chunk)
+        self.chunks.join()
+        with self.send_lock: # a partial chunk the sender took on its own
+            pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.chunks.put(None) # stops the sender
+        self.thread.join()
@@ -0,0 +1 @@
+from .track_store import TrackStore, ObjectTracks, TracksView
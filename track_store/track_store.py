@@ -0,0 +1,388 @@
+import numpy as np
+from collections.abc import Mapping, MutableMapping, Sequence
+
+# per-detection columns : name -> (shape of one value, dtype, value meaning "not set")
+COLUMNS = {
+    "bbox": ((4,), np.float64, np.nan), # float64 like the detector boxes : positions are rounded from it
+    "position": ((2,), np.int32, 0),
+    "position_adjusted": ((2,), np.float32, np.nan),
+    "position_transformed": ((2,), np.float32, np.nan), # NaN also stands for None (outside the court)
+    "speed": ((), np.float32, np.nan),
+    "distance": ((), np.float32, np.nan),
+    "team": ((), np.int8, 0),
+    "team_color": ((3,), np.float32, np.nan),
+    "has_ball": ((), np.bool_, False),
+}
+
+class ObjectTracks():
+    """
+    Columnar storage of the detections of one object class (players, referees or ball).
+
+    Detections are stored as rows sorted by (frame, track_id) in contiguous NumPy arrays, one per
+    column of COLUMNS, instead of one dict per detection. Rows of a frame are a contiguous slice
+    (found through frame_offsets) and rows of a track are gathered through a cached argsort.
+
+    Attributes:
+        num_frames (int): Number of frames of the video.
+        frame (np.ndarray): Frame index of each row.
+        track_id (np.ndarray): Track ID of each row.
+        columns (dict): Column name -> array with one value per row.
+        populated (set): Names of the columns that have been computed.
+    """
+    def __init__(self, num_frames, frame, track_id, bbox, sort=True):
+        self.num_frames = num_frames
+        self.frame = np.asarray(frame, dtype=np.int32)
+        self.track_id = np.asarray(track_id, dtype=np.int32)
+        self.columns = {}
+        self.populated = set()
+
+        for name, (shape, dtype, missing) in COLUMNS.items():
+            self.columns[name] = np.full((len(self.frame),)+shape, missing, dtype=dtype)
+        self.columns["bbox"][:] = np.asarray(bbox, dtype=np.float64).reshape(-1,4)
+        self.populated.add("bbox")
+
+        self._pending = [] # detections added through the compatibility view, merged on next read
+        if sort:
+            self._sort()
+
+    @classmethod
+    def from_frames(cls, object_tracks):
+        """
+        Builds the columnar storage from the list-of-dicts format (one {track_id: info} dict per frame).
+        """
+        frame, track_id, bbox = [], [], []
+        for frame_num, track in enumerate(object_tracks):
+            for id, track_info in track.items():
+                frame.append(frame_num)
+                track_id.append(id)
+                bbox.append(track_info["bbox"])
+
+        store = cls(len(object_tracks), frame, track_id, np.asarray(bbox, dtype=np.float64).reshape(-1,4), sort=False)
+
+        # keep any enrichment already present in the dicts
+        row = 0
+        for track in object_tracks:
+            for track_info in track.values():
+                for key, value in track_info.items():
+                    if key != "bbox" and key in COLUMNS:
+                        store._set_value(key, row, value)
+                row += 1
+
+        store._sort()
+        return store
+
+    def _sort(self):
+        order = np.lexsort((self.track_id, self.frame))
+        self.frame = self.frame[order]
+        self.track_id = self.track_id[order]
+        for name in self.columns:
+            self.columns[name] = self.columns[name][order]
+
+        # rows of frame f are frame_offsets[f]:frame_offsets[f+1]
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(self.num_frames+1)).astype(np.int64)
+        self._track_order = None
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        frame = np.array([p[0] for p in pending], dtype=np.int32)
+        track_id = np.array([p[1] for p in pending], dtype=np.int32)
+        first_new_row = len(self.frame)
+        self.frame = np.concatenate([self.frame, frame])
+        self.track_id = np.concatenate([self.track_id, track_id])
+        for name, (shape, dtype, missing) in COLUMNS.items():
+            self.columns[name] = np.concatenate([self.columns[name], np.full((len(pending),)+shape, missing, dtype=dtype)])
+        for i, (_, _, track_info) in enumerate(pending):
+            for key, value in track_info.items():
+                if key in COLUMNS:
+                    self._set_value(key, first_new_row+i, value)
+        self._sort()
+
+    def __len__(self):
+        self._flush_pending()
+        return len(self.frame)
+
+    def add_detection(self, frame_num, track_id, track_info):
+        self._pending.append((frame_num, track_id, dict(track_info)))
+
+    def frame_rows(self, frame_num):
+        # slice of the rows of one frame (zero-copy when used to index the columns)
+        self._flush_pending()
+        return slice(int(self.frame_offsets[frame_num]), int(self.frame_offsets[frame_num+1]))
+
+    def track_rows(self, track_id):
+        # row indices of one track, ordered by frame
+        self._flush_pending()
+        if self._track_order is None:
+            self._track_order = np.argsort(self.track_id, kind="stable")
+        sorted_ids = self.track_id[self._track_order]
+        start, end = np.searchsorted(sorted_ids, [track_id, track_id+1])
+        return self._track_order[start:end]
+
+    def track_ids(self):
+        self._flush_pending()
+        return np.unique(self.track_id)
+
+    def get_frame(self, frame_num):
+        """
+        Returns the track IDs and every column for one frame, as views on the column arrays.
+        """
+        rows = self.frame_rows(frame_num)
+        frame_columns = {name: self.columns[name][rows] for name in self.populated}
+        frame_columns["track_id"] = self.track_id[rows]
+        return frame_columns
+
+    def get_track(self, track_id):
+        """
+        Returns the frame indices and every column for one track, ordered by frame.
+        """
+        rows = self.track_rows(track_id)
+        track_columns = {name: self.columns[name][rows] for name in self.populated}
+        track_columns["frame"] = self.frame[rows]
+        return track_columns
+
+    def set_column(self, name, values, rows=None):
+        """
+        Writes a whole column (or the given rows of it) in one vectorized assignment.
+        """
+        self._flush_pending()
+        if rows is None:
+            self.columns[name][:] = values
+        else:
+            self.columns[name][rows] = values
+        self.populated.add(name)
+
+    def is_set(self, name, row):
+        if name not in self.populated:
+            return False
+        if name in ("position", "position_transformed"): # computed for every row at once (None is a valid transformed position)
+            return True
+        value = self.columns[name][row]
+        missing = COLUMNS[name][2]
+        if isinstance(missing, float) and np.isnan(missing):
+            return not np.isnan(value).all()
+        return bool(np.any(value != missing))
+
+    def get_value(self, name, row):
+        value = self.columns[name][row]
+        if name == "bbox":
+            return value.tolist()
+        if name == "position":
+            return int(value[0]), int(value[1])
+        if name == "position_adjusted":
+            return float(value[0]), float(value[1])
+        if name == "position_transformed":
+            return None if np.isnan(value).any() else value.tolist()
+        if name == "team_color":
+            return value.astype(np.float64) # cv2 drawing only accepts float64 color arrays
+        return value.item()
+
+    def _set_value(self, name, row, value):
+        if value is None: # e.g. position_transformed outside the court
+            value = COLUMNS[name][2]
+        self.columns[name][row] = value
+        self.populated.add(name)
+
+    def set_value(self, name, row, value):
+        self._flush_pending()
+        self._set_value(name, row, value)
+
+    def unset_value(self, name, row):
+        self.columns[name][row] = COLUMNS[name][2]
+
+    def to_frames(self):
+        # materializes the list-of-dicts format
+        return [dict(frame_view.items()) for frame_view in _ObjectTracksView(self)]
+
+    @property
+    def nbytes(self):
+        self._flush_pending()
+        return self.frame.nbytes + self.track_id.nbytes + sum(column.nbytes for column in self.columns.values())
+
+
+class _DetectionView(MutableMapping):
+    # dict-like access to one row : track_info['bbox'], track_info.get('team_color'), ...
+    def __init__(self, object_tracks, row):
+        self._object_tracks = object_tracks
+        self._row = row
+
+    def __getitem__(self, key):
+        if key not in COLUMNS or not self._object_tracks.is_set(key, self._row):
+            raise KeyError(key)
+        return self._object_tracks.get_value(key, self._row)
+
+    def __setitem__(self, key, value):
+        if key not in COLUMNS:
+            raise KeyError(f"'{key}' is not a track store column")
+        self._object_tracks.set_value(key, self._row, value)
+
+    def __delitem__(self, key):
+        self._object_tracks.unset_value(key, self._row)
+
+    def __iter__(self):
+        return (name for name in COLUMNS if self._object_tracks.is_set(name, self._row))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class _FrameView(MutableMapping):
+    # dict-like access to one frame : {track_id: _DetectionView}
+    def __init__(self, object_tracks, frame_num):
+        self._object_tracks = object_tracks
+        self._frame_num = frame_num
+
+    def _rows(self):
+        rows = self._object_tracks.frame_rows(self._frame_num)
+        return rows, self._object_tracks.track_id[rows]
+
+    def __getitem__(self, track_id):
+        rows, track_ids = self._rows()
+        index = np.searchsorted(track_ids, track_id)
+        if index >= len(track_ids) or track_ids[index] != track_id:
+            raise KeyError(track_id)
+        return _DetectionView(self._object_tracks, rows.start+int(index))
+
+    def __setitem__(self, track_id, track_info):
+        if track_id in self:
+            detection = self[track_id]
+            for key, value in track_info.items():
+                detection[key] = value
+        else:
+            self._object_tracks.add_detection(self._frame_num, track_id, track_info)
+
+    def __delitem__(self, track_id):
+        raise TypeError("detections can't be removed from a track store")
+
+    def __iter__(self):
+        _, track_ids = self._rows()
+        return (int(track_id) for track_id in track_ids)
+
+    def __len__(self):
+        rows, _ = self._rows()
+        return rows.stop - rows.start
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class _ObjectTracksView(Sequence):
+    # list-like access to the frames of one object class
+    def __init__(self, object_tracks):
+        self._object_tracks = object_tracks
+
+    def __getitem__(self, frame_num):
+        if isinstance(frame_num, slice):
+            return [self[i] for i in range(*frame_num.indices(len(self)))]
+        if frame_num < 0:
+            frame_num += len(self)
+        if not 0 <= frame_num < len(self):
+            raise IndexError(frame_num)
+        return _FrameView(self._object_tracks, frame_num)
+
+    def __len__(self):
+        return self._object_tracks.num_frames
+
+
+class TracksView(MutableMapping):
+    """
+    Compatibility view exposing a TrackStore with the original tracks[object][frame][track_id][key]
+    interface, so the existing stages and drawing code work unchanged on top of the arrays.
+    Assigning a list of frame dicts to an object (e.g. interpolated ball positions) rebuilds its columns.
+    """
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, object):
+        return _ObjectTracksView(self._store.objects[object])
+
+    def __setitem__(self, object, object_tracks):
+        if isinstance(object_tracks, _ObjectTracksView):
+            object_tracks = object_tracks._object_tracks
+        if not isinstance(object_tracks, ObjectTracks):
+            object_tracks = ObjectTracks.from_frames(object_tracks)
+        self._store.objects[object] = object_tracks
+
+    def __delitem__(self, object):
+        del self._store.objects[object]
+
+    def __iter__(self):
+        return iter(self._store.objects)
+
+    def __len__(self):
+        return len(self._store.objects)
+
+
+class TrackStore(Mapping):
+    """
+    Compact columnar track store: one ObjectTracks (contiguous arrays of frame index, track ID,
+    bbox, positions, speed, distance, team, has_ball ...) per object class.
+
+    Enrichment stages write whole columns as vectorized array operations, while view() gives
+    back the tracks[object][frame][track_id] interface for code that still walks dicts.
+    """
+    def __init__(self, objects=None):
+        self.objects = objects if objects is not None else {}
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        """
+        Builds a store from the dictionary returned by Tracker.get_object_tracks.
+        """
+        return cls({object: ObjectTracks.from_frames(object_tracks) for object, object_tracks in tracks.items()})
+
+    def to_arrays(self, frame_offset=0):
+        """
+        Flat {"<object>/<column>": array} dict of the store (e.g. for StageCache), frame indices
+        shifted by frame_offset (index of the first frame in the whole video).
+        """
+        arrays = {}
+        for object, object_tracks in self.objects.items():
+            object_tracks._flush_pending()
+            arrays[f"{object}/frame"] = object_tracks.frame + frame_offset
+            arrays[f"{object}/track_id"] = object_tracks.track_id
+            for name in sorted(object_tracks.populated):
+                arrays[f"{object}/{name}"] = object_tracks.columns[name]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, num_frames, frame_offset=0):
+        """
+        Rebuilds a store from to_arrays output covering num_frames frames starting at frame_offset.
+        """
+        objects = {}
+        for object in dict.fromkeys(name.split('/')[0] for name in arrays if '/' in name):
+            object_tracks = ObjectTracks(num_frames,
+                                         np.asarray(arrays[f"{object}/frame"]) - frame_offset,
+                                         arrays[f"{object}/track_id"],
+                                         arrays[f"{object}/bbox"])
+            for name in COLUMNS:
+                if name != "bbox" and f"{object}/{name}" in arrays:
+                    object_tracks.set_column(name, arrays[f"{object}/{name}"])
+            objects[object] = object_tracks
+        return cls(objects)
+
+    def to_tracks(self):
+        # back to the original dictionary of lists of dictionaries
+        return {object: object_tracks.to_frames() for object, object_tracks in self.objects.items()}
+
+    def view(self):
+        return TracksView(self)
+
+    def __getitem__(self, object):
+        return self.objects[object]
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    @property
+    def nbytes(self):
+        return sum(object_tracks.nbytes for object_tracks in self.objects.values())
@@ -1,4 +1,9 @@
 # Exposing
 
 
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .ball_interpolator import BallInterpolator, interpolate_bboxes
+from .detection_scheduler import DetectionScheduler
+from .keyframe_detector import KeyframeDetector, FrameDetections
+from .inference_resizer import InferenceResizer
+from .onnx_detector import OnnxDetector, load_detector
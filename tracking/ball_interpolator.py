@@ -0,0 +1,79 @@
+import numpy as np
+
+def interpolate_bboxes(bboxes):
+    """
+    Fills the missing bboxes (NaN rows) of a contiguous F x 4 array : linear interpolation between
+    detections, first detection repeated before it and last detection repeated after it.
+
+    Args:
+        bboxes (np.ndarray): F x 4 array of [x1, y1, x2, y2], NaN rows where the ball is missing.
+
+    Returns:
+        np.ndarray: F x 4 interpolated array (unchanged if there's no detection at all).
+    """
+    bboxes = np.array(bboxes, dtype=np.float64).reshape(-1,4)
+    detected = ~np.isnan(bboxes).any(axis=1)
+    if not detected.any():
+        return bboxes
+
+    frames = np.arange(len(bboxes))
+    for column in range(4): # np.interp holds the edge values outside the detections
+        bboxes[:,column] = np.interp(frames, frames[detected], bboxes[detected,column])
+    return bboxes
+
+
+class BallInterpolator():
+    """
+    Streaming ball interpolation with a bounded look-ahead buffer.
+
+    Frames without a ball are held until the next detection closes the gap (they are then emitted
+    linearly interpolated), or until max_gap frames are waiting (they are then emitted with the last
+    known bbox, like the end of a video). Frames are always emitted in order.
+
+    Attributes:
+        max_gap (int): Maximum number of frames held while waiting for the ball.
+    """
+    def __init__(self, max_gap=48):
+        self.max_gap = max_gap # 2 seconds at 24 fps
+        self.last_frame = None
+        self.last_bbox = None
+        self.pending_frames = [] # frames waiting for the next detection
+
+    def push(self, frame_num, bbox):
+        """
+        Args:
+            frame_num (int): Index of the frame.
+            bbox (list or None): Detected ball bbox of the frame, None when the ball is missing.
+
+        Returns:
+            list: (frame_num, bbox) pairs ready to be used, bbox is None only before the first detection.
+        """
+        if bbox is None:
+            self.pending_frames.append(frame_num)
+            if len(self.pending_frames) > self.max_gap: # gap timeout : stop waiting
+                return self.flush()
+            return []
+
+        bbox = np.asarray(bbox, dtype=np.float64)
+        ready = []
+        if self.pending_frames:
+            if self.last_bbox is None: # leading frames : first detection repeated
+                ready = [(pending_frame, bbox.tolist()) for pending_frame in self.pending_frames]
+            else:
+                pending_frames = np.asarray(self.pending_frames)
+                weight = ((pending_frames - self.last_frame) / (frame_num - self.last_frame))[:,None]
+                interpolated = self.last_bbox + weight*(bbox - self.last_bbox)
+                ready = list(zip(self.pending_frames, interpolated.tolist()))
+            self.pending_frames = []
+
+        ready.append((frame_num, bbox.tolist()))
+        self.last_frame = frame_num
+        self.last_bbox = bbox
+        return ready
+
+    def flush(self):
+        # emits the held frames with the last known bbox (None if the ball was never seen)
+        last_bbox = self.last_bbox.tolist() if self.last_bbox is not None else None
+        ready = [(pending_frame, last_bbox) for pending_frame in self.pending_frames]
+        self.pending_frames = []
+        return ready
@@ -0,0 +1,227 @@
+import heapq
+import queue
+import threading
+import time
+import cv2
+import sys
+sys.path.append('../')
+from instrumentation import metrics
+
+class DetectionScheduler():
+    """
+    Producer/consumer detection : a decoder thread fills a bounded frame queue while inference
+    threads assemble batches from it and run the model, so decoding the next frames overlaps the
+    inference of the current batch.
+
+    Batches are adaptive : an inference thread takes up to batch_size frames but ships a smaller
+    batch when no new frame arrives within max_wait seconds, so a slow decoder never leaves the
+    inference cores idle waiting for a full batch. Results come back in frame order whatever the
+    number of inference threads (ByteTrack needs its detections in order).
+
+    Attributes:
+        models (list): One model per inference thread (a YOLO model is not thread safe).
+        batch_size (int): Maximum number of frames per inference batch.
+        max_wait (float): Maximum time (s) waiting for more frames once a batch is started.
+        queue_size (int): Maximum number of decoded frames waiting for inference.
+        conf (float): Minimum detection confidence.
+        imgsz (int): Detector input size (long side), the model default when None.
+        resizer (InferenceResizer): Resizes the frames on the decoder thread, the detections are
+                                    rescaled to the source frames (None : full resolution frames).
+    """
+    def __init__(self, models, batch_size=20, max_wait=0.05, queue_size=64, conf=0.1, imgsz=None, resizer=None):
+        self.models = models if isinstance(models, (list, tuple)) else [models]
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.conf = conf
+        self.imgsz = imgsz
+        self.resizer = resizer
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.batch_lock = threading.Lock()
+
+    def reset_stats(self):
+        self.stats = {"frames": 0, "batches": 0, "decode_time": 0.0, "resize_time": 0.0, "inference_time": 0.0, "starved_time": 0.0}
+
+    def prepare(self, frame_num, frame):
+        # queued item : the source frame and its inference resolution copy (resized once, here on the decoder thread)
+        if self.resizer is None:
+            return frame_num, frame, None
+        resize_start = time.perf_counter()
+        resized = self.resizer.resize(frame)
+        self.stats["resize_time"] += time.perf_counter() - resize_start
+        return frame_num, frame, resized
+
+    def put(self, target_queue, item, stop):
+        # blocking put that gives up when the consumer stopped
+        while not stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode(self, source, start_frame, end_frame, frame_queue, stop):
+        # producer : frames of a video path (decoded here) or of any iterable of frames
+        try:
+            if isinstance(source, str):
+                cap = cv2.VideoCapture(source)
+                if start_frame > 0:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+                frame_num = start_frame
+                while end_frame is None or frame_num < end_frame:
+                    decode_start = time.perf_counter()
+                    ret , frame = cap.read()
+                    self.stats["decode_time"] += time.perf_counter() - decode_start
+                    if not ret:
+                        break
+                    if not self.put(frame_queue, self.prepare(frame_num, frame), stop):
+                        break
+                    frame_num += 1
+                cap.release()
+            else:
+                for frame_num, frame in enumerate(source, start_frame):
+                    if not self.put(frame_queue, self.prepare(frame_num, frame), stop):
+                        break
+        except Exception as error:
+            self.put(frame_queue, error, stop)
+        finally:
+            for _ in self.models: # one end marker per inference thread
+                self.put(frame_queue, None, stop)
+
+    def next_batch(self, frame_queue):
+        """
+        Blocks for the first frame, then collects frames until batch_size or max_wait. One thread
+        assembles a batch at a time so every batch is a run of consecutive frames.
+
+        Returns:
+            tuple: (batch, finished) where batch is a list of (frame_num, frame, resized frame) and finished is
+                   the end marker (None) or a decoder error when it was reached, False otherwise.
+        """
+        with self.batch_lock:
+            return self.collect_batch(frame_queue)
+
+    def collect_batch(self, frame_queue):
+        starved_start = time.perf_counter()
+        item = frame_queue.get()
+        with self.stats_lock:
+            self.stats["starved_time"] += time.perf_counter() - starved_start
+        if item is None or isinstance(item, Exception):
+            return [], item
+
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                item = frame_queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break # adaptive : ship what we have
+            if item is None or isinstance(item, Exception):
+                return batch, item
+            batch.append(item)
+        return batch, False
+
+    def infer(self, model, frame_queue, result_queue, stop):
+        # consumer : batches -> model -> (first frame number, frame numbers, frames, detections)
+        try:
+            while not stop.is_set():
+                batch, finished = self.next_batch(frame_queue)
+                if batch:
+                    frame_nums = [frame_num for frame_num, _, _ in batch]
+                    frames = [frame for _, frame, _ in batch]
+                    inference_start = time.perf_counter()
+                    metrics.set("queue_depth", frame_queue.qsize(), queue="detection_frames")
+                    kwargs = {"conf": self.conf} if self.imgsz is None else {"conf": self.conf, "imgsz": self.imgsz}
+                    if self.resizer is None:
+                        detections = model.predict(frames, **kwargs)
+                    else:
+                        resized_frames = [resized for _, _, resized in batch]
+                        detections = [self.resizer.to_source(result, frame.shape, resized.shape)
+                                      for result, frame, resized in zip(model.predict(resized_frames, **kwargs), frames, resized_frames)]
+                    metrics.observe("detect_batch_seconds", time.perf_counter() - inference_start)
+                    metrics.inc("detected_frames_total", len(frames))
+                    metrics.set("detect_batch_size", len(frames))
+                    with self.stats_lock:
+                        self.stats["inference_time"] += time.perf_counter() - inference_start
+                        self.stats["batches"] += 1
+                        self.stats["frames"] += len(frames)
+                    if not self.put(result_queue, (frame_nums[0], frame_nums, frames, detections), stop):
+                        break
+                if isinstance(finished, Exception):
+                    self.put(result_queue, (-1, finished, None, None), stop)
+                    break
+                if finished is not False:
+                    break
+        except Exception as error:
+            self.put(result_queue, (-1, error, None, None), stop)
+        finally:
+            self.put(result_queue, None, stop)
+
+    def run(self, source, start_frame=0, end_frame=None):
+        """
+        Detects objects on every frame of source.
+
+        Args:
+            source (str or iterable): Video path (decoded in a background thread) or frames.
+            start_frame (int): First frame to decode (frame number of the first item otherwise).
+            end_frame (int, optional): Frame where decoding stops (exclusive), the end if None.
+
+        Yields:
+            tuple: (frame_num, frame, detection) in frame order.
+        """
+        self.reset_stats()
+        frame_queue = queue.Queue(maxsize=self.queue_size)
+        result_queue = queue.Queue(maxsize=2*len(self.models))
+        stop = threading.Event()
+
+        threads = [threading.Thread(target=self.decode, args=(source, start_frame, end_frame, frame_queue, stop), daemon=True)]
+        threads += [threading.Thread(target=self.infer, args=(model, frame_queue, result_queue, stop), daemon=True)
+                    for model in self.models]
+        for thread in threads:
+            thread.start()
+
+        pending = [] # heap of batches finished out of order
+        next_frame = start_frame
+        running = len(self.models)
+        try:
+            while running:
+                result = result_queue.get()
+                if result is None:
+                    running -= 1
+                    continue
+                if isinstance(result[1], Exception):
+                    raise result[1]
+
+                heapq.heappush(pending, (result[0], id(result), result))
+                while pending and pending[0][0] == next_frame: # re-order by frame number
+                    _, _, (_, frame_nums, frames, detections) = heapq.heappop(pending)
+                    yield from zip(frame_nums, frames, detections)
+                    next_frame = frame_nums[-1] + 1
+        finally:
+            stop.set()
+            for _ in self.models: # wakes the inference threads waiting for frames
+                try:
+                    frame_queue.put_nowait(None)
+                except queue.Full:
+                    pass
+            for thread in threads:
+                thread.join()
+
+    def run_windows(self, source, window_size, start_frame=0, end_frame=None):
+        """
+        Same as run, grouped in consecutive windows (like read_video_windows).
+
+        Yields:
+            tuple: (start_frame, frames, detections) of each window.
+        """
+        window_start, frames, detections = start_frame, [], []
+        for frame_num, frame, detection in self.run(source, start_frame, end_frame):
+            frames.append(frame)
+            detections.append(detection)
+            if len(frames) == window_size:
+                yield window_start, frames, detections
+                window_start, frames, detections = frame_num + 1, [], []
+
+        if frames: # last (shorter) window
+            yield window_start, frames, detections
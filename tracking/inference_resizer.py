@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+import supervision as sv
+from .keyframe_detector import FrameDetections
+
+class InferenceResizer():
+    """
+    Resizes the frames to the inference resolution once (e.g. on the decoder thread) instead of
+    letting the detector letterbox every full resolution frame, and maps the detections back to
+    source coordinates before ByteTrack.
+
+    The resize keeps the aspect ratio without padding (the detector only pads up to its stride).
+
+    Attributes:
+        inference_size (int): Long side (pixels) of the frames given to the detector.
+    """
+    def __init__(self, inference_size=640):
+        self.inference_size = inference_size
+
+    def get_size(self, frame_shape):
+        # (width, height) of the resized frame
+        height, width = frame_shape[:2]
+        scale = self.inference_size / max(width, height)
+        return max(1, int(round(width*scale))), max(1, int(round(height*scale)))
+
+    def resize(self, frame):
+        size = self.get_size(frame.shape)
+        if size == (frame.shape[1], frame.shape[0]):
+            return frame
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def to_source(self, result, source_shape, resized_shape):
+        """
+        Detections of a resized frame in source frame coordinates.
+
+        Args:
+            result: YOLO result (or FrameDetections of a CPU backend) of the resized frame.
+            source_shape (tuple): Shape of the source frame.
+            resized_shape (tuple): Shape of the resized frame.
+
+        Returns:
+            FrameDetections: Detections with source coordinates boxes.
+        """
+        detections = result.detections if isinstance(result, FrameDetections) else sv.Detections.from_ultralytics(result)
+        scale_x, scale_y = source_shape[1] / resized_shape[1], source_shape[0] / resized_shape[0]
+        if len(detections):
+            detections.xyxy = detections.xyxy * np.array([scale_x, scale_y, scale_x, scale_y], dtype=detections.xyxy.dtype)
+        return FrameDetections(result.names, detections)
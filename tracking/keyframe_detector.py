@@ -0,0 +1,216 @@
+import cv2
+import numpy as np
+import supervision as sv
+import sys
+sys.path.append('../')
+from instrumentation import metrics
+from utils import scale_length
+
+class FrameDetections():
+    """
+    Detections of a frame in the supervision format, either from the detector (keyframe) or
+    propagated from the previous frame. detections_to_tracks takes them like YOLO results.
+
+    Attributes:
+        names (dict): Class names of the model {class_id: name}.
+        detections (sv.Detections): Boxes, confidences & class IDs of the frame.
+        keyframe (bool): True when the detector ran on this frame.
+    """
+    def __init__(self, names, detections, keyframe=True):
+        self.names = names
+        self.detections = detections
+        self.keyframe = keyframe
+
+class KeyframeDetector():
+    """
+    Runs the detector on keyframes only and propagates the boxes to the frames in between with
+    Lucas-Kanade optical flow (same LK parameters as CameraMovementEstimator) : each box moves by
+    the median flow of the corner features inside it, checked forward-backward. ByteTrack then
+    associates the propagated boxes like detections, so the track IDs carry over.
+
+    Keyframes are every interval-th frame of the video; with adaptive on, a frame is also detected
+    when the propagation gets unreliable : fast motion (median box movement above max_motion px) or
+    too many player boxes lost (above max_lost_fraction). interval is the accuracy/speed knob :
+    1 detects every frame (no propagation), higher values save more detector calls.
+
+    Attributes:
+        predict (callable): Detector, frames -> YOLO results or FrameDetections (Tracker.predict).
+        interval (int): Frames between 2 scheduled keyframes.
+        adaptive (bool): Detects the frames the propagation can't follow.
+        max_motion (float): Median box movement (px/frame on 1920x1080 frames) forcing a keyframe.
+        max_lost_fraction (float): Fraction of player boxes lost by the flow forcing a keyframe.
+        flow_scale (float): Scale of the frames the optical flow runs on.
+        batch_size (int): Keyframes per inference batch.
+    """
+    def __init__(self, predict, interval=5, adaptive=True, max_motion=12.0, max_lost_fraction=0.3, flow_scale=0.5,
+                 batch_size=20):
+        self.predict = predict
+        self.interval = max(1, interval)
+        self.adaptive = adaptive
+        self.max_motion = max_motion
+        self.max_lost_fraction = max_lost_fraction
+        self.flow_scale = flow_scale
+        self.batch_size = batch_size
+        self.max_fb_error = 1.0 # forward-backward error (flow scale px) of a reliable point
+
+        self.lk_params = dict(
+            winSize = (15,15),
+            maxLevel = 2,
+            criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT,10,0.03)
+        )
+        self.reset()
+
+    def reset(self):
+        # new video
+        self.frame_num = 0
+        self.previous_gray = None
+        self.previous = None # FrameDetections of the previous frame
+        self.stats = {"frames": 0, "interval": 0, "motion": 0, "lost": 0, "propagated": 0}
+
+    def skip_frames(self, number_of_frames):
+        # frames whose detections come from elsewhere (e.g. a cache) : the next frame is detected
+        self.frame_num += number_of_frames
+        self.previous_gray = None
+        self.previous = None
+
+    def get_cache_params(self):
+        # parameters the tracks depend on (StageCache key)
+        return {"interval": self.interval, "adaptive": self.adaptive, "max_motion": self.max_motion,
+                "max_lost_fraction": self.max_lost_fraction, "flow_scale": self.flow_scale}
+
+    def get_grayscale(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.flow_scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.flow_scale, fy=self.flow_scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def detect(self, frames):
+        # detector on a list of frames, in batches
+        results = []
+        for i in range(0, len(frames), self.batch_size):
+            with metrics.timer("detect_batch_seconds"):
+                batch = self.predict(frames[i:i+self.batch_size])
+            metrics.inc("detected_frames_total", len(batch))
+            metrics.set("detect_batch_size", len(batch))
+            results += [result if isinstance(result, FrameDetections) else FrameDetections(result.names, sv.Detections.from_ultralytics(result))
+                        for result in batch]
+        return results
+
+    def propagate(self, gray):
+        """
+        Moves the boxes of the previous frame to the current one.
+
+        Returns:
+            tuple: (FrameDetections, median box movement in px, fraction of player boxes lost)
+        """
+        previous = self.previous.detections
+        if len(previous) == 0:
+            return FrameDetections(self.previous.names, previous, keyframe=False), 0.0, 0.0
+
+        height, width = gray.shape
+        boxes = previous.xyxy * self.flow_scale
+        int_boxes = np.clip(np.round(boxes), 0, [width-1, height-1, width-1, height-1]).astype(int)
+
+        # corner features inside the boxes of the previous frame
+        mask = np.zeros_like(self.previous_gray)
+        for x1, y1, x2, y2 in int_boxes:
+            mask[y1:y2+1, x1:x2+1] = 255
+        corners = cv2.goodFeaturesToTrack(self.previous_gray, maxCorners=16*len(boxes), qualityLevel=0.01,
+                                          minDistance=2, mask=mask, blockSize=3)
+        corners = corners.reshape(-1, 2) if corners is not None else np.zeros((0, 2), dtype=np.float32)
+        inside = ((corners[None, :, 0] >= boxes[:, None, 0]) & (corners[None, :, 0] <= boxes[:, None, 2]) &
+                  (corners[None, :, 1] >= boxes[:, None, 1]) & (corners[None, :, 1] <= boxes[:, None, 3])) # boxes x corners
+
+        # every box gets its corners (the first box containing them), boxes without corners their center
+        owners = np.where(inside.any(axis=0), inside.argmax(axis=0), -1)
+        points, point_owners = [corners[owners >= 0]], [owners[owners >= 0]]
+        no_corner = np.setdiff1d(np.arange(len(boxes)), owners)
+        points.append(np.stack([(boxes[no_corner, 0] + boxes[no_corner, 2]) / 2,
+                                (boxes[no_corner, 1] + boxes[no_corner, 3]) / 2], axis=1))
+        point_owners.append(no_corner)
+        points = np.concatenate(points).astype(np.float32).reshape(-1, 1, 2)
+        point_owners = np.concatenate(point_owners)
+
+        # forward-backward optical flow : a point is kept when it comes back where it started
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.previous_gray, gray, points, None, **self.lk_params)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.previous_gray, new_points, None, **self.lk_params)
+        fb_error = np.linalg.norm((back_points - points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+        displacements = (new_points - points).reshape(-1, 2) / self.flow_scale
+
+        shifts = np.zeros((len(boxes), 2))
+        tracked = np.zeros(len(boxes), dtype=bool)
+        for box_index in np.unique(point_owners[good]):
+            shifts[box_index] = np.median(displacements[good & (point_owners == box_index)], axis=0)
+            tracked[box_index] = True
+
+        xyxy = previous.xyxy + np.concatenate([shifts, shifts], axis=1)
+        full_width, full_height = width / self.flow_scale, height / self.flow_scale
+        inside_frame = (xyxy[:, 2] > 0) & (xyxy[:, 0] < full_width) & (xyxy[:, 3] > 0) & (xyxy[:, 1] < full_height)
+        keep = tracked & inside_frame
+
+        propagated = previous[keep]
+        propagated.xyxy = xyxy[keep]
+
+        is_ball = np.asarray(previous.data.get("class_name", np.array([""]*len(previous)))) == "ball"
+        number_of_players = int((~is_ball).sum())
+        lost_fraction = float((~keep & ~is_ball).sum() / number_of_players) if number_of_players else 0.0
+        motion = float(np.median(np.linalg.norm(shifts[tracked], axis=1))) if tracked.any() else 0.0
+        return FrameDetections(self.previous.names, propagated, keyframe=False), motion, lost_fraction
+
+    def detect_frames(self, frames):
+        """
+        Detections of consecutive frames of the video (keeps its state across calls, e.g. windows).
+
+        Returns:
+            list: FrameDetections, one per frame.
+        """
+        # scheduled keyframes of these frames, detected in batches
+        scheduled = [i for i in range(len(frames)) if (self.frame_num + i) % self.interval == 0]
+        keyframes = dict(zip(scheduled, self.detect([frames[i] for i in scheduled])))
+
+        detections = []
+        max_motion = scale_length(self.max_motion, (frames[0].shape[1], frames[0].shape[0])) if frames else self.max_motion
+        for i, frame in enumerate(frames):
+            with metrics.timer("keyframe_propagation_seconds"):
+                gray = self.get_grayscale(frame)
+
+                if i in keyframes:
+                    frame_detections, reason = keyframes[i], "interval"
+                elif self.previous is None:
+                    frame_detections, reason = None, "interval" # first frame of the video
+                else:
+                    frame_detections, motion, lost_fraction = self.propagate(gray)
+                    reason = None
+                    if self.adaptive and motion > max_motion:
+                        reason = "motion"
+                    elif self.adaptive and lost_fraction > self.max_lost_fraction:
+                        reason = "lost"
+                    if reason is not None:
+                        frame_detections = None # unreliable : detected instead
+
+            if frame_detections is None:
+                frame_detections = self.detect([frame])[0]
+            if reason is not None:
+                self.stats[reason] += 1
+                metrics.inc("keyframe_detections_total", 1, reason=reason)
+            else:
+                self.stats["propagated"] += 1
+                metrics.inc("propagated_frames_total")
+
+            detections.append(frame_detections)
+            self.previous, self.previous_gray = frame_detections, gray
+
+        self.frame_num += len(frames)
+        self.stats["frames"] += len(frames)
+        return detections
+
+    def get_report(self):
+        """
+        Returns:
+            dict: Frames, detector calls (by reason), propagated frames and detector calls saved.
+        """
+        detector_frames = self.stats["interval"] + self.stats["motion"] + self.stats["lost"]
+        frames = self.stats["frames"]
+        return {**self.stats, "detector_frames": detector_frames, "saved_calls": frames - detector_frames,
+                "saved_fraction": (frames - detector_frames) / frames if frames else 0.0}
@@ -0,0 +1,147 @@
+# Detector export for the CPU backends : python -m tracking.model_export --weights models/best.pt [--int8 --calibration-video input_vids/08fd33_4.mp4]
+
+import argparse
+import os
+import re
+import shutil
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video_range, get_video_properties
+from tracking.onnx_detector import letterbox
+
+def export_onnx(weights_path, output_path=None, imgsz=640, dynamic=True, simplify=True):
+    """
+    Exports ultralytics weights to ONNX (class names kept in the model metadata).
+
+    Args:
+        weights_path (str): .pt weights.
+        output_path (str, optional): Path of the .onnx, next to the weights when None.
+        imgsz (int): Input size of the model (default input size with dynamic shapes).
+        dynamic (bool): Dynamic batch & input size (batched inference, any inference size).
+
+    Returns:
+        str: Path of the exported model.
+    """
+    from ultralytics import YOLO
+    exported_path = YOLO(weights_path).export(format='onnx', imgsz=imgsz, dynamic=dynamic, simplify=simplify)
+    if output_path is not None and os.path.abspath(output_path) != os.path.abspath(exported_path):
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        shutil.move(exported_path, output_path)
+        exported_path = output_path
+    return exported_path
+
+class FrameCalibrationReader():
+    """
+    Calibration data of the static int8 quantization : frames letterboxed like OnnxDetector does,
+    one per batch.
+    """
+    def __init__(self, input_name, frames, imgsz=640):
+        self.input_name = input_name
+        self.frames = frames
+        self.imgsz = imgsz
+        self.rewind()
+
+    def get_next(self):
+        if self.index >= len(self.frames):
+            return None
+        image, _, _ = letterbox(self.frames[self.index], (self.imgsz, self.imgsz))
+        self.index += 1
+        return {self.input_name: np.ascontiguousarray(image[None, ..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0}
+
+    def rewind(self):
+        self.index = 0
+
+def get_head_nodes(model):
+    """
+    Non convolution nodes of the detection head (last "/model.N/" block : box decoding, sigmoid,
+    concat). They're left in float : boxes (pixels) and class scores (0-1) share one output tensor
+    that a single int8 scale can't represent.
+    """
+    blocks = [int(match.group(1)) for node in model.graph.node for match in [re.match(r'/model\.(\d+)/', node.name)] if match]
+    if not blocks:
+        return []
+    head = f"/model.{max(blocks)}/"
+    return [node.name for node in model.graph.node if node.name.startswith(head) and node.op_type != 'Conv']
+
+def quantize_onnx(onnx_path, output_path, calibration_frames=None, imgsz=640):
+    """
+    int8 version of an ONNX detector : static quantization (QDQ, activations calibrated on
+    calibration_frames) when frames are given, dynamic (weights only) otherwise. The detection
+    head stays in float.
+
+    Returns:
+        str: Path of the quantized model.
+    """
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    model = onnx.load(onnx_path)
+    head_nodes = get_head_nodes(model)
+    if calibration_frames:
+        reader = FrameCalibrationReader(model.graph.input[0].name, calibration_frames, imgsz)
+        quantize_static(onnx_path, output_path, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, nodes_to_exclude=head_nodes)
+    else:
+        quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QUInt8, nodes_to_exclude=head_nodes)
+
+    # keep the metadata (class names) of the float model
+    quantized = onnx.load(output_path)
+    if not quantized.metadata_props:
+        for prop in model.metadata_props:
+            quantized.metadata_props.add(key=prop.key, value=prop.value)
+        onnx.save(quantized, output_path)
+    return output_path
+
+def export_openvino(onnx_path, output_dir):
+    """
+    Converts an ONNX detector to OpenVINO IR (model.xml / model.bin) with a metadata.yaml holding
+    the class names, loadable with load_detector(output_dir). OpenVINO also runs the .onnx directly.
+
+    Returns:
+        str: Path of the .xml model.
+    """
+    import openvino
+    import yaml
+    from tracking.onnx_detector import read_onnx_names
+
+    os.makedirs(output_dir, exist_ok=True)
+    xml_path = os.path.join(output_dir, 'model.xml')
+    openvino.save_model(openvino.convert_model(onnx_path), xml_path)
+    with open(os.path.join(output_dir, 'metadata.yaml'), 'w') as f:
+        yaml.safe_dump({"names": read_onnx_names(onnx_path)}, f)
+    return xml_path
+
+def sample_frames(video_path, number_of_frames):
+    # frames spread evenly over the video (calibration data)
+    frame_count = get_video_properties(video_path)["frame_count"]
+    frames = []
+    for frame_num in np.linspace(0, max(frame_count-1, 0), number_of_frames).astype(int):
+        frames += read_video_range(video_path, int(frame_num), int(frame_num)+1)
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports the detector to ONNX (optionally int8 / OpenVINO) for the CPU backends.")
+    parser.add_argument('--weights', default='models/best.pt', help="ultralytics weights")
+    parser.add_argument('--output', help="exported .onnx (next to the weights by default)")
+    parser.add_argument('--imgsz', type=int, default=640, help="input size of the model")
+    parser.add_argument('--static-shape', action='store_true', help="fixed batch of 1 and input size (dynamic by default)")
+    parser.add_argument('--int8', action='store_true', help="also write an int8 quantized model (<name>.int8.onnx)")
+    parser.add_argument('--calibration-video', help="video the int8 activations are calibrated on (dynamic quantization without)")
+    parser.add_argument('--calibration-frames', type=int, default=64, help="frames sampled from the calibration video")
+    parser.add_argument('--openvino', action='store_true', help="also convert the exported model(s) to OpenVINO IR")
+    args = parser.parse_args()
+
+    onnx_path = export_onnx(args.weights, args.output, args.imgsz, dynamic=not args.static_shape)
+    exported = [onnx_path]
+    if args.int8:
+        calibration_frames = sample_frames(args.calibration_video, args.calibration_frames) if args.calibration_video else None
+        exported.append(quantize_onnx(onnx_path, onnx_path[:-len('.onnx')] + '.int8.onnx', calibration_frames, args.imgsz))
+    if args.openvino:
+        exported += [export_openvino(path, path[:-len('.onnx')] + '_openvino_model') for path in list(exported)]
+
+    for path in exported:
+        print(f"Exported {path}")
+
+if __name__ == '__main__':
+    main()
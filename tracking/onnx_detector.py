@@ -0,0 +1,239 @@
+import ast
+import os
+import cv2
+import numpy as np
+import supervision as sv
+from .keyframe_detector import FrameDetections
+
+try:
+    import onnxruntime
+except ImportError: # only needed for the onnxruntime backend
+    onnxruntime = None
+
+try:
+    import openvino
+except ImportError: # only needed for the openvino backend
+    openvino = None
+
+def letterbox(frame, new_shape, color=(114,114,114)):
+    """
+    Resizes a frame into new_shape (height, width) keeping its aspect ratio, padded on both sides
+    like the ultralytics LetterBox (auto=False, center=True).
+
+    Returns:
+        tuple: (padded frame, gain, (left pad, top pad))
+    """
+    height, width = frame.shape[:2]
+    gain = min(new_shape[0] / height, new_shape[1] / width)
+    new_width, new_height = int(round(width*gain)), int(round(height*gain))
+    pad_x, pad_y = (new_shape[1] - new_width) / 2, (new_shape[0] - new_height) / 2
+    if (width, height) != (new_width, new_height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return frame, gain, (left, top)
+
+def non_max_suppression(boxes, scores, class_ids, iou_threshold=0.7, max_det=300):
+    """
+    Greedy per class NMS (boxes of different classes never suppress each other, like the
+    ultralytics class offset trick).
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, by decreasing score.
+    """
+    boxes = boxes + (class_ids * 7680.0)[:, None] # max_wh offset : one coordinate space per class
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while len(order) and len(keep) < max_det:
+        best, order = order[0], order[1:]
+        keep.append(best)
+        top_left = np.maximum(boxes[best, :2], boxes[order, :2])
+        bottom_right = np.minimum(boxes[best, 2:], boxes[order, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+        iou = intersection / (areas[best] + areas[order] - intersection + 1e-7)
+        order = order[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+def read_onnx_names(model_path):
+    # class names stored by the ultralytics ONNX export in the model metadata ("{0: 'ball', ...}")
+    metadata = {}
+    if onnxruntime is not None:
+        session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        metadata = session.get_modelmeta().custom_metadata_map
+    else:
+        import onnx
+        model = onnx.load(model_path, load_external_data=False)
+        metadata = {prop.key: prop.value for prop in model.metadata_props}
+    return ast.literal_eval(metadata["names"]) if "names" in metadata else None
+
+class OnnxDetector():
+    """
+    YOLO detector exported to ONNX, run on CPU with ONNX Runtime or OpenVINO instead of the
+    ultralytics PyTorch path. predict() takes the same arguments as YOLO.predict and returns
+    FrameDetections (sv.Detections in source frame coordinates), which every consumer of the
+    Tracker detections already accepts.
+
+    Pre & post processing follow ultralytics : letterbox to the input size, (cx, cy, w, h, class
+    scores) decoding, per class NMS and boxes mapped back through the letterbox.
+
+    Attributes:
+        model_path (str): .onnx model (from tracking.model_export), or an OpenVINO .xml for openvino.
+        backend (str): "onnxruntime" or "openvino".
+        names (dict): Class names {class_id: name}, read from the model metadata when None.
+        imgsz (int): Input size (square) of a model exported with dynamic shapes.
+        conf (float): Default minimum confidence.
+        iou (float): NMS IoU threshold.
+        intra_op_threads (int): Threads inside an operator (None : backend default, all cores).
+        inter_op_threads (int): Operators run in parallel (onnxruntime) / inference streams (openvino).
+    """
+    def __init__(self, model_path, backend="onnxruntime", names=None, imgsz=640, conf=0.25, iou=0.7,
+                 intra_op_threads=None, inter_op_threads=None, max_det=300):
+        self.model_path = model_path
+        self.backend = backend
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.max_det = max_det
+
+        if backend == "onnxruntime":
+            if onnxruntime is None:
+                raise ImportError("The onnxruntime backend needs onnxruntime : pip install onnxruntime")
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if intra_op_threads:
+                options.intra_op_num_threads = intra_op_threads
+            if inter_op_threads:
+                options.inter_op_num_threads = inter_op_threads
+                options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+            self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+            model_input = self.session.get_inputs()[0]
+            self.input_name, input_shape = model_input.name, model_input.shape
+            if names is None:
+                metadata = self.session.get_modelmeta().custom_metadata_map
+                names = ast.literal_eval(metadata["names"]) if "names" in metadata else None
+        elif backend == "openvino":
+            if openvino is None:
+                raise ImportError("The openvino backend needs openvino : pip install openvino")
+            core = openvino.Core()
+            model = core.read_model(model_path)
+            config = {"PERFORMANCE_HINT": "THROUGHPUT" if (inter_op_threads or 1) > 1 else "LATENCY"}
+            if intra_op_threads:
+                config["INFERENCE_NUM_THREADS"] = intra_op_threads
+            if inter_op_threads:
+                config["NUM_STREAMS"] = inter_op_threads
+            self.compiled_model = core.compile_model(model, "CPU", config)
+            self.request = self.compiled_model.create_infer_request()
+            input_shape = [dimension.get_length() if dimension.is_static else None
+                           for dimension in model.inputs[0].get_partial_shape()]
+            if names is None and model_path.endswith('.onnx'):
+                names = read_onnx_names(model_path)
+        else:
+            raise ValueError(f"Unknown backend {backend}, expected onnxruntime or openvino")
+
+        if names is None:
+            raise ValueError(f"No class names in {model_path}, pass names=")
+        self.names = {int(class_id): name for class_id, name in names.items()}
+
+        # static dimensions of the exported model : batch (None when dynamic) & input size
+        self.max_batch = input_shape[0] if isinstance(input_shape[0], int) else None
+        self.input_shape = tuple(input_shape[2:4]) if all(isinstance(size, int) for size in input_shape[2:4]) else None
+
+    def get_input_shape(self, imgsz=None):
+        # (height, width) the frames are letterboxed to
+        if self.input_shape is not None:
+            return self.input_shape
+        imgsz = imgsz or self.imgsz
+        return (imgsz, imgsz) if isinstance(imgsz, int) else tuple(imgsz)
+
+    def preprocess(self, frames, input_shape):
+        # BGR frames -> N x 3 x H x W float32 RGB in [0, 1], with the letterbox of each frame
+        images, letterboxes = [], []
+        for frame in frames:
+            image, gain, pad = letterbox(frame, input_shape)
+            images.append(image)
+            letterboxes.append((gain, pad))
+        batch = np.ascontiguousarray(np.stack(images)[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        return batch, letterboxes
+
+    def run(self, batch):
+        # raw model output : N x (4 + number of classes) x anchors
+        if self.backend == "onnxruntime":
+            return self.session.run(None, {self.input_name: batch})[0]
+        return self.request.infer({0: batch})[self.compiled_model.output(0)]
+
+    def postprocess(self, output, frame_shape, letterbox_params, conf):
+        """
+        Detections of one frame from its raw output (4 + number of classes) x anchors.
+
+        Returns:
+            sv.Detections: Boxes in source frame coordinates, with the class names in data.
+        """
+        output = output.T # anchors x (4 + classes)
+        class_scores = output[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+        candidates = scores > conf
+        if not candidates.any():
+            return sv.Detections.empty()
+
+        cx, cy, w, h = output[candidates, :4].T.astype(np.float64)
+        boxes = np.stack([cx - w/2, cy - h/2, cx + w/2, cy + h/2], axis=1)
+        scores, class_ids = scores[candidates], class_ids[candidates]
+        keep = non_max_suppression(boxes, scores.astype(np.float64), class_ids, self.iou, self.max_det)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # letterbox -> source frame
+        gain, (left, top) = letterbox_params
+        boxes = (boxes - [left, top, left, top]) / gain
+        height, width = frame_shape[:2]
+        boxes = np.clip(boxes, 0, [width, height, width, height])
+        return sv.Detections(xyxy=boxes.astype(np.float32), confidence=scores.astype(np.float32),
+                             class_id=class_ids.astype(int),
+                             data={"class_name": np.array([self.names[int(class_id)] for class_id in class_ids])})
+
+    def predict(self, frames, conf=None, imgsz=None, **kwargs):
+        """
+        Detects the objects of a list of frames (same arguments as YOLO.predict).
+
+        Returns:
+            list: FrameDetections, one per frame.
+        """
+        conf = self.conf if conf is None else conf
+        input_shape = self.get_input_shape(imgsz)
+        batch_size = self.max_batch or max(1, len(frames))
+        results = []
+        for i in range(0, len(frames), batch_size):
+            batch_frames = frames[i:i+batch_size]
+            batch, letterboxes = self.preprocess(batch_frames, input_shape)
+            output = self.run(batch)
+            results += [FrameDetections(self.names, self.postprocess(frame_output, frame.shape, letterbox_params, conf))
+                        for frame_output, frame, letterbox_params in zip(output, batch_frames, letterboxes)]
+        return results
+
+def load_detector(model_path, intra_op_threads=None, inter_op_threads=None):
+    """
+    Detector of a weights file : .onnx -> OnnxDetector on ONNX Runtime, OpenVINO model (.xml or an
+    ultralytics *_openvino_model directory) -> OnnxDetector on OpenVINO, anything else -> the
+    ultralytics YOLO (PyTorch).
+    """
+    if model_path.endswith('.onnx'):
+        return OnnxDetector(model_path, "onnxruntime", intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+    if model_path.endswith('.xml') or (os.path.isdir(model_path) and model_path.rstrip('/').endswith('_openvino_model')):
+        names = None
+        if os.path.isdir(model_path):
+            metadata_path = os.path.join(model_path, 'metadata.yaml')
+            model_path = next(os.path.join(model_path, name) for name in sorted(os.listdir(model_path)) if name.endswith('.xml'))
+        else:
+            metadata_path = os.path.join(os.path.dirname(model_path), 'metadata.yaml')
+        if os.path.exists(metadata_path):
+            import yaml
+            with open(metadata_path) as f:
+                names = yaml.safe_load(f).get("names")
+        return OnnxDetector(model_path, "openvino", names=names, intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+
+    from ultralytics import YOLO
+    return YOLO(model_path)
@@ -1,28 +1,125 @@
-from ultralytics import YOLO
 import supervision as sv
 import pickle
 import os
 import sys 
 sys.path.append('../')
-from utils import get_bbox_width, get_center_of_bbox, get_foot_position
+from utils import get_bbox_width, get_center_of_bbox, get_foot_position, read_video_windows, scale_points, get_resolution_scale, scale_length
+from track_store import TrackStore
+from instrumentation import metrics
 import cv2
 import numpy as np
-import pandas as pd 
+from .ball_interpolator import interpolate_bboxes
+from .detection_scheduler import DetectionScheduler
+from .keyframe_detector import KeyframeDetector, FrameDetections
+from .inference_resizer import InferenceResizer
+from .onnx_detector import load_detector
 
 class Tracker:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, intra_op_threads=None, inter_op_threads=None):
+        self.model_path = model_path
+        # .pt : ultralytics (PyTorch), .onnx / OpenVINO model : CPU backend (threads only apply to these)
+        self.model = load_detector(model_path, intra_op_threads, inter_op_threads) if model_path is not None else None # no model : drawing & interpolation only
         self.tracker = sv.ByteTrack()
+        self.batch_size = 20 # to minimize the memory usage by limiting (20 frames by 20 frames)
+        self.conf = 0.1 # minimum conf is 10%
+        self.keyframe_detector = None # detector on every frame unless enable_keyframes() is called
+        self.inference_size = None # detector input size (long side), the model default when None
+        self.resizer = None # InferenceResizer when the frames are resized before the detector
+
+    def set_inference_resolution(self, inference_size=None, resize_at_decode=False):
+        """
+        Resolution the detector runs at : inference_size is the long side of its input (None keeps
+        the model default). With resize_at_decode the frames are resized once, without letterbox, as
+        they're decoded (streaming) or before the detector, and the boxes are rescaled to the source
+        frame before ByteTrack.
+        """
+        self.inference_size = inference_size
+        self.resizer = InferenceResizer(inference_size or 640) if resize_at_decode else None
+
+    def predict(self, frames, resized_frames=None):
+        """
+        Runs the detector on frames at the inference resolution.
+
+        Returns:
+            list: YOLO results, or FrameDetections in source coordinates when the frames are resized
+                  or the model runs on a CPU backend (OnnxDetector).
+        """
+        kwargs = {"conf": self.conf}
+        if self.inference_size is not None:
+            kwargs["imgsz"] = self.inference_size
+        if self.resizer is None:
+            return self.model.predict(frames, **kwargs)
+
+        if resized_frames is None:
+            resized_frames = [self.resizer.resize(frame) for frame in frames]
+        results = self.model.predict(resized_frames, **kwargs)
+        return [self.resizer.to_source(result, frame.shape, resized.shape)
+                for result, frame, resized in zip(results, frames, resized_frames)]
+
+    def enable_keyframes(self, interval=5, adaptive=True, max_motion=12.0, max_lost_fraction=0.3):
+        """
+        Keyframe mode : the detector only runs on keyframes, the boxes of the frames in between are
+        propagated with optical flow (see KeyframeDetector). interval <= 1 turns it off.
+        """
+        if interval <= 1:
+            self.keyframe_detector = None
+            return
+        self.keyframe_detector = KeyframeDetector(self.predict, interval, adaptive, max_motion, max_lost_fraction,
+                                                  batch_size=self.batch_size)
+
+    def reset(self):
+        # new video : fresh ByteTrack state (track IDs restart at 1), the model stays loaded
+        self.tracker = sv.ByteTrack()
+        if self.keyframe_detector is not None:
+            self.keyframe_detector.reset()
+
+    def get_cache_params(self):
+        # parameters the tracks depend on (StageCache key)
+        params = {"batch_size": self.batch_size, "conf": self.conf, "bbox_dtype": "float64"} # entries of float32 bboxes are stale
+        if self.inference_size is not None or self.resizer is not None:
+            params["inference"] = {"size": self.inference_size, "resize_at_decode": self.resizer is not None}
+        if self.keyframe_detector is not None:
+            params["keyframes"] = self.keyframe_detector.get_cache_params()
+        return params
 
     def detect_frames(self,frames):
-        batch_size = 20 # to minimize the memory usage by limiting (20 frames by 20 frames)
+        if self.keyframe_detector is not None:
+            return self.keyframe_detector.detect_frames(frames)
+
+        batch_size = self.batch_size
         detections =[]
         for i in range(0,len(frames),batch_size):
-            detections_batch = self.model.predict(frames[i:i+batch_size], conf=0.1) # minimum conf is 10% // model.track for trackID
+            with metrics.timer("detect_batch_seconds"):
+                detections_batch = self.predict(frames[i:i+batch_size]) # model.track for trackID
+            metrics.inc("detected_frames_total", len(detections_batch))
+            metrics.set("detect_batch_size", len(detections_batch))
             detections += detections_batch 
             #break  # for testing only on the first batch to avoid the detection on all frames
         return detections
     
+    def detect_video_windows(self, video_path, window_size, max_wait=0.05, queue_size=64, frame_cache=None):
+        """
+        Decodes video_path in a background thread and runs the detection on adaptive batches while
+        the next frames are decoded (see DetectionScheduler).
+
+        Args:
+            frame_cache (FrameCache, optional): Frames read from (or recorded into) this decoded frame cache.
+
+        Yields:
+            tuple: (start_frame, frames, detections) of consecutive windows of window_size frames.
+        """
+        if self.keyframe_detector is not None:
+            # the detector only sees the keyframes : nothing left for the scheduler to overlap
+            windows = frame_cache.read_windows(video_path, window_size) if frame_cache is not None else read_video_windows(video_path, window_size)
+            for start_frame, frames in windows:
+                yield start_frame, frames, self.detect_frames(frames)
+            return
+
+        scheduler = DetectionScheduler(self.model, batch_size=self.batch_size, max_wait=max_wait,
+                                       queue_size=queue_size, conf=self.conf, imgsz=self.inference_size, resizer=self.resizer)
+        source = frame_cache.iter_frames(video_path) if frame_cache is not None else video_path
+        yield from scheduler.run_windows(source, window_size)
+
     def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
         
         if read_from_stub and stub_path is not None and os.path.exists(stub_path): # checking track results from existing pickle file
@@ -31,7 +128,87 @@ class Tracker:
             return tracks
 
         detections = self.detect_frames(frames)
+        tracks = self.detections_to_tracks(detections)
+
+        if stub_path is not None:   
+            with open(stub_path,'wb') as f:
+                pickle.dump(tracks,f)   # dumping tracks in pickled file
+
+        return tracks # dictionary of list of dictionaries
+
+    def get_object_track_store(self, frames, cache=None, video_path=None, read_from_stub=False, stub_path=None):
+        """
+        Same as get_object_tracks but returns a TrackStore, reused from a StageCache when the same
+        video, model weights and detection parameters were already processed.
+
+        Args:
+            frames (list): Frames of the video.
+            cache (StageCache, optional): Cache of stage results.
+            video_path (str, optional): Path of the video (part of the cache key).
+
+        Returns:
+            TrackStore: Tracks of every frame.
+        """
+        if cache is not None and video_path is not None:
+            key = cache.make_key("tracks", video_path, self.model_path, self.get_cache_params())
+            arrays = cache.get(key, (0, len(frames)))
+            if arrays is not None:
+                return TrackStore.from_arrays(arrays, len(frames))
+
+        track_store = TrackStore.from_tracks(self.get_object_tracks(frames, read_from_stub, stub_path))
+
+        if cache is not None and video_path is not None:
+            cache.put(key, track_store.to_arrays(), (0, len(frames)), stage="tracks")
+        return track_store
+
+    @staticmethod
+    def to_supervision(detection):
+        # supervision detections of a YOLO result or FrameDetections
+        return detection.detections if isinstance(detection, FrameDetections) else sv.Detections.from_ultralytics(detection)
+
+    def detections_to_arrays(self, detections, frame_offset=0):
+        """
+        Detections of consecutive frames as StageCache arrays : "detections/<column>" rows (frame,
+        xyxy, confidence, class_id) sorted by frame, frames shifted by frame_offset.
+        """
+        frames, xyxy, confidence, class_id = [], [], [], []
+        for frame_num, detection in enumerate(detections):
+            detection_supervision = self.to_supervision(detection)
+            frames.append(np.full(len(detection_supervision), frame_num + frame_offset, dtype=np.int64))
+            xyxy.append(np.asarray(detection_supervision.xyxy).reshape(-1,4))
+            confidence.append(np.asarray(detection_supervision.confidence))
+            class_id.append(np.asarray(detection_supervision.class_id))
+        if not frames:
+            return {"detections/frame": np.zeros(0, dtype=np.int64), "detections/xyxy": np.zeros((0,4), dtype=np.float32),
+                    "detections/confidence": np.zeros(0, dtype=np.float32), "detections/class_id": np.zeros(0, dtype=np.int64)}
+        return {"detections/frame": np.concatenate(frames), "detections/xyxy": np.concatenate(xyxy),
+                "detections/confidence": np.concatenate(confidence), "detections/class_id": np.concatenate(class_id)}
+
+    def arrays_to_detections(self, arrays, num_frames, frame_offset=0):
+        """
+        detections_to_arrays output back to FrameDetections of each frame, which detections_to_tracks
+        runs through ByteTrack like fresh detections.
+        """
+        frame = np.asarray(arrays["detections/frame"]) - frame_offset
+        bounds = np.searchsorted(frame, np.arange(num_frames+1))
+        xyxy, confidence, class_id = (np.asarray(arrays[f"detections/{name}"]) for name in ("xyxy", "confidence", "class_id"))
+        return [FrameDetections(self.model.names, sv.Detections(xyxy=xyxy[start:end].copy(), confidence=confidence[start:end].copy(),
+                                                                class_id=class_id[start:end].copy()))
+                for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def detections_to_tracks(self, detections):
+        """
+        Runs ByteTrack over a sequence of YOLO detections and builds the tracks dictionary.
 
+        The ByteTrack state is kept on the tracker, so consecutive calls (e.g. windows of a
+        streamed video) continue the same track IDs.
+
+        Args:
+            detections (list): YOLO results, one per frame.
+
+        Returns:
+            dict: {"players": [...], "referees": [...], "ball": [...]} with one dict per frame.
+        """
         tracks={
             "players":[], 
             "referees":[],
@@ -43,8 +220,8 @@ class Tracker:
             cls_names = detection.names # {0:person, 1:goalkeeper}
             cls_names_inv = {v:k for k,v in cls_names.items()} # {person:0, goalkeeper:1}(this is more convenient)
  
-            # convert to supervision detection format
-            detection_supervision = sv.Detections.from_ultralytics(detection)
+            # convert to supervision detection format (keyframe mode : already converted)
+            detection_supervision = self.to_supervision(detection)
 
             # convert goalKeeper to player class // object
             for object_ind , class_id in enumerate(detection_supervision.class_id):
@@ -78,11 +255,7 @@ class Tracker:
                 if cls_id == cls_names_inv['ball']:
                     tracks["ball"][frame_num][1] = {"bbox":bbox}
 
-        if stub_path is not None:   
-            with open(stub_path,'wb') as f:
-                pickle.dump(tracks,f)   # dumping tracks in pickled file
-
-        return tracks # dictionary of list of dictionaries
+        return tracks
 
     def draw_ellipse(self, frame, bbox, color, track_id=None):
         y2 = int(bbox[3]) # bottom of bounding box
@@ -102,12 +275,13 @@ class Tracker:
             lineType=cv2.LINE_4
         )
 
-        # rectangle for track id under ellipse
-        rectangle_width = 40
-        rectangle_height= 20
+        # rectangle for track id under ellipse (sizes set on 1920x1080 frames)
+        scale = scale_length(1.0, (frame.shape[1], frame.shape[0]))
+        rectangle_width = int(round(40*scale))
+        rectangle_height= int(round(20*scale))
         x1_rect = x_center - rectangle_width//2 # top left x-coordinate
         x2_rect = x_center + rectangle_width//2 # bottom-right x-coordinate
-        y1_rect = y2 + 5  # Slight offset below the ellipse
+        y1_rect = y2 + int(round(5*scale))  # Slight offset below the ellipse
         y2_rect = y1_rect + rectangle_height  # Bottom-right y-coordinate
 
         if track_id is not None:
@@ -117,13 +291,13 @@ class Tracker:
                           color,
                           cv2.FILLED)
             
-            x1_text = x1_rect + 12
+            x1_text = x1_rect + int(round(12*scale))
             if track_id > 99:
-                x1_text -= 10
+                x1_text -= int(round(10*scale))
 
             # adjustments
-            font_scale = 0.4  # smaller font size
-            font_thickness = 2  # thinner font
+            font_scale = 0.4*scale  # smaller font size
+            font_thickness = max(1, int(round(2*scale)))  # thinner font
             text_size = cv2.getTextSize(str(track_id), cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)[0]
             text_x = x_center - (text_size[0] // 2)  # Center text horizontally
             text_y = y1_rect + rectangle_height // 2 + text_size[1] // 2  # Center text vertically
@@ -155,11 +329,13 @@ class Tracker:
         y_center = int(bbox[1]) # y1
         x_center , _ = get_center_of_bbox(bbox)
         
-        # vertices
+        # vertices (sizes set on 1920x1080 frames)
+        scale = scale_length(1.0, (frame.shape[1], frame.shape[0]))
+        half_width, height = int(round(10*scale)), int(round(20*scale))
         triangle_points = np.array([
             [x_center,y_center], # base lower head of inverted triang
-            [x_center-10,y_center-20], # top left
-            [x_center+10,y_center-20] # top right
+            [x_center-half_width,y_center-height], # top left
+            [x_center+half_width,y_center-height] # top right
         ])
 
         cv2.drawContours(frame,[triangle_points],0,color, cv2.FILLED) # filled inverted ball
@@ -170,9 +346,13 @@ class Tracker:
     def draw_team_ball_control(self, frame, frame_num, team_ball_control):
         # semi-transparent rectangle
         overlay = frame.copy() # helps with transparency by drawing on the overlay
+        frame_size = (frame.shape[1], frame.shape[0])
+        top_left, bottom_right, team_1_origin, team_2_origin = ((int(x), int(y)) for x, y in scale_points(
+            [(1350,850), (1900,970), (1400,900), (1400,950)], frame_size).round()) # set on 1920x1080
+        font_scale = get_resolution_scale(frame_size)[1]
         cv2.rectangle(overlay,
-                      (1350,850), # positions
-                      (1900,970),
+                      top_left, # positions
+                      bottom_right,
                       (255,255,255), # white
                       -1) # filled
         alpha = 0.4 # transparency factor
@@ -190,15 +370,17 @@ class Tracker:
         team1_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==1].shape[0] # numpy list for team 1
         team2_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==2].shape[0] # numpy list for team 1
 
-        team_1 = team1_num_frames / (team1_num_frames + team2_num_frames)
-        team_2 = team2_num_frames / (team1_num_frames + team2_num_frames)
+        total_num_frames = max(team1_num_frames + team2_num_frames, 1) # no possession yet (e.g. first streamed window)
+        team_1 = team1_num_frames / total_num_frames
+        team_2 = team2_num_frames / total_num_frames
 
-        cv2.putText(frame, f"Team 1 Possession :{team_1*100:.2f}%", (1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
-        cv2.putText(frame, f"Team 2 Possession :{team_2*100:.2f}%", (1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+        cv2.putText(frame, f"Team 1 Possession :{team_1*100:.2f}%", team_1_origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,0,0), max(1, round(3*font_scale)))
+        cv2.putText(frame, f"Team 2 Possession :{team_2*100:.2f}%", team_2_origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,0,0), max(1, round(3*font_scale)))
 
         return frame 
     
-    def draw_annotations(self,video_frames,tracks, team_ball_control):
+    def draw_annotations(self,video_frames,tracks, team_ball_control, frame_offset=0):
+        # frame_offset : index of video_frames[0] in the whole video (streamed windows)
         output_video_frames=[]
         
         for frame_num,frame in enumerate(video_frames):
@@ -227,7 +409,7 @@ class Tracker:
                 frame = self.draw_triangle(frame,ball["bbox"], (0,255,0)) # green
             
             # draw block for team possession
-            frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
+            frame = self.draw_team_ball_control(frame, frame_offset+frame_num, team_ball_control)
 
             # draw id under ellipse of player
             output_video_frames.append(frame)
@@ -246,16 +428,17 @@ class Tracker:
         Returns:
             list: List of interpolated ball positions with gaps filled.
         """
-        # conversion to df
+        # conversion to a contiguous F x 4 array (NaN rows for missing balls)
         ball_positions = [x.get(1,{}).get('bbox',[]) for x in ball_positions] # getting the 1st track id ( if not get empty dict) and bbox ( if not get empty list)
-        df_ball_positions = pd.DataFrame(ball_positions, columns=['x1','y1','x2','y2'])
+        bboxes = np.array([bbox if len(bbox) == 4 else [np.nan]*4 for bbox in ball_positions], dtype=np.float64).reshape(-1,4)
+        if np.isnan(bboxes).all():
+            return [{} for _ in ball_positions] # ball never detected, nothing to interpolate from
 
-        # interpolate missing values ( missing ball tracks )
-        df_ball_positions = df_ball_positions.interpolate() # filling gaps lineraly
-        df_ball_positions = df_ball_positions.bfill() # for first frames  (leading NaN values)
+        # interpolate missing values ( missing ball tracks ) : lineraly in the gaps, edge values for first/last frames
+        bboxes = interpolate_bboxes(bboxes)
 
         # deconversion 
-        ball_positions = [{1: {"bbox":x}} for x in df_ball_positions.to_numpy().tolist()]
+        ball_positions = [{1: {"bbox":x}} for x in bboxes.tolist()]
 
         return ball_positions
 
@@ -268,4 +451,18 @@ class Tracker:
                         position= get_center_of_bbox(bbox)
                     else:
                         position = get_foot_position(bbox)
-                    tracks[object][frame_num][track_id]['position'] = position      
\ No newline at end of file
+                    tracks[object][frame_num][track_id]['position'] = position
+
+    def add_position_to_store(self, store):
+        """
+        Vectorized add_position_to_tracks for a TrackStore : ball center / foot position of every
+        detection computed in one array operation per object class.
+        """
+        for object, object_tracks in store.items():
+            bbox = object_tracks.columns["bbox"].astype(np.float64)
+            x_center = np.trunc((bbox[:,0] + bbox[:,2]) / 2) # int() in get_center_of_bbox/get_foot_position truncates
+            if object == 'ball':
+                y = np.trunc((bbox[:,1] + bbox[:,3]) / 2)
+            else:
+                y = np.trunc(bbox[:,3])
+            object_tracks.set_column("position", np.stack([x_center, y], axis=1))
@@ -1,4 +1,5 @@
 # File used to expose functions inside the utils folder outside of the utils folder
 
-from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance, measure_xy_distance, get_foot_position
\ No newline at end of file
+from .video_utils import read_video, save_video, read_video_windows, read_video_range, get_video_properties, open_video_writer, AsyncVideoWriter
+from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance, measure_xy_distance, get_foot_position
+from .resolution_utils import REFERENCE_FRAME_SIZE, get_resolution_scale, scale_points, scale_length
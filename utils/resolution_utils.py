@@ -0,0 +1,28 @@
+import numpy as np
+
+# resolution the pixel constants of the pipeline (court corners, camera strips, panels, distances) were set on
+REFERENCE_FRAME_SIZE = (1920, 1080) # width x height
+
+def get_resolution_scale(frame_size, reference_size=REFERENCE_FRAME_SIZE):
+    """
+    Scale factors from the reference resolution to frame_size.
+
+    Args:
+        frame_size (tuple): (width, height) of the frames, None for the reference resolution.
+
+    Returns:
+        tuple: (scale_x, scale_y)
+    """
+    if frame_size is None:
+        return 1.0, 1.0
+    return frame_size[0] / reference_size[0], frame_size[1] / reference_size[1]
+
+def scale_points(points, frame_size, reference_size=REFERENCE_FRAME_SIZE):
+    # (x, y) points set on the reference resolution, moved to frame_size
+    scale_x, scale_y = get_resolution_scale(frame_size, reference_size)
+    return np.asarray(points, dtype=np.float64) * [scale_x, scale_y]
+
+def scale_length(length, frame_size, reference_size=REFERENCE_FRAME_SIZE):
+    # pixel distance set on the reference resolution (geometric mean of both scales)
+    scale_x, scale_y = get_resolution_scale(frame_size, reference_size)
+    return length * (scale_x * scale_y) ** 0.5
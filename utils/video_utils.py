@@ -1,6 +1,12 @@
 # Utilities used to read in the video and saving it (CV2)
 
 import cv2
+import queue
+import threading
+import time
+import sys
+sys.path.append('../')
+from instrumentation import metrics
 
 def read_video(video_path): # 24 frame per sec => vid
     cap = cv2.VideoCapture(video_path)
@@ -12,14 +18,159 @@ def read_video(video_path): # 24 frame per sec => vid
         frames.append(frame)
     return frames
 
-def save_video(output_video_frames, output_video_path):
+def read_video_windows(video_path, window_size):
+    """
+    Reads a video lazily, yielding it in consecutive windows of frames instead of decoding
+    the whole match into memory.
+
+    Args:
+        video_path (str): Path of the input video.
+        window_size (int): Maximum number of frames held per window.
+
+    Yields:
+        tuple: (start_frame, frames) where start_frame is the index of the first frame of the window.
+    """
+    cap = cv2.VideoCapture(video_path)
+    start_frame = 0
+    frames = []
+    while True:
+        ret , frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+        if len(frames) == window_size:
+            yield start_frame, frames
+            start_frame += len(frames)
+            frames = []
+    cap.release()
+
+    if frames: # last (shorter) window
+        yield start_frame, frames
+
+def read_video_range(video_path, start_frame, end_frame):
+    # decodes frames [start_frame, end_frame) only (seeks to start_frame)
+    cap = cv2.VideoCapture(video_path)
+    if start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    frames = []
+    while len(frames) < end_frame - start_frame:
+        ret , frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def get_video_properties(video_path):
+    """
+    Reads the fps, resolution and frame count of a video without decoding it.
+
+    Returns:
+        dict: {"fps": float, "width": int, "height": int, "frame_count": int}
+    """
+    cap = cv2.VideoCapture(video_path)
+    properties = {
+        "fps": cap.get(cv2.CAP_PROP_FPS) or 24, # some containers don't report fps
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    }
+    cap.release()
+    return properties
+
+def open_video_writer(output_video_path, frame_size, fps=24):
+    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    return cv2.VideoWriter(output_video_path, fourcc, fps, frame_size) # frame_size : width x height
+
+class AsyncVideoWriter():
+    """
+    Video writer sink encoding on a background thread : frames are queued as they're rendered and
+    encoded while the next ones are processed. The queue is bounded, so a slow encoder blocks
+    write() (backpressure) instead of piling up frames in memory.
+
+    Use it as a context manager (or call close()) : the queued frames are flushed and the file is
+    closed even when the processing fails, and an encoding error is raised on the next write/close.
+
+    Attributes:
+        output_video_path (str): Path of the output video.
+        frame_size (tuple): Width x height of the frames.
+        fps (float): Frame rate of the output (take it from the source video).
+        queue_size (int): Maximum number of frames waiting to be encoded.
+        copy_frames (bool): Copy each frame on write(). Can be False when the producer doesn't reuse
+                            the frame buffer before it's encoded (e.g. FrameCompositor with at least
+                            queue_size+2 buffers).
+    """
+    def __init__(self, output_video_path, frame_size, fps=24, queue_size=32, copy_frames=True):
+        self.output_video_path = output_video_path
+        self.frame_size = frame_size
+        self.fps = fps
+        self.queue_size = queue_size
+        self.copy_frames = copy_frames
+        self.frames_written = 0
+
+        self.writer = open_video_writer(output_video_path, frame_size, fps)
+        if not self.writer.isOpened():
+            raise IOError(f"Can't open a video writer for {output_video_path}")
+
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.encode, daemon=True)
+        self.thread.start()
+
+    def encode(self):
+        while True:
+            frame = self.frame_queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue # keep draining so write() never blocks on a dead encoder
+            try:
+                encode_start = time.perf_counter()
+                self.writer.write(frame)
+                metrics.observe("encode_frame_seconds", time.perf_counter() - encode_start)
+                self.frames_written += 1
+            except Exception as error:
+                self.error = error
+
+    def check_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, frame):
+        if self.closed:
+            raise ValueError("write() on a closed AsyncVideoWriter")
+        self.check_error()
+        self.frame_queue.put(frame.copy() if self.copy_frames else frame) # blocks when the queue is full
+        metrics.set("queue_depth", self.frame_queue.qsize(), queue="video_writer")
+
+    def close(self):
+        # flushes the queued frames and closes the file
+        if self.closed:
+            return
+        self.closed = True
+        self.frame_queue.put(None)
+        self.thread.join()
+        self.writer.release()
+        self.check_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        except Exception:
+            if exc_type is None: # don't hide the original error
+                raise
+
+def save_video(output_video_frames, output_video_path, fps=24):
     if not output_video_frames:
         raise ValueError("The list of output video frames is empty.")
     
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (output_video_frames[0].shape[1], output_video_frames[0].shape[0])) # width x height 
+    out = open_video_writer(output_video_path, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]), fps) # width x height 
     
     for frame in output_video_frames:
         out.write(frame)
     
-    out.release()
\ No newline at end of file
+    out.release()